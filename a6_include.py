@@ -1,3 +1,17 @@
+import gc
+import os
+import pickle
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import partial
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 # -------------- Used by both HashMaps (SC & OA)  -------------- #
 
@@ -89,6 +103,337 @@ def hash_function_2(key: str) -> int:
     return hash
 
 
+# --------- Seeded 64-bit hash family for both HashMaps  --------- #
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+# 2^64 / golden ratio, for Fibonacci hashing into power-of-two tables
+FIBONACCI_MULTIPLIER = 0x9e3779b97f4a7c15
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+
+_WY_P0 = 0xa0761d6478bd642f
+_WY_P1 = 0xe7037ed1a0b428db
+_WY_P2 = 0x8ebc6af09c88c6e3
+_WY_P3 = 0x589965cc75374cc3
+
+
+def random_seed() -> int:
+    """Return a fresh random 128-bit seed from the OS entropy pool."""
+    return int.from_bytes(os.urandom(16), 'little')
+
+
+# drawn once per process, used when make_seeded_hash gets no seed
+PROCESS_SEED = random_seed()
+
+
+def fnv1a_hash(key: str, seed: int = 0) -> int:
+    """64-bit FNV-1a over the UTF-8 bytes of the key"""
+    hash = (_FNV_OFFSET ^ seed) & MASK64
+    for byte in key.encode('utf-8'):
+        hash = ((hash ^ byte) * _FNV_PRIME) & MASK64
+    return hash
+
+
+def _rotl(x: int, b: int) -> int:
+    """Rotate a 64-bit integer left by b bits."""
+    return ((x << b) | (x >> (64 - b))) & MASK64
+
+
+def _sip_round(v0: int, v1: int, v2: int, v3: int) -> tuple:
+    """Run one SipRound over the four state words."""
+    v0 = (v0 + v1) & MASK64
+    v1 = _rotl(v1, 13) ^ v0
+    v0 = _rotl(v0, 32)
+    v2 = (v2 + v3) & MASK64
+    v3 = _rotl(v3, 16) ^ v2
+    v0 = (v0 + v3) & MASK64
+    v3 = _rotl(v3, 21) ^ v0
+    v2 = (v2 + v1) & MASK64
+    v1 = _rotl(v1, 17) ^ v2
+    v2 = _rotl(v2, 32)
+    return v0, v1, v2, v3
+
+
+def _siphash24(data: bytes, k0: int, k1: int) -> int:
+    """Reference SipHash-2-4 of data under the 128-bit key (k0, k1)"""
+    v0 = k0 ^ 0x736f6d6570736575
+    v1 = k1 ^ 0x646f72616e646f6d
+    v2 = k0 ^ 0x6c7967656e657261
+    v3 = k1 ^ 0x7465646279746573
+
+    # pad to whole words, last byte of the final word holds the length
+    length = len(data)
+    data += b'\x00' * (7 - length % 8) + bytes([length & 0xFF])
+    for m in struct.unpack('<%dQ' % (len(data) // 8), data):
+        v3 ^= m
+        v0, v1, v2, v3 = _sip_round(v0, v1, v2, v3)
+        v0, v1, v2, v3 = _sip_round(v0, v1, v2, v3)
+        v0 ^= m
+
+    v2 ^= 0xFF
+    for _ in range(4):
+        v0, v1, v2, v3 = _sip_round(v0, v1, v2, v3)
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+def sip_hash(key: str, seed: int = 0) -> int:
+    """
+    Keyed SipHash-2-4 of the key
+    The low and high 64 bits of seed form the 128-bit SipHash key
+    """
+    return _siphash24(key.encode('utf-8'),
+                      seed & MASK64, (seed >> 64) & MASK64)
+
+
+def _wymix(a: int, b: int) -> int:
+    """Multiply two 64-bit words and fold the 128-bit product."""
+    product = (a & MASK64) * (b & MASK64)
+    return (product ^ (product >> 64)) & MASK64
+
+
+def wy_hash(key: str, seed: int = 0) -> int:
+    """
+    Fast wyhash-style hash of the key
+    Consumes 16 bytes per round with a folded 64x64 multiply
+    """
+    data = key.encode('utf-8')
+    length = len(data)
+    data += b'\x00' * (-length % 16)
+    words = struct.unpack('<%dQ' % (len(data) // 8), data)
+
+    hash = _wymix(seed ^ (seed >> 64) ^ _WY_P0, _WY_P1)
+    for i in range(0, len(words), 2):
+        hash = _wymix(words[i] ^ _WY_P1, words[i + 1] ^ hash)
+    return _wymix(hash ^ _WY_P2, length ^ _WY_P3)
+
+
+def make_seeded_hash(function: callable = sip_hash, seed: int = None) -> callable:
+    """
+    Bind a seed to one of the seeded hash functions
+    Returns a one-argument function for a HashMap constructor;
+        without a seed the per-process random PROCESS_SEED is used
+    """
+    if seed is None:
+        seed = PROCESS_SEED
+    return partial(function, seed=seed)
+
+
+def next_power_of_two(n: int) -> int:
+    """Return the smallest power of two greater than or equal to n."""
+    return 1 << max(n - 1, 0).bit_length()
+
+
+# blocks inside gc_paused across all threads, and whether the collector
+#   was enabled when the first of them began
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the cyclic garbage collector for a block that allocates many
+    objects without cycles, such as one node or entry per batch key
+    Pauses are counted process-wide, so the collector comes back only
+    when the last block, in whichever thread, ends
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+# ------- Batch hashing for both HashMaps, NumPy optional ------- #
+
+# keys hashed per padded code point matrix
+_BATCH_ROWS = 1024
+
+# matrix cells per chunk before a chunk of very long keys is hashed
+#   one key at a time instead of padded (64 MB of uint32)
+_BATCH_CELLS = 1 << 24
+
+
+def _vector_hash(function: callable, keys: list):
+    """
+    Receives hash_function_1 or hash_function_2 and a chunk of keys
+    Returns their hashes as an int64 NumPy array computed over a
+        NUL-padded code point matrix (padding adds 0 to either sum, so
+        results match the scalar ones), or None if the chunk is too wide
+    """
+    width = max(map(len, keys), default=0)
+    if width * len(keys) > _BATCH_CELLS:
+        return None
+
+    data = ''.join(key.ljust(width, '\0') for key in keys)
+    codes = np.frombuffer(data.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+    codes = codes.reshape(len(keys), width).astype(np.int64)
+    if function is hash_function_1:
+        return codes.sum(axis=1)
+    return codes @ np.arange(1, width + 1, dtype=np.int64)
+
+
+def _hash_chunks(function: callable, keys: list):
+    """
+    Generator over (hashes, array) for consecutive chunks of keys,
+        where array is the same hashes as an int64 NumPy array, or None
+        when the chunk was hashed one key at a time
+    hash_function_1 and hash_function_2 are vectorized when NumPy is
+        installed; any other function is called once per key
+    """
+    if np is None or (function is not hash_function_1 and function is not hash_function_2):
+        yield list(map(function, keys)), None
+        return
+
+    for start in range(0, len(keys), _BATCH_ROWS):
+        chunk = keys[start:start + _BATCH_ROWS]
+        vector = _vector_hash(function, chunk)
+        if vector is None:
+            yield list(map(function, chunk)), None
+        else:
+            yield vector.tolist(), vector
+
+
+def hash_many(function: callable, keys: list) -> list:
+    """
+    Receives a hash function and a list of keys
+    Returns the list of hashes of the keys, bit-for-bit equal to
+        calling function on each key
+    """
+    hashes = []
+    for chunk_hashes, _ in _hash_chunks(function, keys):
+        hashes += chunk_hashes
+    return hashes
+
+
+def bucket_indices(hashes: list, capacity: int, shift: int = None) -> list:
+    """
+    Receives a list of hashes, a table capacity and, for power-of-two
+        tables, the Fibonacci hashing shift
+    Returns the bucket index of every hash: hash % capacity, or the
+        top bits of hash * FIBONACCI_MULTIPLIER mod 2^64
+    """
+    if shift is None:
+        return [hash % capacity for hash in hashes]
+    return [((hash * FIBONACCI_MULTIPLIER) & MASK64) >> shift for hash in hashes]
+
+
+def hash_and_index_many(function: callable, keys: list, capacity: int,
+                        shift: int = None) -> tuple:
+    """
+    Receives a hash function, a list of keys, a table capacity and,
+        for power-of-two tables, the Fibonacci hashing shift
+    Returns (hashes, bucket indices) of the keys; vectorized hashes
+        are reduced to indices before leaving NumPy
+    """
+    hashes, indices = [], []
+    for chunk_hashes, vector in _hash_chunks(function, keys):
+        hashes += chunk_hashes
+        if vector is None:
+            indices += bucket_indices(chunk_hashes, capacity, shift)
+        elif shift is None:
+            indices += (vector % capacity).tolist()
+        else:
+            # uint64 arithmetic wraps mod 2^64 like the & MASK64 above
+            products = vector.astype(np.uint64) * np.uint64(FIBONACCI_MULTIPLIER)
+            indices += (products >> np.uint64(shift)).tolist()
+    return hashes, indices
+
+
+# --------- Binary snapshots for both HashMaps (dump / load) --------- #
+
+# snapshot header: magic, map kind, hash fingerprint, number of arrays
+_SNAPSHOT_MAGIC = b'HMSNAP01'
+_SNAPSHOT_HEADER = struct.Struct('<8s8sQQ')
+
+# array section header: typecode, item count; the items follow in
+#   native byte order
+_ARRAY_HEADER = struct.Struct('<cQ')
+
+# key hashed into a snapshot so a load can check the hash function
+_FINGERPRINT_KEY = 'hash_map_snapshot'
+
+
+def hash_fingerprint(function: callable) -> int:
+    """
+    Receives a hash function
+    Returns its hash of a fixed key, reduced to 64 bits, which differs
+        between most functions and between runs of a salted one
+    """
+    return function(_FINGERPRINT_KEY) & MASK64
+
+
+def hash_array(hashes: list) -> array:
+    """
+    Receives a list of cached hashes
+    Returns them as a signed 64-bit array, or an unsigned one if
+        they do not fit, so they load back as the same ints
+    """
+    try:
+        return array('q', hashes)
+    except OverflowError:
+        try:
+            return array('Q', hashes)
+        except OverflowError:
+            raise ValueError("hashes must fit in 64 bits to be dumped") from None
+
+
+def write_snapshot(path: str, kind: bytes, fingerprint: int,
+                   arrays: list, payload: object) -> None:
+    """
+    Receives a file path, the map kind, the hash fingerprint, a list of
+        arrays and a picklable payload
+    Writes the arrays as raw sections followed by the pickled payload,
+        through a temporary file renamed over path once complete
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, kind, fingerprint, len(arrays)))
+        for values in arrays:
+            file.write(_ARRAY_HEADER.pack(values.typecode.encode(), len(values)))
+            values.tofile(file)
+        pickle.dump(payload, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str, kind: bytes, fingerprint: int) -> tuple:
+    """
+    Receives a file path, the expected map kind and hash fingerprint
+    Returns (list of arrays, payload) of the snapshot, each array read
+        from the file straight into place
+    Raises ValueError if the file is not a snapshot of that kind
+        or was written with another hash function
+    The payload is unpickled, so only load files you trust
+    """
+    with open(path, 'rb') as file:
+        magic, file_kind, file_fingerprint, count = _SNAPSHOT_HEADER.unpack(
+            file.read(_SNAPSHOT_HEADER.size))
+        if magic != _SNAPSHOT_MAGIC or file_kind.rstrip(b'\0') != kind:
+            raise ValueError(path + " is not a " + kind.decode() + " HashMap snapshot")
+        if file_fingerprint != fingerprint:
+            raise ValueError("hash function differs from the one " + path + " was dumped with")
+
+        arrays = []
+        for _ in range(count):
+            typecode, length = _ARRAY_HEADER.unpack(file.read(_ARRAY_HEADER.size))
+            values = array(typecode.decode())
+            values.fromfile(file, length)
+            arrays.append(values)
+        payload = pickle.load(file)
+    return arrays, payload
+
+
 # --------- For use in Separate Chaining (SC) HashMap  --------- #
 
 class SLNode:
@@ -96,11 +441,13 @@ class SLNode:
     Singly Linked List node for use in a hash map
     """
 
-    def __init__(self, key: str, value: object, next: "SLNode" = None) -> None:
-        """Initialize node given a key and value."""
+    def __init__(self, key: str, value: object, next: "SLNode" = None,
+                 hash: int = None) -> None:
+        """Initialize node given a key, value and the key's full hash."""
         self.key = key
         self.value = value
         self.next = next
+        self.hash = hash
 
     def __str__(self) -> str:
         """Override string method to provide more readable output."""
@@ -161,20 +508,27 @@ class LinkedList:
         """Return an iterator for the list, starting at the head."""
         return LinkedListIterator(self._head)
 
-    def insert(self, key: str, value: object) -> None:
+    def insert(self, key: str, value: object, hash: int = None) -> None:
         """Insert new node at front of the list."""
-        self._head = SLNode(key, value, self._head)
+        self._head = SLNode(key, value, self._head, hash)
         self._size += 1
 
-    def remove(self, key: str) -> bool:
+    def insert_node(self, node: SLNode) -> None:
+        """Relink an existing node at front of the list."""
+        node.next = self._head
+        self._head = node
+        self._size += 1
+
+    def remove(self, key: str, hash: int = None) -> bool:
         """
         Remove first node with matching key.
         Return True if removal was successful, False otherwise.
+        A given hash skips the key comparison on nodes with another hash.
         """
         previous, node = None, self._head
         while node:
 
-            if node.key == key:
+            if (hash is None or node.hash == hash) and node.key == key:
                 if previous:
                     previous.next = node.next
                 else:
@@ -185,11 +539,21 @@ class LinkedList:
             previous, node = node, node.next
         return False
 
-    def contains(self, key: str) -> SLNode:
-        """Return node with matching key, or None if no match"""
+    def contains(self, key: str, hash: int = None) -> SLNode:
+        """
+        Return node with matching key, or None if no match
+        A given hash skips the key comparison on nodes with another hash
+        """
         node = self._head
+        if hash is None:
+            while node:
+                if node.key == key:
+                    return node
+                node = node.next
+            return node
+
         while node:
-            if node.key == key:
+            if node.hash == hash and node.key == key:
                 return node
             node = node.next
         return node
@@ -203,10 +567,11 @@ class LinkedList:
 
 class HashEntry:
 
-    def __init__(self, key: str, value: object) -> None:
+    def __init__(self, key: str, value: object, hash: int = None) -> None:
         """Initialize an entry for use in a hash map."""
         self.key = key
         self.value = value
+        self.hash = hash
 
         # Set this value to True when you "delete" a HashEntry
         self.is_tombstone = False
@@ -0,0 +1,447 @@
+# Name: Kent Tolzmann
+# Description: asyncio facade over the SC or OA HashMap with single-flight
+#              loading on a miss, batched loading and resizes and clears
+#              that yield to the event loop as they go
+
+import asyncio
+
+from a6_include import DynamicArray, LinkedList, gc_paused
+import hash_map_oa
+import hash_map_sc
+
+# buckets or slots migrated, allocated or released between yields
+_STEP = 4096
+
+
+def _consume(future: asyncio.Future) -> None:
+    """
+    Receives a finished load future
+    Marks its exception as retrieved, so a load every waiter of which
+        was cancelled does not log "exception was never retrieved"
+    """
+    if not future.cancelled():
+        future.exception()
+
+
+async def _load_one(loader: callable, key: str) -> list:
+    """
+    Receives a single-key loader and a key
+    Returns [await loader(key)], the shape of a batch load
+    """
+    return [await loader(key)]
+
+
+class AsyncHashMap:
+    def __init__(self, map: object = None, step: int = _STEP) -> None:
+        """
+        Initialize a facade over map, a hash_map_sc.HashMap or any
+            hash_map_oa map (a new hash_map_sc.HashMap if None)
+        Plain operations run directly on the map; loads share one
+            in-flight future per key, and resize_table and clear yield
+            to the event loop every step buckets or slots
+        As in the maps, a None value reads as a miss, so a loader
+            returning None is called again on the next lookup
+        """
+        if step < 1:
+            raise ValueError("step must be at least 1")
+        self._map = hash_map_sc.HashMap() if map is None else map
+        self._step = step
+
+        # key -> future of the load in flight for it
+        self._loading = {}
+
+        # load tasks, referenced until done so they are not collected
+        self._tasks = set()
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        return str(self._map)
+
+    # ------------------ Single-flight loading ------------------------- #
+
+    def _start(self, keys: list, load) -> list:
+        """
+        Receives distinct keys not loading yet and a coroutine returning
+            their values as a list in the same order
+        Runs the coroutine in its own task, so cancelling one waiter
+            does not cancel the load for the others
+        Returns the future each key's value will be set on
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key in keys:
+            future = loop.create_future()
+            future.add_done_callback(_consume)
+            self._loading[key] = future
+            futures.append(future)
+        task = loop.create_task(self._run(keys, futures, load))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return futures
+
+    async def _run(self, keys: list, futures: list, load) -> None:
+        """
+        Receives the keys, futures and coroutine of a load
+        Awaits the coroutine, then stores every value in the map and
+            sets it on its future; a failure is set on every future
+            instead and nothing is stored
+        A key put, removed or cleared during the load is not overwritten
+            by the loaded value, though its waiters still receive it
+        """
+        try:
+            values = await load
+            if len(values) != len(keys):
+                raise ValueError("loader returned " + str(len(values)) +
+                                 " values for " + str(len(keys)) + " keys")
+        except BaseException as error:
+            for key, future in zip(keys, futures):
+                if self._loading.get(key) is future:
+                    del self._loading[key]
+                if isinstance(error, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+            if not isinstance(error, Exception):
+                raise
+            return
+
+        for key, value, future in zip(keys, values, futures):
+            if self._loading.get(key) is future:
+                del self._loading[key]
+                self._map.put(key, value)
+            future.set_result(value)
+
+    async def get_or_load(self, key: str, loader: callable) -> object:
+        """
+        Receives a key and an async function loading the value of a key
+        Returns the value for key, loading and storing it on a miss
+        Concurrent misses on the same key share one call of loader
+            instead of each calling the backend; if it raises, every one
+            of them raises the same exception
+        """
+        value = self._map.get(key)
+        if value is not None:
+            return value
+        future = self._loading.get(key)
+        if future is None:
+            future, = self._start([key], _load_one(loader, key))
+        return await asyncio.shield(future)
+
+    async def get_many_or_load(self, keys, loader: callable,
+                               batch_size: int = None) -> list:
+        """
+        Receives an iterable of keys, an async function taking a list of
+            keys and returning the list of their values, and the most
+            keys to pass per call (None for no limit)
+        Returns the list of values of the keys, in order: present keys
+            are read in one get_many, keys another call is loading are
+            waited on, and the remaining distinct keys are loaded in
+            concurrent batches of batch_size
+        """
+        keys = list(keys)
+        values = self._map.get_many(keys)
+
+        waiting = {}
+        new_keys = []
+        for key, value in zip(keys, values):
+            if value is None and key not in waiting:
+                waiting[key] = self._loading.get(key)
+                if waiting[key] is None:
+                    new_keys.append(key)
+
+        size = batch_size or max(len(new_keys), 1)
+        for start in range(0, len(new_keys), size):
+            batch = new_keys[start:start + size]
+            for key, future in zip(batch, self._start(batch, loader(batch))):
+                waiting[key] = future
+
+        for i, key in enumerate(keys):
+            if values[i] is None:
+                values[i] = await asyncio.shield(waiting[key])
+        return values
+
+    def loading(self) -> int:
+        """
+        Returns the number of keys with a load in flight
+        """
+        return len(self._loading)
+
+    # ------------------ Cooperative resize and clear ------------------ #
+
+    def _migrates(self) -> bool:
+        """
+        Returns True if the map can migrate its table a step at a time:
+            the SC map and the quadratic probing OA map
+        """
+        if isinstance(self._map, hash_map_sc.HashMap):
+            return True
+        return (type(self._map) is hash_map_oa.HashMap
+                and not self._map._robin_hood)
+
+    async def _migrate(self) -> None:
+        """
+        Completes any resize in progress a step at a time, yielding
+            between steps; operations meanwhile find keys in either table
+        """
+        m = self._map
+        while m._old_buckets is not None:
+            with gc_paused():
+                m._rehash_step(self._step)
+            await asyncio.sleep(0)
+
+    async def _release(self, tables: list) -> None:
+        """
+        Receives old tables (DynamicArrays or lists) no longer in the map
+        Drops their contents a step at a time, yielding between steps,
+            so freeing millions of entries does not happen in one go
+        """
+        for table in tables:
+            length = table.length() if isinstance(table, DynamicArray) else len(table)
+            for start in range(0, length, self._step):
+                for i in range(start, min(start + self._step, length)):
+                    table[i] = None
+                await asyncio.sleep(0)
+
+    async def _empty_buckets(self) -> list:
+        """
+        Returns a list of empty LinkedLists, one per bucket of the SC
+            map, allocated a step at a time and matched to its capacity
+            as it stands when this returns
+        """
+        buckets = []
+        while len(buckets) != self._map.get_capacity():
+            capacity = self._map.get_capacity()
+            if len(buckets) > capacity:
+                del buckets[capacity:]
+                continue
+            count = min(self._step, capacity - len(buckets))
+            with gc_paused():
+                buckets.extend(LinkedList() for _ in range(count))
+            await asyncio.sleep(0)
+        return buckets
+
+    async def resize_table(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Resizes as the map's resize_table does, but migrates entries a
+            step at a time and yields between steps
+        Robin Hood and compact OA maps cannot migrate incrementally and
+            resize in one call
+        """
+        m = self._map
+        if not self._migrates():
+            m.resize_table(new_capacity)
+            return
+        await self._migrate()
+        if isinstance(m, hash_map_sc.HashMap):
+            if new_capacity < 1:
+                return
+        elif new_capacity <= m.get_size():
+            return
+        m._begin_rehash(m._resize_target(new_capacity))
+        await self._migrate()
+
+    async def clear(self) -> None:
+        """
+        Clears the contents of the hash map, capacity unchanged
+        The empty SC table is built a step at a time before it replaces
+            the old one in a single step (operations until then happen
+            before the clear), and the old entries are released a step
+            at a time afterwards
+        """
+        m = self._map
+        if isinstance(m, hash_map_sc.HashMap):
+            buckets = await self._empty_buckets()
+            old_tables = [m._buckets, m._old_buckets]
+            m._buckets = DynamicArray(buckets)
+            m._old_buckets = None
+            m._size = 0
+            m._version += 1
+        elif isinstance(m, hash_map_oa.CompactHashMap):
+            old_tables = [m._keys, m._values]
+            m.clear()
+        else:
+            old_tables = [m._buckets, m._old_buckets]
+            m.clear()
+        self._loading.clear()
+        await self._release([table for table in old_tables if table is not None])
+
+    # ------------------ Map operations -------------------------------- #
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        A load in flight for key no longer stores its value
+        """
+        self._loading.pop(key, None)
+        self._map.put(key, value)
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        A load in flight for key no longer stores its value
+        """
+        self._loading.pop(key, None)
+        self._map.remove(key)
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        return self._map.get(key)
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns the list of their values, None for keys not found
+        """
+        return self._map.get_many(keys)
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        return self._map.contains_key(key)
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._map.get_size()
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._map.get_capacity()
+
+    def table_load(self) -> float:
+        """
+        Returns the load factor of the map
+        """
+        return self._map.table_load()
+
+    def keys(self):
+        """
+        Returns a generator over every key
+        """
+        return self._map.keys()
+
+    def values(self):
+        """
+        Returns a generator over every value
+        """
+        return self._map.values()
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair
+        """
+        return self._map.items()
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        return self._map.get_keys_and_values()
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    import time
+
+    async def main():
+
+        print("\nsingle-flight example 1")
+        print("-----------------------")
+        calls = []
+
+        async def load(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key.upper()
+
+        m = AsyncHashMap()
+        results = await asyncio.gather(*(m.get_or_load('k' + str(i % 3), load)
+                                         for i in range(50)))
+        print(sorted(set(results)), len(calls), m.get_size(), m.loading())
+        await m.get_or_load('k0', load)
+        print(len(calls))
+
+        print("\nfailed load example 1")
+        print("---------------------")
+
+        async def fail(key):
+            await asyncio.sleep(0.01)
+            raise KeyError(key)
+
+        results = await asyncio.gather(*(m.get_or_load('bad', fail) for _ in range(5)),
+                                       return_exceptions=True)
+        print([type(result).__name__ for result in results], m.contains_key('bad'))
+
+        print("\nbatch load example 1")
+        print("--------------------")
+        batches = []
+
+        async def load_many(keys):
+            batches.append(len(keys))
+            await asyncio.sleep(0.01)
+            return [key.upper() for key in keys]
+
+        m = AsyncHashMap(hash_map_oa.HashMap(11, hash))
+        m.put('a', 'present')
+        values = await asyncio.gather(
+            m.get_many_or_load(['a', 'b', 'c', 'b', 'd', 'e'], load_many, batch_size=2),
+            m.get_or_load('c', load))
+        print(values, batches)
+
+        print("\ncooperative resize / clear example 1")
+        print("------------------------------------")
+        # the longest the event loop waits during the cooperative resize
+        #   and clear is well under what the blocking calls take
+        for make in (lambda: hash_map_sc.HashMap(11, hash),
+                     lambda: hash_map_oa.HashMap(11, hash)):
+            blocking = make()
+            for i in range(200000):
+                blocking.put(i, i)
+            start = time.perf_counter()
+            blocking.resize_table(blocking.get_capacity() * 4)
+            blocking.clear()
+            blocking = time.perf_counter() - start
+
+            m = AsyncHashMap(make())
+            for i in range(200000):
+                m.put(i, i)
+            longest = 0.0
+            done = False
+
+            async def ticker():
+                nonlocal longest
+                last = time.perf_counter()
+                while not done:
+                    await asyncio.sleep(0)
+                    now = time.perf_counter()
+                    longest = max(longest, now - last)
+                    last = now
+
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            await m.resize_table(m.get_capacity() * 4)
+            resized = m.get_capacity(), m.get(123456)
+            await m.clear()
+            done = True
+            await task
+            print(type(m._map).__module__, resized, m.get_size(), longest < blocking)
+
+    asyncio.run(main())
@@ -0,0 +1,993 @@
+# Name: Kent Tolzmann
+# Description: Benchmarks and reports for the HashMap implementations
+#              usage: python hash_map_bench.py [benchmark] [size]
+
+import asyncio
+import gc
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import a6_include
+from a6_include import (fnv1a_hash, hash_and_index_many, hash_function_1,
+                        hash_function_2, make_seeded_hash, sip_hash, wy_hash)
+import hash_map_async
+import hash_map_cache
+import hash_map_concurrent
+import hash_map_cuckoo
+import hash_map_mmap
+import hash_map_oa
+import hash_map_od
+import hash_map_sc
+import hash_map_shared
+import hash_map_sharded
+import hash_map_wal
+
+
+# every full-API engine: (label, class)
+ENGINES = (
+    ('hash_map_sc', hash_map_sc.HashMap),
+    ('hash_map_oa', hash_map_oa.HashMap),
+    ('hash_map_oa compact', hash_map_oa.CompactHashMap),
+    ('hash_map_od', hash_map_od.HashMap),
+    ('hash_map_cuckoo', hash_map_cuckoo.HashMap),
+)
+
+
+HASH_FUNCTIONS = (
+    ('hash_function_1', hash_function_1),
+    ('hash_function_2', hash_function_2),
+    ('fnv1a_hash', fnv1a_hash),
+    ('sip_hash (seeded)', make_seeded_hash(sip_hash)),
+    ('wy_hash (seeded)', make_seeded_hash(wy_hash)),
+)
+
+
+def _timed(function: callable, *args) -> float:
+    """
+    Receives a function and its arguments
+    Returns the wall-clock seconds the call took
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _report(label: str, seconds: float, ops: int) -> None:
+    """
+    Prints a benchmark line with total time and throughput
+    """
+    rate = ops / seconds if seconds else float('inf')
+    print(label.ljust(48), str(round(seconds, 3)).rjust(8), 's',
+          str(round(rate / 1000, 1)).rjust(10), 'k ops/s')
+
+
+def key_shapes(n: int) -> dict:
+    """
+    Receives a number of keys
+    Returns a dict of key shape name -> list of n keys of that shape
+    """
+    digits = [str(i).zfill(len(str(n - 1))) for i in range(n)]
+    return {
+        'str<i>': ['str' + str(i) for i in range(n)],
+        'key<i>': ['key' + str(i) for i in range(n)],
+        'anagrams': ['str' + d[::-1] if i % 2 else 'str' + d
+                     for i, d in enumerate(digits)],
+        'url': ['https://example.com/session/' + str(i) + '/item?id=' + str(i * 7)
+                for i in range(n)],
+    }
+
+
+def _histogram(lengths: list) -> str:
+    """
+    Receives a list of lengths
+    Returns a one-line histogram "length:count" with max and mean
+    """
+    counts = {}
+    for length in lengths:
+        counts[length] = counts.get(length, 0) + 1
+
+    shown = sorted(counts)
+    out = ' '.join(str(k) + ':' + str(counts[k]) for k in shown[:8])
+    if len(shown) > 8:
+        out += ' ... (' + str(len(shown) - 8) + ' more)'
+    mean = sum(lengths) / len(lengths) if lengths else 0
+    return out + ' | max ' + str(max(lengths, default=0)) + ' mean ' + str(round(mean, 2))
+
+
+def _chain_lengths(keys: list, function: callable) -> list:
+    """
+    Receives keys and a hash function
+    Returns the chain length of every bucket of a SC HashMap holding keys
+    """
+    m = hash_map_sc.HashMap(len(keys), function)
+    for key in keys:
+        m.put(key, None)
+    return [m._buckets.get_at_index(i).length() for i in range(m.get_capacity())]
+
+
+def _probe_lengths(keys: list, function: callable) -> list:
+    """
+    Receives keys and a hash function
+    Returns the number of quadratic probes each key needed when inserted
+        into an open addressing table kept at the 0.5 load threshold
+    """
+    capacity = hash_map_sc.HashMap(2 * len(keys) + 1).get_capacity()
+    table = [False] * capacity
+    lengths = []
+    for key in keys:
+        i_init = function(key) % capacity
+        i, j = i_init, 0
+        while table[i]:
+            j += 1
+            i = (i_init + j ** 2) % capacity
+        table[i] = True
+        lengths.append(j)
+    return lengths
+
+
+def hash_distribution_report(n: int = 10000) -> None:
+    """
+    Receives a number of keys per key shape
+    Prints chain-length (SC) and probe-length (OA) histograms
+        for every hash function on every key shape
+    """
+    for shape, keys in key_shapes(n).items():
+        print("\nkeys: " + shape + " (" + str(n) + ")")
+        print("-" * 40)
+        for name, function in HASH_FUNCTIONS:
+            print(name)
+            print("  SC chain lengths:", _histogram(_chain_lengths(keys, function)))
+            print("  OA probe lengths:", _histogram(_probe_lengths(keys, function)))
+
+
+def _put_all(m, keys: list) -> None:
+    """Put every key into the map."""
+    for key in keys:
+        m.put(key, key)
+
+
+def _get_all(m, keys: list) -> None:
+    """Get every key from the map."""
+    for key in keys:
+        m.get(key)
+
+
+def _remove_all(m, keys: list) -> None:
+    """Remove every key from the map."""
+    for key in keys:
+        m.remove(key)
+
+
+def capacity_policy_benchmark(n: int = 1000000) -> None:
+    """
+    Receives a number of keys
+    Compares prime and pow2 capacity policies on both engines
+        (builtin hash keeps the hash cost out of the comparison)
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    for engine in (hash_map_sc, hash_map_oa):
+        for policy in ("prime", "pow2"):
+            label = engine.__name__ + ' ' + policy
+            m = engine.HashMap(11, hash, capacity_policy=policy)
+            _report(label + ' put', _timed(_put_all, m, keys), n)
+            _report(label + ' get', _timed(_get_all, m, keys), n)
+
+
+def _percentile(sorted_values: list, fraction: float):
+    """
+    Receives a sorted list and a fraction in [0, 1]
+    Returns the value at that percentile
+    """
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def put_latency_benchmark(n: int = 1000000) -> None:
+    """
+    Receives a number of keys
+    Times every single put and prints p50/p99/p999/max latencies
+        with and without incremental resizing for both engines
+    """
+    clock = time.perf_counter_ns
+    keys = ['key' + str(i) for i in range(n)]
+    print('engine'.ljust(32), 'p50 us'.rjust(9), 'p99 us'.rjust(9),
+          'p999 us'.rjust(9), 'max ms'.rjust(9))
+    for engine in (hash_map_sc, hash_map_oa):
+        for incremental in (False, True):
+            m = engine.HashMap(11, hash, incremental_resize=incremental)
+            latencies = []
+
+            # cyclic GC pauses would hide the resize spikes being measured
+            gc.disable()
+            for key in keys:
+                start = clock()
+                m.put(key, key)
+                latencies.append(clock() - start)
+            gc.enable()
+            latencies.sort()
+            label = engine.__name__ + (' incremental' if incremental else ' full')
+            print(label.ljust(32),
+                  str(round(_percentile(latencies, 0.5) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.99) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.999) / 1000, 2)).rjust(9),
+                  str(round(latencies[-1] / 1e6, 2)).rjust(9))
+
+
+def lookup_latency_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Times every single get of a present and of a missing key and prints
+        p50/p99/p999/max latencies for the SC, OA and cuckoo engines
+    """
+    clock = time.perf_counter_ns
+    keys = ['key' + str(i) for i in range(n)]
+    missing = ['missing' + str(i) for i in range(n)]
+    print('engine'.ljust(32), 'p50 us'.rjust(9), 'p99 us'.rjust(9),
+          'p999 us'.rjust(9), 'max us'.rjust(9))
+    for engine in (hash_map_sc, hash_map_oa, hash_map_cuckoo):
+        m = engine.HashMap(11, hash)
+        _put_all(m, keys)
+        for kind, lookups in (('present', keys), ('missing', missing)):
+            latencies = []
+            gc.disable()
+            for key in lookups:
+                start = clock()
+                m.get(key)
+                latencies.append(clock() - start)
+            gc.enable()
+            latencies.sort()
+            label = engine.__name__ + ' get ' + kind
+            print(label.ljust(32),
+                  str(round(_percentile(latencies, 0.5) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.99) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.999) / 1000, 2)).rjust(9),
+                  str(round(latencies[-1] / 1000, 2)).rjust(9))
+
+
+def cuckoo_benchmark(n: int = 50000) -> None:
+    """
+    Receives a number of keys
+    Puts and gets keys with each engine's default hash_function_1, whose
+        many collisions the cuckoo map's seeded second hash must absorb,
+        and prints the cuckoo map's capacity and stash
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    for engine in (hash_map_sc, hash_map_cuckoo):
+        m = engine.HashMap()
+        label = engine.__name__ + ' hash_function_1'
+        _report(label + ' put', _timed(_put_all, m, keys), n)
+        _report(label + ' get', _timed(_get_all, m, keys), n)
+    print('hash_map_cuckoo'.ljust(48), 'capacity', m.get_capacity(),
+          'load', round(m.table_load(), 2), 'stash', len(m._stash))
+
+
+def _rebuild_by_put(m) -> None:
+    """Copy a map into a fresh one of double capacity one put at a time."""
+    copy = type(m)(m.get_capacity() * 2, m._hash_function)
+    pairs = m.get_keys_and_values()
+    for i in range(pairs.length()):
+        key, value = pairs.get_at_index(i)
+        copy.put(key, value)
+
+
+def resize_benchmark(n: int = None) -> None:
+    """
+    Receives a number of entries (default: 100k and 1M; 10M needs ~10 GB)
+    Times resize_table to double capacity on both engines against
+        rebuilding the same map through put()
+    """
+    for size in ((n,) if n else (100000, 1000000)):
+        keys = ['key' + str(i) for i in range(size)]
+        for engine in (hash_map_sc, hash_map_oa):
+            m = engine.HashMap(11, hash)
+            _put_all(m, keys)
+            label = engine.__name__ + ' ' + str(size)
+            _report(label + ' put() rebuild', _timed(_rebuild_by_put, m), size)
+            _report(label + ' resize_table', _timed(m.resize_table, m.get_capacity() * 2), size)
+
+
+def long_key_benchmark(n: int = 100000) -> None:
+    """
+    Receives a number of keys
+    Times get of every key and one doubling resize_table for
+        64- and 256-char URL-like keys hashed with wy_hash
+    """
+    for length in (64, 256):
+        keys = []
+        for i in range(n):
+            suffix = '/item?id=' + str(i)
+            prefix = 'https://example.com/' + 'p' * (length - 20 - len(suffix))
+            keys.append(prefix + suffix)
+        for engine in (hash_map_sc, hash_map_oa):
+            m = engine.HashMap(11, wy_hash)
+            _put_all(m, keys)
+            label = engine.__name__ + ' ' + str(length) + '-char'
+            _report(label + ' get', _timed(_get_all, m, keys), n)
+            _report(label + ' resize_table', _timed(m.resize_table, m.get_capacity() * 2), n)
+
+
+def _traced_bytes(build: callable) -> int:
+    """
+    Receives a function that builds a structure
+    Returns the bytes still allocated by the call once it has returned
+        (the structure is kept alive until measurement is done)
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    structure = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del structure
+    return after - before
+
+
+def memory_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Prints bytes per entry of each engine holding n entries,
+        not counting the key and value objects themselves
+    """
+    keys = ['key' + str(i) for i in range(n)]
+
+    def build(engine_class):
+        m = engine_class(11, hash)
+        for key in keys:
+            m.put(key, key)
+        return m
+
+    for label, engine_class in ENGINES:
+        size = _traced_bytes(lambda: build(engine_class))
+        print(label.ljust(48), str(round(size / n, 1)).rjust(8), 'bytes/entry')
+
+
+def _keys_and_values(m) -> None:
+    """Materialize every pair of the map."""
+    m.get_keys_and_values()
+
+
+def engines_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Compares put, get, remove and get_keys_and_values across engines,
+        plus iteration of a sparse table (n / 100 keys left after removes)
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    for label, engine_class in ENGINES:
+        m = engine_class(11, hash)
+        _report(label + ' put', _timed(_put_all, m, keys), n)
+        _report(label + ' get', _timed(_get_all, m, keys), n)
+        _report(label + ' get_keys_and_values', _timed(_keys_and_values, m), n)
+        _report(label + ' remove 99%', _timed(_remove_all, m, keys[n // 100:]), n - n // 100)
+        _report(label + ' sparse get_keys_and_values', _timed(_keys_and_values, m), n // 100)
+
+
+def batch_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Compares put_many, get_many and remove_many against loops of
+        put, get and remove on the SC and OA maps
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    pairs = [(key, key) for key in keys]
+    for label, engine_class in ENGINES[:3]:
+        single, batch = engine_class(11, hash), engine_class(11, hash)
+        _report(label + ' put loop', _timed(_put_all, single, keys), n)
+        _report(label + ' put_many', _timed(batch.put_many, pairs), n)
+        _report(label + ' get loop', _timed(_get_all, single, keys), n)
+        _report(label + ' get_many', _timed(batch.get_many, keys), n)
+        _report(label + ' remove loop', _timed(_remove_all, single, keys), n)
+        _report(label + ' remove_many', _timed(batch.remove_many, keys), n)
+
+
+def presize_benchmark(n: int = 1000000) -> None:
+    """
+    Receives a number of keys
+    Times building the SC and OA maps through put from a default
+        capacity against one built by with_expected_size, then removes
+        90% of the keys and times shrink_to_fit
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    for engine in (hash_map_sc, hash_map_oa):
+        grown = engine.HashMap(11, hash)
+        _report(engine.__name__ + ' put from capacity 11', _timed(_put_all, grown, keys), n)
+        presized = engine.HashMap.with_expected_size(n, hash)
+        _report(engine.__name__ + ' put with_expected_size', _timed(_put_all, presized, keys), n)
+
+        _remove_all(presized, keys[n // 10:])
+        before = presized.get_capacity()
+        _report(engine.__name__ + ' shrink_to_fit', _timed(presized.shrink_to_fit), n // 10)
+        print((engine.__name__ + ' capacity').ljust(48), before, '->', presized.get_capacity())
+
+
+def _scalar_hash_and_index(function: callable, keys: list, capacity: int) -> list:
+    """Hash every key and reduce it modulo capacity one at a time."""
+    return [function(key) % capacity for key in keys]
+
+
+def _put_many_without_numpy(m, pairs: list) -> None:
+    """Run put_many with the NumPy path switched off."""
+    np, a6_include.np = a6_include.np, None
+    try:
+        m.put_many(pairs)
+    finally:
+        a6_include.np = np
+
+
+def vector_hash_benchmark(n: int = 1000000) -> None:
+    """
+    Receives a number of keys
+    Compares hash_and_index_many against per-key scalar hashing for
+        hash_function_1 and hash_function_2, then times SC and OA
+        put_many of n / 50 URL keys with and without the NumPy path
+    """
+    if a6_include.np is None:
+        print('numpy not installed: hash_and_index_many runs the scalar fallback')
+    keys = ['key' + str(i) for i in range(n)]
+    for name, function in (('hash_function_1', hash_function_1),
+                           ('hash_function_2', hash_function_2)):
+        _report(name + ' scalar hash + index',
+                _timed(_scalar_hash_and_index, function, keys, 1000003), n)
+        _report(name + ' hash_and_index_many',
+                _timed(hash_and_index_many, function, keys, 1000003), n)
+
+    # longer keys, where per-character hashing costs the most; still
+    # only about one distinct hash_function_2 value per 9 keys
+    pairs = [(key, key) for key in key_shapes(n // 50)['url']]
+    for engine in (hash_map_sc, hash_map_oa):
+        label = engine.__name__ + ' put_many hash_function_2'
+        _report(label + ' scalar', _timed(_put_many_without_numpy,
+                                          engine.HashMap(11, hash_function_2), pairs), len(pairs))
+        _report(label, _timed(engine.HashMap(11, hash_function_2).put_many, pairs), len(pairs))
+
+
+def _find_mode_by_put(values: list) -> tuple:
+    """Count with contains_key, get and put per value, like the original find_mode."""
+    m = hash_map_sc.HashMap()
+    for value in values:
+        if m.contains_key(value):
+            m.put(value, m.get(value) + 1)
+        else:
+            m.put(value, 1)
+    return max(freq for key, freq in m.items())
+
+
+def find_mode_benchmark(n: int = 500000) -> None:
+    """
+    Receives a number of values
+    Times find_mode over n skewed word tokens counted with
+        contains_key / get / put against the single-lookup increment
+        path, then find_top_k and the np.unique path for integers
+    """
+    tokens = ['word' + str(int(1000 / (i % 997 + 1))) for i in range(n)]
+    _report('find_mode contains_key/get/put', _timed(_find_mode_by_put, tokens), n)
+    _report('find_mode increment', _timed(hash_map_sc.find_mode, tokens), n)
+    _report('find_mode increment, generator input',
+            _timed(hash_map_sc.find_mode, iter(tokens)), n)
+    _report('find_top_k 10', _timed(hash_map_sc.find_top_k, tokens, 10), n)
+
+    numbers = [i * 7919 % 1013 for i in range(n)]
+    _report('find_mode ints, builtin hash', _timed(hash_map_sc.find_mode, numbers, hash), n)
+    if a6_include.np is not None:
+        array = a6_include.np.array(numbers)
+        _report('find_mode ints, np.unique', _timed(hash_map_sc.find_mode, array), n)
+
+
+def _count_by_get_put(m, tokens: list) -> None:
+    """Count tokens with contains_key, get and put per token."""
+    for token in tokens:
+        if m.contains_key(token):
+            m.put(token, m.get(token) + 1)
+        else:
+            m.put(token, 1)
+
+
+def _count_by_increment(m, tokens: list) -> None:
+    """Count tokens with one increment per token."""
+    for token in tokens:
+        m.increment(token)
+
+
+def _group_by_setdefault(m, tokens: list) -> None:
+    """Group token positions into lists with setdefault."""
+    for i, token in enumerate(tokens):
+        m.setdefault(token, []).append(i)
+
+
+def upsert_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of tokens
+    Times counting n skewed tokens with contains_key / get / put
+        against increment, and grouping them with setdefault,
+        on the SC map and every OA variant
+    """
+    tokens = ['word' + str(int(1000 / (i % 997 + 1))) for i in range(n)]
+    maps = (
+        ('hash_map_sc', lambda: hash_map_sc.HashMap(11, hash)),
+        ('hash_map_oa', lambda: hash_map_oa.HashMap(11, hash)),
+        ('hash_map_oa robin_hood', lambda: hash_map_oa.HashMap(11, hash, probing="robin_hood")),
+        ('hash_map_oa compact', lambda: hash_map_oa.CompactHashMap(11, hash)),
+    )
+    for label, make in maps:
+        _report(label + ' contains_key/get/put', _timed(_count_by_get_put, make(), tokens), n)
+        _report(label + ' increment', _timed(_count_by_increment, make(), tokens), n)
+        _report(label + ' setdefault', _timed(_group_by_setdefault, make(), tokens), n)
+
+
+def _peak_bytes(function: callable, *args) -> int:
+    """
+    Receives a function and its arguments
+    Returns the peak bytes allocated while the call ran
+    """
+    gc.collect()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def _walk_copy(m) -> None:
+    """Visit every pair through a get_keys_and_values copy."""
+    arr = m.get_keys_and_values()
+    for i in range(arr.length()):
+        arr.get_at_index(i)
+
+
+def _walk_items(m) -> None:
+    """Visit every pair through the items generator."""
+    for pair in m.items():
+        pass
+
+
+def iteration_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Compares the time and peak extra memory of walking every pair
+        through get_keys_and_values against the items generator
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    maps = (
+        ('hash_map_sc', hash_map_sc.HashMap(11, hash)),
+        ('hash_map_oa', hash_map_oa.HashMap(11, hash)),
+        ('hash_map_oa compact', hash_map_oa.CompactHashMap(11, hash)),
+    )
+    for label, m in maps:
+        _put_all(m, keys)
+        for name, walk in (('get_keys_and_values', _walk_copy), ('items', _walk_items)):
+            _report(label + ' ' + name, _timed(walk, m), n)
+            print((label + ' ' + name + ' peak').ljust(48),
+                  str(round(_peak_bytes(walk, m) / 1024)).rjust(8), 'KiB')
+
+
+def mmap_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Builds an n-key hash_map_mmap map in a temporary directory, then
+        prints random get p50/p99/p999/max latencies for present and
+        missing keys, the time to reopen it and its file sizes
+    For the disk-bound case, use an n whose files (about 32 bytes of
+        slots plus the log record per key) exceed RAM, e.g. 10x
+    """
+    clock = time.perf_counter_ns
+    keys = ['key' + str(i) for i in range(n)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'map')
+        m = hash_map_mmap.HashMap(path)
+        _report('hash_map_mmap put', _timed(_put_all, m, keys), n)
+
+        lookups = {'present': random.Random(0).sample(keys, min(n, 100000)),
+                   'missing': ['missing' + str(i) for i in range(min(n, 100000))]}
+        print('engine'.ljust(32), 'p50 us'.rjust(9), 'p99 us'.rjust(9),
+              'p999 us'.rjust(9), 'max us'.rjust(9))
+        for kind in ('present', 'missing'):
+            latencies = []
+            for key in lookups[kind]:
+                start = clock()
+                m.get(key)
+                latencies.append(clock() - start)
+            latencies.sort()
+            label = 'hash_map_mmap get ' + kind
+            print(label.ljust(32),
+                  str(round(_percentile(latencies, 0.5) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.99) / 1000, 2)).rjust(9),
+                  str(round(_percentile(latencies, 0.999) / 1000, 2)).rjust(9),
+                  str(round(latencies[-1] / 1000, 2)).rjust(9))
+        m.close()
+
+        seconds = _timed(lambda: hash_map_mmap.HashMap(path).close())
+        print('hash_map_mmap reopen'.ljust(48), str(round(seconds * 1000, 2)).rjust(8), 'ms')
+        for name in (path, m.get_log_path()):
+            print(os.path.basename(name).ljust(48),
+                  str(round(os.path.getsize(name) / 2 ** 20, 1)).rjust(8), 'MiB')
+
+
+def snapshot_benchmark(n: int = 1000000) -> None:
+    """
+    Receives a number of keys
+    Compares starting up an n-key map by replaying put against
+        load from a dump snapshot, for the SC and OA maps
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    maps = (
+        ('hash_map_sc', hash_map_sc.HashMap),
+        ('hash_map_oa', hash_map_oa.HashMap),
+        ('hash_map_oa compact', hash_map_oa.CompactHashMap),
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'snapshot')
+        for label, engine_class in maps:
+            m = engine_class(11, hash)
+            _report(label + ' startup by put', _timed(_put_all, m, keys), n)
+            _report(label + ' dump', _timed(m.dump, path), n)
+            _report(label + ' startup by load', _timed(engine_class.load, path, hash), n)
+            print((label + ' snapshot').ljust(48),
+                  str(round(os.path.getsize(path) / 2 ** 20, 1)).rjust(8), 'MiB')
+
+
+def wal_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Compares put throughput of an in-memory SC map against
+        DurableHashMap with group commit, and with an fsync per put
+        for n / 100 keys, commit and close included
+    Both hash with fnv1a_hash, since snapshots need a deterministic hash
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    _report('hash_map_sc put in memory',
+            _timed(_put_all, hash_map_sc.HashMap(11, fnv1a_hash), keys), n)
+    with tempfile.TemporaryDirectory() as directory:
+        for label, count, options in (('group commit', n, {}),
+                                      ('fsync per put', n // 100, {'commit_every': 1})):
+            m = hash_map_wal.DurableHashMap(os.path.join(directory, label), fnv1a_hash, **options)
+            seconds = _timed(_put_all, m, keys[:count]) + _timed(m.close)
+            _report('hash_map_wal put ' + label, seconds, count)
+
+        path = os.path.join(directory, 'group commit')
+        m = hash_map_wal.DurableHashMap(path, fnv1a_hash)
+        _report('hash_map_wal checkpoint', _timed(m.checkpoint), n)
+        m.close()
+        _report('hash_map_wal reopen from snapshot',
+                _timed(hash_map_wal.DurableHashMap, path, fnv1a_hash), n)
+
+
+class _LockedHashMap:
+    """
+    hash_map_sc.HashMap behind one global lock, the baseline for
+        the concurrent benchmark
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty map and its lock."""
+        self._map = hash_map_sc.HashMap(16, hash, capacity_policy="pow2")
+        self._lock = threading.Lock()
+
+    def put(self, key: str, value: object) -> None:
+        """Put under the lock."""
+        with self._lock:
+            self._map.put(key, value)
+
+    def get(self, key: str) -> object:
+        """Get under the lock."""
+        with self._lock:
+            return self._map.get(key)
+
+
+def _read_write(m, keys: list, start: int, count: int) -> None:
+    """Run count operations from keys[start:], a put every tenth, else a get."""
+    for i in range(start, start + count):
+        key = keys[i % len(keys)]
+        if i % 10 == 0:
+            m.put(key, i)
+        else:
+            m.get(key)
+
+
+def concurrent_benchmark(n: int = 400000) -> None:
+    """
+    Receives a number of operations
+    Splits n operations (90% get, 10% put) across 1, 2, 4 and 8 threads
+        on a shared ConcurrentHashMap and on an SC map behind one lock
+        and prints the combined throughput
+    Only a free-threaded (no-GIL) build can scale with threads
+    """
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('GIL enabled' if gil else 'free-threaded build')
+    keys = ['key' + str(i) for i in range(n // 10)]
+    maps = (('hash_map_concurrent', lambda: hash_map_concurrent.ConcurrentHashMap(16, hash)),
+            ('hash_map_sc global lock', _LockedHashMap))
+    for label, make in maps:
+        for count in (1, 2, 4, 8):
+            m = make()
+            _put_all(m, keys)
+            share = n // count
+            threads = [threading.Thread(target=_read_write, args=(m, keys, t * share, share))
+                       for t in range(count)]
+
+            def run():
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            _report(label + ' ' + str(count) + ' threads', _timed(run), share * count)
+
+
+def _cache_lookups(c, keys: list) -> None:
+    """Look up every key, loading misses with an identity loader."""
+    for key in keys:
+        c.get_or_load(key, str)
+
+
+def cache_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of lookups
+    Runs n lookups of a skewed (Pareto) key stream through LRU and LFU
+        caches bounded to a tenth of the distinct keys, by count and by
+        estimated bytes, and prints their throughput and counters next
+        to an unbounded SC map
+    """
+    rng = random.Random(0)
+    keys = ['key' + str(int(rng.paretovariate(0.5))) for _ in range(n)]
+    distinct = len(set(keys))
+    limit = max(distinct // 10, 1)
+    budget = limit * hash_map_cache.estimate_bytes(keys[0], keys[0])
+
+    m = hash_map_sc.HashMap(16, hash, capacity_policy="pow2")
+
+    def unbounded():
+        for key in keys:
+            if m.get(key) is None:
+                m.put(key, key)
+
+    _report('hash_map_sc unbounded, ' + str(distinct) + ' keys', _timed(unbounded), n)
+    caches = (('lru max_entries=' + str(limit), dict(max_entries=limit)),
+              ('lfu max_entries=' + str(limit), dict(max_entries=limit, policy="lfu")),
+              ('lru max_bytes=' + str(budget), dict(max_bytes=budget)))
+    for label, options in caches:
+        c = hash_map_cache.CacheHashMap(function=hash, **options)
+        _report('hash_map_cache ' + label, _timed(_cache_lookups, c, keys), n)
+        print(' ' * 4, c.get_size(), 'entries', c.get_stats())
+
+
+async def _longest_stall(operation) -> float:
+    """
+    Receives a coroutine
+    Returns the longest seconds the event loop went without running a
+        ticker task while the coroutine ran
+    """
+    longest = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    await operation
+    done = True
+    await task
+    return longest
+
+
+async def _blocking(function: callable, *args) -> None:
+    """Call function inside a coroutine without yielding."""
+    function(*args)
+
+
+def async_benchmark(n: int = 500000) -> None:
+    """
+    Receives a number of entries
+    Counts backend calls when 1000 coroutines miss the same key with
+        and without single-flight loading, then prints the longest event
+        loop stall of resize_table and clear on n entries, blocking and
+        cooperative
+    """
+    calls = [0]
+
+    async def load(key):
+        calls[0] += 1
+        await asyncio.sleep(0.001)
+        return key
+
+    async def stampede():
+        m = hash_map_sc.HashMap(16, hash)
+
+        async def naive(key):
+            value = m.get(key)
+            if value is None:
+                value = await load(key)
+                m.put(key, value)
+            return value
+
+        calls[0] = 0
+        await asyncio.gather(*(naive('hot') for _ in range(1000)))
+        print('loader calls, get then put'.ljust(48), calls[0])
+        a = hash_map_async.AsyncHashMap(hash_map_sc.HashMap(16, hash))
+        calls[0] = 0
+        await asyncio.gather(*(a.get_or_load('hot', load) for _ in range(1000)))
+        print('loader calls, get_or_load'.ljust(48), calls[0])
+
+    async def stalls():
+        for label, make in (('hash_map_sc', lambda: hash_map_sc.HashMap(16, hash)),
+                            ('hash_map_oa', lambda: hash_map_oa.HashMap(16, hash))):
+            for mode in ('blocking', 'cooperative'):
+                a = hash_map_async.AsyncHashMap(make())
+                for i in range(n):
+                    a.put(i, i)
+                capacity = a.get_capacity() * 2
+                if mode == 'blocking':
+                    resize = _blocking(a._map.resize_table, capacity)
+                    clear = _blocking(a._map.clear)
+                else:
+                    resize, clear = a.resize_table(capacity), a.clear()
+                print((label + ' ' + mode + ' resize / clear stall').ljust(48),
+                      round(await _longest_stall(resize) * 1000, 1), 'ms /',
+                      round(await _longest_stall(clear) * 1000, 1), 'ms')
+
+    asyncio.run(stampede())
+    asyncio.run(stalls())
+
+
+def sharded_benchmark(n: int = 400000) -> None:
+    """
+    Receives a number of keys
+    Builds a ShardedHashMap of n pairs with put_many and reads them back
+        with get_many at 1, 2, 4 and 8 processes, next to a single
+        hash_map_oa map; all use fnv1a_hash, which the shards need to be
+        the same in every process
+    """
+    print(os.cpu_count(), 'cpus')
+    keys = ['key' + str(i) for i in range(n)]
+    pairs = [(key, i) for i, key in enumerate(keys)]
+
+    m = hash_map_oa.HashMap(16, fnv1a_hash, capacity_policy="pow2")
+    _report('hash_map_oa build', _timed(m.put_many, pairs), n)
+    _report('hash_map_oa get_many', _timed(m.get_many, keys), n)
+
+    for processes in (1, 2, 4, 8):
+        with hash_map_sharded.ShardedHashMap(shards=16, processes=processes) as m:
+            _report('hash_map_sharded build, ' + str(processes) + ' processes',
+                    _timed(m.put_many, pairs), n)
+            _report('hash_map_sharded get_many, ' + str(processes) + ' processes',
+                    _timed(m.get_many, keys), n)
+
+
+def shared_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Compares what each worker process of a prefork server pays for its
+        own hash_map_oa map against attaching one SharedHashMap: startup
+        time, Python heap held per process, and get throughput
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    pairs = [(key, i) for i, key in enumerate(keys)]
+
+    def build_oa():
+        m = hash_map_oa.HashMap(16, fnv1a_hash, capacity_policy="pow2")
+        m.put_many(pairs)
+        return m
+
+    _report('hash_map_shared build (once)',
+            _timed(lambda: hash_map_shared.SharedHashMap.build(pairs).unlink()), n)
+    m = hash_map_shared.SharedHashMap.build(pairs)
+    try:
+        _report('startup: hash_map_oa build per process', _timed(build_oa), n)
+        print('startup: hash_map_shared attach per process'.ljust(48),
+              round(_timed(lambda: hash_map_shared.SharedHashMap(m.get_name()).close()) * 1000, 3), 'ms')
+        print('heap per process: hash_map_oa'.ljust(48),
+              round(_traced_bytes(build_oa) / 2 ** 20, 1), 'MB')
+        print('heap per process: hash_map_shared'.ljust(48),
+              round(_traced_bytes(lambda: hash_map_shared.SharedHashMap(m.get_name())) / 2 ** 20, 3), 'MB')
+        oa = build_oa()
+        _report('hash_map_oa get_many', _timed(oa.get_many, keys), n)
+        _report('hash_map_shared get_many', _timed(m.get_many, keys), n)
+    finally:
+        m.unlink()
+
+
+def frozen_benchmark(n: int = 200000) -> None:
+    """
+    Receives a number of keys
+    Freezes each engine's map and compares get of present and missing
+        keys and get_many on the mutable map against its FrozenHashMap;
+        every map hashes with Python's hash, so only the table differs
+    """
+    keys = ['key' + str(i) for i in range(n)]
+    missing = ['missing' + str(i) for i in range(n)]
+    for label, engine in ENGINES[:3]:
+        m = engine(11, hash)
+        _put_all(m, keys)
+        _report(label + ' freeze', _timed(m.freeze), n)
+        frozen = m.freeze()
+        print(label.ljust(48), 'load', round(m.table_load(), 2),
+              'frozen load', round(frozen.table_load(), 2))
+        for name, target in ((label, m), (label + ' frozen', frozen)):
+            _report(name + ' get present', _timed(_get_all, target, keys), n)
+            _report(name + ' get missing', _timed(_get_all, target, missing), n)
+            _report(name + ' get_many', _timed(target.get_many, keys), n)
+
+
+def _churn(m, n: int, rounds: int) -> None:
+    """
+    Keeps n live keys in the map while replacing rounds * n of them,
+        one remove followed by one new put at a time
+    """
+    for i in range(rounds * n):
+        m.remove('key' + str(i))
+        m.put('key' + str(i + n), i)
+
+
+def churn_benchmark(n: int = 50000, rounds: int = 5) -> None:
+    """
+    Receives a number of live keys
+    Runs a delete-heavy churn workload on the OA map with quadratic and
+        Robin Hood probing, then prints probe statistics and get times
+        for present and missing keys
+    """
+    present = ['key' + str(i) for i in range(rounds * n, (rounds + 1) * n)]
+    missing = ['missing' + str(i) for i in range(n)]
+    for probing in ("quadratic", "robin_hood"):
+        m = hash_map_oa.HashMap(11, hash, probing=probing)
+        _put_all(m, ['key' + str(i) for i in range(n)])
+        label = 'hash_map_oa ' + probing
+        _report(label + ' churn', _timed(_churn, m, n, rounds), 2 * rounds * n)
+        longest, mean = m.get_probe_stats()
+        print(label.ljust(48), 'max probe', longest, 'mean probe', round(mean, 2))
+        _report(label + ' get present', _timed(_get_all, m, present), n)
+        _report(label + ' get missing', _timed(_get_all, m, missing), n)
+
+
+BENCHMARKS = {
+    'distribution': hash_distribution_report,
+    'capacity_policy': capacity_policy_benchmark,
+    'put_latency': put_latency_benchmark,
+    'resize': resize_benchmark,
+    'long_keys': long_key_benchmark,
+    'memory': memory_benchmark,
+    'engines': engines_benchmark,
+    'churn': churn_benchmark,
+    'lookup_latency': lookup_latency_benchmark,
+    'cuckoo': cuckoo_benchmark,
+    'batch': batch_benchmark,
+    'presize': presize_benchmark,
+    'vector_hash': vector_hash_benchmark,
+    'find_mode': find_mode_benchmark,
+    'upsert': upsert_benchmark,
+    'iteration': iteration_benchmark,
+    'mmap': mmap_benchmark,
+    'snapshot': snapshot_benchmark,
+    'wal': wal_benchmark,
+    'concurrent': concurrent_benchmark,
+    'cache': cache_benchmark,
+    'async': async_benchmark,
+    'sharded': sharded_benchmark,
+    'shared': shared_benchmark,
+    'frozen': frozen_benchmark,
+}
+
+
+# ------------------- BENCHMARK RUNNER ------------------------------------- #
+
+if __name__ == "__main__":
+
+    names = sys.argv[1:2] or list(BENCHMARKS)
+    size = sys.argv[2:3]
+    for name in names:
+        print("\n" + name)
+        print("=" * len(name))
+        if size:
+            BENCHMARKS[name](int(size[0]))
+        else:
+            BENCHMARKS[name]()
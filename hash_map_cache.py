@@ -0,0 +1,524 @@
+# Name: Kent Tolzmann
+# Description: Bounded LRU / LFU cache with per-entry TTL expiry built on
+#              the SC HashMap; the use order is kept by links threaded
+#              through the chain nodes themselves
+
+import heapq
+import sys
+import time
+from itertools import count
+
+from a6_include import SLNode, hash_function_1
+from hash_map_sc import HashMap
+
+# marks a miss where None could be a cached value
+_MISSING = object()
+
+
+class _CacheNode(SLNode):
+    """
+    Chain node that is also a link in the use list of its frequency
+        bucket: older points toward the next entry to evict
+    """
+
+    def __init__(self, key: str, value: object, hash: int,
+                 cost: int, expires: float) -> None:
+        """Initialize a node not yet linked into a chain or use list."""
+        super().__init__(key, value, None, hash)
+        self.cost = cost
+        self.expires = expires
+        self.bucket = None
+        self.newer = None
+        self.older = None
+
+
+class _FrequencyBucket:
+    """
+    Sentinel of a circular use list of the nodes used count times, and
+        a link in the circular list of buckets by ascending count
+    """
+
+    def __init__(self, count: int) -> None:
+        """Initialize an empty bucket linked only to itself."""
+        self.count = count
+        self.newer = self.older = self
+        self.lower = self.higher = self
+
+
+# per-entry overhead of a node, added to the key and value sizes
+_sample = _CacheNode('', None, 0, 0, None)
+_NODE_BYTES = sys.getsizeof(_sample) + sys.getsizeof(_sample.__dict__)
+del _sample
+
+
+def estimate_bytes(key: str, value: object) -> int:
+    """
+    Receives a key and value
+    Returns the estimated bytes their cache entry holds: the node plus
+        the shallow sizes of key and value (a container counts its own
+        pointers, not its items; pass a deeper sizeof to the cache if
+        values are nested)
+    """
+    return _NODE_BYTES + sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class _CacheTable(HashMap):
+    """
+    hash_map_sc.HashMap that links in and unlinks given nodes, so the
+        cache keeps the same node from insert to eviction
+    """
+
+    def _find(self, key: str) -> SLNode:
+        """
+        Receives a key
+        Returns its node, or None if key not found
+        """
+        hash = self._hash_function(key)
+        if self._old_buckets is not None:
+            self._rehash_step()
+            node = self._old_node(key, hash)
+            if node is not None:
+                return node
+        ll = self._buckets.get_at_index(self._bucket_index(hash))
+        if ll is None:
+            return None
+        return ll.contains(key, hash)
+
+    def _add_node(self, ll, node: SLNode) -> None:
+        """
+        Receives the bucket _locate returned and a new node for it
+        Links the node into that bucket
+        """
+        ll.insert_node(node)
+        self._size += 1
+        self._version += 1
+
+    def _remove_node(self, node: SLNode) -> None:
+        """
+        Receives a node in the table
+        Unlinks it by its cached hash, without hashing its key again
+        """
+        if self._old_buckets is not None:
+            index = self._old_bucket_index(node.hash)
+            if index >= self._rehash_index:
+                if self._old_buckets.get_at_index(index).remove(node.key, node.hash):
+                    self._size -= 1
+                    self._version += 1
+                    return
+        ll = self._buckets.get_at_index(self._bucket_index(node.hash))
+        if ll is not None and ll.remove(node.key, node.hash):
+            self._size -= 1
+            self._version += 1
+
+
+class CacheHashMap:
+    def __init__(self,
+                 max_entries: int = None,
+                 max_bytes: int = None,
+                 policy: str = "lru",
+                 default_ttl: float = None,
+                 function: callable = hash_function_1,
+                 sizeof: callable = estimate_bytes,
+                 clock: callable = time.monotonic,
+                 **kwargs) -> None:
+        """
+        Initialize an empty cache holding at most max_entries entries and
+            at most max_bytes estimated bytes (None for no limit), as
+            sizeof(key, value) estimates them
+        policy "lru" evicts the least recently used entry, "lfu" the
+            least frequently used, least recently used among equals
+        Entries put without a ttl expire default_ttl seconds of clock
+            after the put (None for never)
+        function and kwargs are passed to the underlying HashMap
+        """
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be 'lru' or 'lfu'")
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        self._table = _CacheTable(function=function, **kwargs)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lfu = policy == "lfu"
+        self._default_ttl = default_ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        self._bytes = 0
+
+        # buckets by ascending use count; under lru every entry stays
+        #   in the one bucket of count 1
+        self._root = _FrequencyBucket(0)
+
+        # (expires, tie breaker, node) of every put with a ttl; entries
+        #   of nodes since removed or re-put are skipped when popped
+        self._expiry = []
+        self._sequence = count()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        return str(self._table)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of entries, expired ones not yet swept included
+        """
+        return self._table.get_size()
+
+    # ------------------ Use lists ------------------------------------- #
+
+    def _attach(self, node: _CacheNode, bucket: _FrequencyBucket) -> None:
+        """
+        Receives a node and a bucket
+        Links the node into the bucket as its most recently used entry
+        """
+        newest = bucket.older
+        node.newer = bucket
+        node.older = newest
+        newest.newer = node
+        bucket.older = node
+        node.bucket = bucket
+
+    def _detach(self, node: _CacheNode) -> None:
+        """
+        Receives a node in a use list
+        Unlinks it, dropping its bucket if it was the last entry there
+        """
+        bucket = node.bucket
+        node.newer.older = node.older
+        node.older.newer = node.newer
+        node.bucket = None
+        if bucket.older is bucket:
+            bucket.lower.higher = bucket.higher
+            bucket.higher.lower = bucket.lower
+
+    def _bucket_after(self, bucket: _FrequencyBucket) -> _FrequencyBucket:
+        """
+        Receives a bucket (or the root)
+        Returns the bucket of the next use count, created if needed
+        """
+        higher = bucket.higher
+        if higher.count == bucket.count + 1:
+            return higher
+        new_bucket = _FrequencyBucket(bucket.count + 1)
+        new_bucket.lower = bucket
+        new_bucket.higher = higher
+        higher.lower = new_bucket
+        bucket.higher = new_bucket
+        return new_bucket
+
+    def _touch(self, node: _CacheNode) -> None:
+        """
+        Receives the node of a hit
+        Makes it the most recently used entry, one use count higher
+            under lfu
+        """
+        bucket = node.bucket
+        if self._lfu:
+            target = self._bucket_after(bucket)
+        elif bucket.older is node:
+            return
+        else:
+            target = bucket
+        self._detach(node)
+        self._attach(node, target)
+
+    def _discard(self, node: _CacheNode) -> None:
+        """
+        Receives a node in the cache
+        Removes its entry from the table and its use list
+        """
+        self._detach(node)
+        self._table._remove_node(node)
+        self._bytes -= node.cost
+
+    def _expired(self, node: _CacheNode) -> bool:
+        """
+        Receives a node
+        Removes it if its ttl has run out and returns True, else False
+        """
+        if node.expires is not None and node.expires <= self._clock():
+            self._discard(node)
+            self._expirations += 1
+            return True
+        return False
+
+    def _make_room(self, entries: int, cost: int) -> None:
+        """
+        Receives a number of entries and bytes about to be added
+        Evicts entries, next victim first, until they fit the limits
+        """
+        max_entries, max_bytes = self._max_entries, self._max_bytes
+        while self._table._size and (
+                (max_entries is not None and self._table._size + entries > max_entries)
+                or (max_bytes is not None and self._bytes + cost > max_bytes)):
+            bucket = self._root.higher
+            self._discard(bucket.newer)
+            self._evictions += 1
+
+    def expire(self) -> int:
+        """
+        Removes every entry whose ttl has run out; put calls this, so
+            expired entries never hold memory past the next put
+        Returns the number of entries removed
+        """
+        expiry = self._expiry
+        if not expiry:
+            return 0
+        removed = 0
+        now = self._clock()
+        while expiry and expiry[0][0] <= now:
+            expires, _, node = heapq.heappop(expiry)
+            if node.bucket is not None and node.expires == expires:
+                self._discard(node)
+                removed += 1
+        self._expirations += removed
+
+        # drop stale heap entries once they outnumber the live ones
+        if len(expiry) > 2 * self._table._size + 64:
+            self._expiry = [(node.expires, i, node) for i, node in
+                            enumerate(self._table._nodes()) if node.expires is not None]
+            heapq.heapify(self._expiry)
+        return removed
+
+    # ------------------ Cache operations ------------------------------ #
+
+    def put(self, key: str, value: object, ttl: float = None) -> None:
+        """
+        Receives a key/value pair and an optional ttl in seconds
+            (default_ttl if None)
+        Updates the value for key in the cache, or adds the pair after
+            evicting whatever it needs to fit the limits
+        A value estimated larger than max_bytes on its own is not cached
+        """
+        self.expire()
+        if ttl is None:
+            ttl = self._default_ttl
+        expires = None if ttl is None else self._clock() + ttl
+        cost = 0 if self._max_bytes is None else self._sizeof(key, value)
+        if self._max_bytes is not None and cost > self._max_bytes:
+            self.remove(key)
+            return
+
+        node, ll, hash = self._table._locate(key)
+        if node is None:
+            self._make_room(1, cost)
+            node = _CacheNode(key, value, hash, cost, expires)
+            self._table._add_node(ll, node)
+            self._attach(node, self._bucket_after(self._root))
+            self._bytes += cost
+        else:
+            node.value = value
+            node.expires = expires
+            self._bytes += cost - node.cost
+            node.cost = cost
+            self._touch(node)
+            self._make_room(0, 0)
+
+        if expires is not None:
+            heapq.heappush(self._expiry, (expires, next(self._sequence), node))
+
+    def get(self, key: str, default: object = None) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key, counted as a
+            hit and as a use of the entry
+        Returns default if key not found or expired, counted as a miss
+        """
+        node = self._table._find(key)
+        if node is None or self._expired(node):
+            self._misses += 1
+            return default
+        self._hits += 1
+        self._touch(node)
+        return node.value
+
+    def get_or_load(self, key: str, loader: callable, ttl: float = None) -> object:
+        """
+        Receives a key, a function from key to value (e.g. a read from
+            the backing store) and an optional ttl for a loaded value
+        Returns the cached value for key, or caches and returns
+            loader(key) on a miss
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader(key)
+            self.put(key, value, ttl)
+        return value
+
+    def peek(self, key: str, default: object = None) -> object:
+        """
+        Receives a key
+        Returns its unexpired value, or default, without counting a hit
+            or miss or a use of the entry
+        """
+        node = self._table._find(key)
+        if node is None or self._expired(node):
+            return default
+        return node.value
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is cached and unexpired, without
+            counting a hit or miss or a use of the entry
+        """
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the cache
+        """
+        node = self._table._find(key)
+        if node is not None:
+            self._discard(node)
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the cache; counters are kept
+        """
+        self._table.clear()
+        self._root = _FrequencyBucket(0)
+        self._expiry = []
+        self._bytes = 0
+
+    # ------------------ Sizes and counters ---------------------------- #
+
+    def get_size(self) -> int:
+        """
+        Return number of entries, expired ones not yet swept included
+        """
+        return self._table.get_size()
+
+    def get_bytes(self) -> int:
+        """
+        Return estimated bytes of the entries (0 without max_bytes, when
+            sizes are not estimated)
+        """
+        return self._bytes
+
+    def get_stats(self) -> dict:
+        """
+        Returns the hits, misses, evictions (entries removed to fit the
+            limits) and expirations counted so far, with the hit ratio
+        """
+        lookups = self._hits + self._misses
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'hit_ratio': self._hits / lookups if lookups else 0.0}
+
+    def reset_stats(self) -> None:
+        """
+        Sets every counter back to 0
+        """
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    # ------------------ Iteration ------------------------------------- #
+
+    def _live_nodes(self):
+        """
+        Generator over the node of every unexpired entry, in bucket order
+        Raises RuntimeError once an entry is inserted or removed during
+            the iteration; gets and peeks of unexpired entries are
+            allowed, but a get, peek or contains_key that finds an
+            expired entry removes it, so it raises too
+        """
+        now = self._clock()
+        for node in self._table._nodes():
+            if node.expires is None or node.expires > now:
+                yield node
+
+    def keys(self):
+        """
+        Returns a generator over every unexpired key
+        """
+        return (node.key for node in self._live_nodes())
+
+    def values(self):
+        """
+        Returns a generator over every unexpired value
+        """
+        return (node.value for node in self._live_nodes())
+
+    def items(self):
+        """
+        Returns a generator over every unexpired (key, value) pair
+        """
+        return ((node.key, node.value) for node in self._live_nodes())
+
+    def eviction_order(self):
+        """
+        Returns a generator over every key, next to be evicted first;
+            the cache must not change during the iteration
+        """
+        bucket = self._root.higher
+        while bucket is not self._root:
+            node = bucket.newer
+            while node is not bucket:
+                yield node.key
+                node = node.newer
+            bucket = bucket.higher
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    print("\nlru example 1")
+    print("-------------")
+    c = CacheHashMap(max_entries=3)
+    for key in ('a', 'b', 'c'):
+        c.put(key, key.upper())
+    c.get('a')
+    c.put('d', 'D')
+    print(list(c.eviction_order()), c.contains_key('b'), c.get_stats())
+
+    print("\nlfu example 1")
+    print("-------------")
+    c = CacheHashMap(max_entries=3, policy="lfu")
+    for key in ('a', 'b', 'c'):
+        c.put(key, key.upper())
+    for key in ('a', 'a', 'b', 'c', 'c', 'c'):
+        c.get(key)
+    c.put('d', 'D')
+    c.put('e', 'E')
+    print(list(c.eviction_order()), c.contains_key('b'), c.get_stats()['evictions'])
+
+    print("\nttl example 1")
+    print("-------------")
+    now = [0.0]
+    c = CacheHashMap(default_ttl=10, clock=lambda: now[0])
+    c.put('short', 1, ttl=1)
+    c.put('default', 2)
+    c.put('long', 3, ttl=100)
+    now[0] = 5
+    print(c.get('short'), c.get('default'), c.get_size())
+    now[0] = 50
+    c.put('new', 4)
+    print(sorted(c.keys()), c.get_stats()['expirations'])
+
+    print("\nmax_bytes example 1")
+    print("-------------------")
+    c = CacheHashMap(max_bytes=4096)
+    for i in range(100):
+        c.put('key' + str(i), 'x' * 100)
+    print(c.get_size(), c.get_bytes() <= 4096, c.get_stats()['evictions'])
+    c.put('huge', 'x' * 10000)
+    print(c.contains_key('huge'), c.get_size())
+
+    print("\nget_or_load example 1")
+    print("---------------------")
+    loads = []
+    c = CacheHashMap(max_entries=100)
+    for key in ('x', 'y', 'x', 'x', 'y', 'z'):
+        c.get_or_load(key, lambda k: loads.append(k) or k * 2)
+    print(loads, c.get_stats())
@@ -0,0 +1,411 @@
+# Name: Kent Tolzmann
+# Description: Thread-safe separate chaining HashMap: per-stripe locks over
+#              bucket ranges, lock-free reads and a cooperative resize
+#              that writers share and readers never wait on
+
+import threading
+
+from a6_include import (DynamicArray, LinkedList, FIBONACCI_MULTIPLIER, MASK64,
+                        next_power_of_two, hash_function_1, hash_function_2)
+
+# default number of lock stripes
+_STRIPES = 16
+
+
+def _spread(hash: int) -> int:
+    """
+    Receives a hash
+    Returns it mixed so its low bits depend on every bit, since both the
+        bucket index and the stripe are taken from the low bits
+    """
+    mixed = (hash * FIBONACCI_MULTIPLIER) & MASK64
+    return mixed ^ (mixed >> 32)
+
+
+class ConcurrentHashMap:
+    def __init__(self,
+                 capacity: int = _STRIPES,
+                 function: callable = hash_function_1,
+                 stripes: int = _STRIPES) -> None:
+        """
+        Initialize new thread-safe HashMap that uses separate chaining
+        stripes locks (a power of two) each guard the buckets whose index
+            has the same low bits; capacity is a power of two, at least
+            stripes, so doubling the table splits a bucket within its
+            stripe and a key's stripe never changes
+        get and contains_key take no lock: chains are only ever changed
+            by linking a new head or unlinking a node, so a reader walking
+            one always sees a whole chain
+        """
+        self._hash_function = function
+        self._stripe_count = next_power_of_two(stripes)
+        self._stripe_mask = self._stripe_count - 1
+        self._locks = [threading.Lock() for _ in range(self._stripe_count)]
+
+        # entries per stripe, each changed only under its stripe's lock
+        self._counts = [0] * self._stripe_count
+
+        capacity = next_power_of_two(max(capacity, self._stripe_count))
+        self._buckets = DynamicArray([LinkedList() for _ in range(capacity)])
+
+        # resize state: the table being filled, which stripes are moved,
+        #   the next stripe to claim and how many are done
+        self._resize_lock = threading.Lock()
+        self._next_buckets = None
+        self._moved = [False] * self._stripe_count
+        self._transfer_index = 0
+        self._moved_count = 0
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        self._finish_resize()
+        out = ''
+        for i in range(self._buckets.length()):
+            out += str(i) + ': ' + str(self._buckets[i]) + '\n'
+        return out
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        The stripe counts are summed without locking, so the size
+            may be a moment out of date while writers are running
+        """
+        return sum(self._counts)
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._buckets.length()
+
+    # ------------------------------------------------------------------ #
+
+    def _locate(self, key: str) -> tuple:
+        """
+        Receives a key
+        Returns (hash, spread hash, stripe) of the key
+        """
+        hash = self._hash_function(key)
+        mixed = _spread(hash)
+        return hash, mixed, mixed & self._stripe_mask
+
+    def _bucket(self, stripe: int, mixed: int) -> LinkedList:
+        """
+        Receives a stripe and a spread hash in it
+        Returns the hash's bucket in the table that currently holds the
+            stripe: the new one once a resize has moved the stripe
+        Callers writing to the bucket must hold the stripe's lock
+        """
+        # the swap sets _buckets before clearing _next_buckets,
+        #   so reading them in the other order never misses both
+        next_buckets = self._next_buckets
+        buckets = self._buckets
+        if next_buckets is not None and self._moved[stripe]:
+            buckets = next_buckets
+        return buckets.get_at_index(mixed & (buckets.length() - 1))
+
+    def _after_write(self, stripe: int, added: bool) -> None:
+        """
+        Receives the stripe just written and whether it gained an entry
+        Helps a resize in progress move one stripe, or starts a resize
+            once this stripe holds more than its share of one entry
+            per bucket
+        """
+        if self._next_buckets is not None:
+            self._help_resize(1)
+        elif added and self._counts[stripe] * self._stripe_count > self._buckets.length():
+            self._begin_resize(self._buckets.length() * 2)
+            self._help_resize(1)
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        """
+        hash, mixed, stripe = self._locate(key)
+        with self._locks[stripe]:
+            ll = self._bucket(stripe, mixed)
+            node = ll.contains(key, hash)
+            added = node is None
+            if added:
+                ll.insert(key, value, hash)
+                self._counts[stripe] += 1
+            else:
+                node.value = value
+        self._after_write(stripe, added)
+
+    def setdefault(self, key: str, default: object = None) -> object:
+        """
+        Receives a key and a default value
+        Returns the key's value, first inserting default if not found,
+            as one atomic step
+        """
+        hash, mixed, stripe = self._locate(key)
+        with self._locks[stripe]:
+            ll = self._bucket(stripe, mixed)
+            node = ll.contains(key, hash)
+            added = node is None
+            if added:
+                ll.insert(key, default, hash)
+                self._counts[stripe] += 1
+                value = default
+            else:
+                value = node.value
+        self._after_write(stripe, added)
+        return value
+
+    def update(self, key: str, function: callable, default: object = None) -> object:
+        """
+        Receives a key, a function of one argument and a default value
+        Sets the key's value to function(value), applied to default if
+            the key is not found, as one atomic step
+        function runs under the stripe lock, so it must not use the map
+        Returns the new value
+        """
+        hash, mixed, stripe = self._locate(key)
+        with self._locks[stripe]:
+            ll = self._bucket(stripe, mixed)
+            node = ll.contains(key, hash)
+            added = node is None
+            if added:
+                value = function(default)
+                ll.insert(key, value, hash)
+                self._counts[stripe] += 1
+            else:
+                value = node.value = function(node.value)
+        self._after_write(stripe, added)
+        return value
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        """
+        Receives a key and an amount
+        Adds amount to the key's value, inserting the key with value
+            amount if not found, as one atomic step
+        Returns the key's new value
+        """
+        return self.update(key, lambda value: value + amount, 0)
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        Takes no lock
+        """
+        hash, mixed, stripe = self._locate(key)
+        node = self._bucket(stripe, mixed).contains(key, hash)
+        if node is not None:
+            return node.value
+        return None
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        Takes no lock
+        """
+        hash, mixed, stripe = self._locate(key)
+        return self._bucket(stripe, mixed).contains(key, hash) is not None
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        """
+        hash, mixed, stripe = self._locate(key)
+        with self._locks[stripe]:
+            if self._bucket(stripe, mixed).remove(key, hash):
+                self._counts[stripe] -= 1
+        self._after_write(stripe, False)
+
+    # ------------------ Cooperative resize ---------------------------- #
+
+    def _begin_resize(self, new_capacity: int) -> None:
+        """
+        Receives a power-of-two capacity of at least the stripe count
+        Starts moving the map into a new table of that capacity, unless
+            a resize is already running
+        """
+        with self._resize_lock:
+            if self._next_buckets is not None or new_capacity == self._buckets.length():
+                return
+            # reset before publishing the new table, which readers check first
+            self._moved = [False] * self._stripe_count
+            self._transfer_index = 0
+            self._moved_count = 0
+            self._next_buckets = DynamicArray([LinkedList() for _ in range(new_capacity)])
+
+    def _help_resize(self, stripes: int) -> None:
+        """
+        Receives a number of stripes
+        Claims up to that many unmoved stripes of the resize in progress
+            and copies their entries into the new table, one stripe lock
+            at a time; whichever thread moves the last stripe swaps the
+            tables
+        Nodes are copied rather than relinked, so lock-free readers
+            still walking the old table see it unchanged
+        """
+        for _ in range(stripes):
+            with self._resize_lock:
+                if self._next_buckets is None or self._transfer_index == self._stripe_count:
+                    return
+                stripe = self._transfer_index
+                self._transfer_index += 1
+                old_buckets, new_buckets = self._buckets, self._next_buckets
+
+            new_mask = new_buckets.length() - 1
+            with self._locks[stripe]:
+                for i in range(stripe, old_buckets.length(), self._stripe_count):
+                    for node in old_buckets.get_at_index(i):
+                        index = _spread(node.hash) & new_mask
+                        new_buckets.get_at_index(index).insert(node.key, node.value, node.hash)
+                self._moved[stripe] = True
+
+            with self._resize_lock:
+                self._moved_count += 1
+                if self._moved_count == self._stripe_count:
+                    # swap in the new table before dropping the pointer to it
+                    self._buckets = new_buckets
+                    self._next_buckets = None
+
+    def _finish_resize(self) -> None:
+        """
+        Helps any resize in progress until every stripe has been moved
+        """
+        while self._next_buckets is not None:
+            self._help_resize(self._stripe_count)
+
+    def resize_table(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Moves the map into a table of that capacity, rounded up to a
+            power of two no smaller than the stripe count or the size
+        """
+        self._finish_resize()
+        new_capacity = next_power_of_two(max(new_capacity, self._stripe_count, self.get_size()))
+        self._begin_resize(new_capacity)
+        self._finish_resize()
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self.get_size() / self._buckets.length()
+
+    def empty_buckets(self) -> int:
+        """
+        Returns the number of empty buckets in the hash table
+        """
+        self._finish_resize()
+        count = 0
+        for i in range(self._buckets.length()):
+            if self._buckets.get_at_index(i).length() == 0:
+                count += 1
+        return count
+
+    # ------------------ Iteration ------------------------------------- #
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair
+        Takes no lock: the walk is weakly consistent, never failing on
+            concurrent writes but not guaranteed to reflect them
+        """
+        self._finish_resize()
+        buckets = self._buckets
+        return ((node.key, node.value)
+                for i in range(buckets.length()) for node in buckets.get_at_index(i))
+
+    def keys(self):
+        """
+        Returns a generator over every key, weakly consistent like items
+        """
+        return (key for key, value in self.items())
+
+    def values(self):
+        """
+        Returns a generator over every value, weakly consistent like items
+        """
+        return (value for key, value in self.items())
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        for pair in self.items():
+            arr.append(pair)
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map
+        Capacity remains unchanged
+        Buckets are emptied in place under every stripe lock, in both
+            tables if a resize is running, so the resize can carry on
+        """
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            next_buckets = self._next_buckets
+            for buckets in (next_buckets, self._buckets):
+                if buckets is not None:
+                    for i in range(buckets.length()):
+                        buckets.set_at_index(i, LinkedList())
+            self._counts = [0] * self._stripe_count
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    print("\nput example 1")
+    print("-------------")
+    m = ConcurrentHashMap(16, hash_function_2, stripes=4)
+    for i in range(150):
+        m.put('str' + str(i), i * 100)
+        if i % 25 == 24:
+            print(round(m.table_load(), 2), m.get_size(), m.get_capacity())
+
+    print("\nget / remove example 1")
+    print("----------------------")
+    keys = [i for i in range(1, 1000, 20)]
+    for key in keys:
+        m.put(str(key), key * 42)
+    result = True
+    for key in keys:
+        # all inserted keys must be present
+        result &= m.get(str(key)) == key * 42
+        # NOT inserted keys must be absent
+        result &= not m.contains_key(str(key + 1))
+    print(m.get_size(), m.get_capacity(), result)
+    for key in keys[::2]:
+        m.remove(str(key))
+    print(m.get_size(), m.contains_key('1'), m.contains_key('21'))
+
+    print("\nthreads example 1")
+    print("-----------------")
+    # 8 threads put disjoint keys and bump shared counters while the
+    #   table resizes under them
+    m = ConcurrentHashMap(16, hash, stripes=8)
+
+    def work(thread: int) -> None:
+        for i in range(5000):
+            m.put('t' + str(thread) + '-' + str(i), i)
+            m.increment('counter' + str(i % 10))
+
+    threads = [threading.Thread(target=work, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counters = [m.get('counter' + str(i)) for i in range(10)]
+    print(m.get_size(), sum(counters), counters[0],
+          all(m.get('t' + str(t) + '-' + str(i)) == i for t in range(8) for i in range(5000)))
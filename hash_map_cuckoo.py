@@ -0,0 +1,422 @@
+# Name: Kent Tolzmann
+# Description: Bucketized cuckoo HashMap implementation: every key lives
+#              in one of two 4-slot buckets or in a small stash
+
+from array import array
+import random
+
+from a6_include import (DynamicArray, HashEntry, FIBONACCI_MULTIPLIER, MASK64,
+                        fnv1a_hash, next_power_of_two, hash_function_1, hash_function_2)
+
+# slots per bucket
+_SLOTS = 4
+
+# smallest table: two buckets, so every key has two distinct ones
+_MIN_CAPACITY = 2 * _SLOTS
+
+# grow once live entries fill this fraction of the slots
+_MAX_LOAD = 0.9
+
+# evictions tried before an insert gives up and uses the stash
+_MAX_KICKS = 64
+
+# entries the stash may hold; one more grows or reseeds the table
+_STASH_SIZE = 4
+
+# below this load an overfull stash means an unlucky seed rather than a
+#   full table, so the second hash is reseeded instead of growing
+_MIN_GROW_LOAD = 0.25
+
+# reseeds tried in a row before the table is grown anyway
+_MAX_RESEEDS = 4
+
+# odd multiplier for the second bucket choice (MurmurHash3 finalizer)
+_ALT_MULTIPLIER = 0xff51afd7ed558ccd
+
+
+class HashMap:
+    def __init__(self,
+                 capacity: int = _MIN_CAPACITY,
+                 function: callable = hash_function_1) -> None:
+        """
+        Initialize new HashMap that uses bucketized cuckoo hashing:
+            4 slots per bucket and two bucket choices, from function and
+            from a seeded FNV-1a hash of the key, so keys that collide
+            under function still get independent buckets
+        Capacity is the number of slots, a power of two
+        """
+        self._hash_function = function
+        self._size = 0
+
+        # evictions and seeds are drawn from a fixed seed so runs repeat
+        self._random = random.Random(0)
+        self._seed = self._random.getrandbits(64)
+        self._reseeds = 0
+        self._build(next_power_of_two(max(capacity, _MIN_CAPACITY)))
+
+    def _build(self, capacity: int) -> None:
+        """
+        Receives a capacity
+        Replaces the slot arrays and stash with empty ones of that capacity
+        """
+        self._capacity = capacity
+        self._shift = 64 - ((capacity // _SLOTS).bit_length() - 1)
+        self._hashes = array('Q', bytes(8 * capacity))
+        self._alt_hashes = array('Q', bytes(8 * capacity))
+        self._keys = [None] * capacity
+        self._values = [None] * capacity
+        self._stash = []
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for i in range(self._capacity):
+            if self._keys[i] is None:
+                out += str(i) + ': None\n'
+            else:
+                out += str(i) + ': ' + str(self._keys[i]) + ' -> ' + str(self._values[i]) + '\n'
+        for hash_entry in self._stash:
+            out += 'stash: ' + str(hash_entry.key) + ' -> ' + str(hash_entry.value) + '\n'
+        return out
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._size
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._capacity
+
+    # ------------------------------------------------------------------ #
+
+    def _hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns the key's hash reduced to the unsigned 64 bits stored per slot
+        """
+        return self._hash_function(key) & MASK64
+
+    def _alt_hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns its second hash, FNV-1a under the map's current seed
+        """
+        return fnv1a_hash(key, self._seed)
+
+    def _bucket_pair(self, hash: int, alt: int) -> tuple:
+        """
+        Receives a key's hash and second hash
+        Returns the key's two distinct bucket numbers, taken from the top
+            bits of two different multiplicative mixes; both mix in the
+            second hash, so keys sharing the first never share both
+        """
+        first = (((hash ^ alt) * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+        second = ((alt * _ALT_MULTIPLIER) & MASK64) >> self._shift
+        if second == first:
+            second = first ^ 1
+        return first, second
+
+    def _find_slot(self, key: str, hash: int, alt: int) -> int:
+        """
+        Receives a key and its two hashes
+        Returns the slot holding key, or -1 if it is not in either bucket
+        Each bucket is checked with one slice, so a lookup costs two
+            short C-level scans instead of eight Python comparisons
+        """
+        keys = self._keys
+        for bucket in self._bucket_pair(hash, alt):
+            start = bucket * _SLOTS
+            slots = keys[start:start + _SLOTS]
+            if key in slots:
+                return start + slots.index(key)
+        return -1
+
+    def _find_stashed(self, key: str, hash: int):
+        """
+        Receives a key and its hash
+        Returns the stash entry for key, or None if not stashed
+        The stash holds at most _STASH_SIZE entries
+        """
+        for hash_entry in self._stash:
+            if hash_entry.hash == hash and hash_entry.key == key:
+                return hash_entry
+        return None
+
+    def _free_slot(self, bucket: int) -> int:
+        """
+        Receives a bucket number
+        Returns the first free slot of the bucket, or -1 if it is full
+        """
+        keys = self._keys
+        start = bucket * _SLOTS
+        for i in range(start, start + _SLOTS):
+            if keys[i] is None:
+                return i
+        return -1
+
+    def _store(self, i: int, hash: int, alt: int, key: str, value: object) -> None:
+        """
+        Receives a free slot and an entry's two hashes, key and value
+        Stores the entry in the slot
+        """
+        self._hashes[i], self._alt_hashes[i] = hash, alt
+        self._keys[i], self._values[i] = key, value
+
+    def _place(self, hash: int, alt: int, key: str, value: object):
+        """
+        Receives a key not in the table, its two hashes and value
+        Stores it in a free slot of either bucket, evicting residents to
+            their other bucket along a random walk if both are full
+        Returns None once everything is placed, or the HashEntry left
+            homeless after _MAX_KICKS evictions
+        """
+        first, second = self._bucket_pair(hash, alt)
+        i = self._free_slot(first)
+        if i < 0:
+            i = self._free_slot(second)
+        if i >= 0:
+            self._store(i, hash, alt, key, value)
+            return None
+
+        bucket = first if self._random.random() < 0.5 else second
+        for _ in range(_MAX_KICKS):
+            # swap the carried entry with a random resident of the bucket
+            i = bucket * _SLOTS + self._random.randrange(_SLOTS)
+            hash, self._hashes[i] = self._hashes[i], hash
+            alt, self._alt_hashes[i] = self._alt_hashes[i], alt
+            key, self._keys[i] = self._keys[i], key
+            value, self._values[i] = self._values[i], value
+
+            # the evicted entry moves to its other bucket
+            first, second = self._bucket_pair(hash, alt)
+            bucket = second if first == bucket else first
+            i = self._free_slot(bucket)
+            if i >= 0:
+                self._store(i, hash, alt, key, value)
+                return None
+        return HashEntry(key, value, hash)
+
+    def _insert(self, hash: int, alt: int, key: str, value: object) -> None:
+        """
+        Receives a key not in the table, its two hashes and value
+        Places it, stashing whatever entry an insert leaves homeless
+        A stash past _STASH_SIZE grows the table, or below _MIN_GROW_LOAD
+            reseeds the second hash, so the stash never stays overfull
+        """
+        homeless = self._place(hash, alt, key, value)
+        if homeless is None:
+            return
+        self._stash.append(homeless)
+        if len(self._stash) <= _STASH_SIZE:
+            return
+        if self.table_load() < _MIN_GROW_LOAD and self._reseeds < _MAX_RESEEDS:
+            self._reseeds += 1
+            self._rehash(self._capacity, self._random.getrandbits(64))
+        else:
+            self._reseeds = 0
+            self._rehash(self._capacity * 2, self._seed)
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        """
+        hash = self._hash(key)
+        alt = self._alt_hash(key)
+        i = self._find_slot(key, hash, alt)
+        if i >= 0:
+            self._values[i] = value
+            return
+        hash_entry = self._find_stashed(key, hash)
+        if hash_entry is not None:
+            hash_entry.value = value
+            return
+
+        if self._size + 1 > self._capacity * _MAX_LOAD:
+            self.resize_table(self._capacity * 2)
+            alt = self._alt_hash(key)
+        self._size += 1
+        self._insert(hash, alt, key, value)
+
+    def resize_table(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Re-places every entry in a table of that capacity, rounded up to
+            a power of two and doubled until the entries fit
+        """
+        new_capacity = next_power_of_two(max(new_capacity, _MIN_CAPACITY))
+        while self._size > new_capacity * _MAX_LOAD:
+            new_capacity *= 2
+        self._rehash(new_capacity, self._seed)
+
+    def _rehash(self, new_capacity: int, seed: int) -> None:
+        """
+        Receives a valid capacity and a seed for the second hash
+        Re-places every entry in a table of that capacity, recomputing
+            the second hashes if the seed changed
+        """
+        hashes, alt_hashes = self._hashes, self._alt_hashes
+        keys, values = self._keys, self._values
+        stash = self._stash
+        old_seed, self._seed = self._seed, seed
+        self._build(new_capacity)
+        for i in range(len(keys)):
+            if keys[i] is not None:
+                # an overflow while re-placing may reseed again
+                alt = alt_hashes[i] if self._seed == old_seed else self._alt_hash(keys[i])
+                self._insert(hashes[i], alt, keys[i], values[i])
+        for hash_entry in stash:
+            self._insert(hash_entry.hash, self._alt_hash(hash_entry.key),
+                         hash_entry.key, hash_entry.value)
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self._size / self._capacity
+
+    def empty_buckets(self) -> int:
+        """
+        Returns the number of free slots in the table
+        """
+        return self._capacity - self._size + len(self._stash)
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        Touches at most the key's two buckets and the stash
+        """
+        hash = self._hash(key)
+        i = self._find_slot(key, hash, self._alt_hash(key))
+        if i >= 0:
+            return self._values[i]
+        if self._stash:
+            hash_entry = self._find_stashed(key, hash)
+            if hash_entry is not None:
+                return hash_entry.value
+        return None
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        hash = self._hash(key)
+        if self._find_slot(key, hash, self._alt_hash(key)) >= 0:
+            return True
+        return self._find_stashed(key, hash) is not None
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        A freed slot takes back any stashed entry that belongs to its bucket
+        """
+        hash = self._hash(key)
+        i = self._find_slot(key, hash, self._alt_hash(key))
+        if i >= 0:
+            self._keys[i] = None
+            self._values[i] = None
+            self._hashes[i] = self._alt_hashes[i] = 0
+            self._size -= 1
+            self._unstash(i // _SLOTS)
+            return
+
+        hash_entry = self._find_stashed(key, hash)
+        if hash_entry is not None:
+            self._stash.remove(hash_entry)
+            self._size -= 1
+
+    def _unstash(self, bucket: int) -> None:
+        """
+        Receives a bucket with a free slot
+        Moves the first stashed entry that can live in it into the slot
+        """
+        for hash_entry in self._stash:
+            alt = self._alt_hash(hash_entry.key)
+            if bucket in self._bucket_pair(hash_entry.hash, alt):
+                self._store(self._free_slot(bucket), hash_entry.hash, alt,
+                            hash_entry.key, hash_entry.value)
+                self._stash.remove(hash_entry)
+                return
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        keys, values = self._keys, self._values
+        for i in range(self._capacity):
+            if keys[i] is not None:
+                arr.append((keys[i], values[i]))
+        for hash_entry in self._stash:
+            arr.append((hash_entry.key, hash_entry.value))
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map
+        Capacity remains unchanged
+        """
+        self._build(self._capacity)
+        self._size = 0
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    print("\nput example 1")
+    print("-------------")
+    m = HashMap(53, hash_function_2)
+    for i in range(150):
+        m.put('str' + str(i), i * 100)
+        if i % 25 == 24:
+            print(m.empty_buckets(), round(m.table_load(), 2), m.get_size(), m.get_capacity())
+
+    print("\nget / remove example 1")
+    print("----------------------")
+    m = HashMap(8, hash_function_2)
+    keys = [i for i in range(1, 1000, 20)]
+    for key in keys:
+        m.put(str(key), key * 42)
+    result = True
+    for key in keys:
+        # all inserted keys must be present
+        result &= m.get(str(key)) == key * 42
+        # NOT inserted keys must be absent
+        result &= not m.contains_key(str(key + 1))
+    print(m.get_size(), m.get_capacity(), result)
+    for key in keys[::2]:
+        m.remove(str(key))
+    print(m.get_size(), m.contains_key('1'), m.contains_key('21'))
+
+    print("\nstash example 1")
+    print("---------------")
+    # hash_function_1 gives anagrams equal hashes, but the seeded second
+    #   hash still spreads them over different buckets
+    m = HashMap(64, hash_function_1)
+    words = ["abcd", "abdc", "acbd", "acdb", "adbc", "adcb", "bacd", "badc", "bcad", "bcda"]
+    for word in words:
+        m.put(word, word.upper())
+    print(m.get_size(), len(m._stash), m.get('bcda'), m.get('abcd'))
+    m.remove("abcd")
+    print(m.get_size(), len(m._stash), m.get('bcda'), m.contains_key('abcd'))
+
+    print("\nstash example 2")
+    print("---------------")
+    # even a constant hash leaves a bounded stash and a full table
+    m = HashMap(8, lambda key: 0)
+    for i in range(5000):
+        m.put('key' + str(i), i)
+    print(m.get_size(), m.get_capacity(), len(m._stash) <= 4, m.get('key4999'))
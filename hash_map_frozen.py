@@ -0,0 +1,289 @@
+# Name: Kent Tolzmann
+# Description: Immutable HashMap frozen from either engine, indexed by a
+#              minimal perfect hash so every get reads exactly one slot
+
+from a6_include import DynamicArray, FIBONACCI_MULTIPLIER, MASK64, gc_paused
+
+# multiplier spreading the pilot number d over 64 bits
+_PILOT_MULTIPLIER = 0xbf58476d1ce4e5b9
+
+# pilots tried for one bucket before its keys go to the overflow dict
+_MAX_PILOTS = 1 << 16
+
+# marks the slot left over when the key count is a power of two
+_EMPTY = object()
+
+
+class FrozenHashMap:
+    def __init__(self, source=()) -> None:
+        """
+        Initialize an immutable map from a map or dict (anything with
+            items()) or an iterable of (key, value) pairs; a later pair
+            replaces an earlier equal key
+        Keys are split into as many buckets as keys (hash-and-displace,
+            as in CHD / PTHash) and each bucket, largest first, gets a
+            pilot that sends all its keys to free slots; a key's slot
+            is (mix ^ pilot of its bucket) % capacity, so there are no
+            chains or probe sequences and capacity is the key count
+        Keys are hashed with Python's hash, whatever function the map
+            they came from used, so they stay distinct even where that
+            function collides
+        """
+        pairs = list(source.items() if hasattr(source, 'items') else source)
+        keys = [pair[0] for pair in pairs]
+        values = [pair[1] for pair in pairs]
+        del pairs
+        with gc_paused():
+            self._build(keys, values)
+
+    def _build(self, keys: list, values: list) -> None:
+        """
+        Receives parallel lists of keys and values
+        Chooses the pilots and fills the slot table
+        """
+        # Python's hash spread over 64 bits; the mix is a bijection, so
+        #   keys with different hashes never share a mix
+        mixes = [(hash(key) * FIBONACCI_MULTIPLIER) & MASK64 for key in keys]
+        self._overflow = {}
+        if len(set(mixes)) != len(mixes):
+            keys, values, mixes = self._split_collisions(keys, values, mixes)
+        n = len(keys)
+
+        # a power-of-two modulus would only see the low bits of the
+        #   mix, so that size gets one spare slot
+        capacity = n + 1 if n & (n - 1) == 0 else n
+        buckets = max(n, 1)
+        bucket_of = [(mix >> 32) * buckets >> 32 for mix in mixes]
+        counts = [0] * buckets
+        for b in bucket_of:
+            counts[b] += 1
+
+        # keys ordered by bucket size, largest first, then by bucket
+        largest = max(counts)
+        order_keys = [(largest - counts[b]) << 32 | b for b in bucket_of]
+        order = sorted(range(n), key=order_keys.__getitem__)
+        del order_keys
+
+        taken = bytearray(capacity)
+        pilots = [0] * buckets
+        table_keys = [_EMPTY] * capacity
+        table_values = [None] * capacity
+        tried = [0]
+
+        i = 0
+        while i < n and counts[bucket_of[order[i]]] > 1:
+            members = order[i:i + counts[bucket_of[order[i]]]]
+            i += len(members)
+            bucket_mixes = [mixes[j] for j in members]
+            for d in range(_MAX_PILOTS):
+                if d == len(tried):
+                    tried.append((d * _PILOT_MULTIPLIER) & MASK64)
+                pilot = tried[d]
+                slots = []
+                for mix in bucket_mixes:
+                    s = (mix ^ pilot) % capacity
+                    if taken[s] or s in slots:
+                        break
+                    slots.append(s)
+                else:
+                    break
+            else:
+                # nothing fits; the bucket's keys are found by the dict
+                for j in members:
+                    self._overflow[keys[j]] = values[j]
+                continue
+            pilots[bucket_of[members[0]]] = pilot
+            for j, s in zip(members, slots):
+                taken[s] = 1
+                table_keys[s] = keys[j]
+                table_values[s] = values[j]
+
+        # a lone key takes the next free slot directly: its pilot is
+        #   mix ^ slot, so (mix ^ pilot) % capacity is the slot itself
+        s = -1
+        for j in order[i:]:
+            s = taken.find(0, s + 1)
+            taken[s] = 1
+            pilots[bucket_of[j]] = mixes[j] ^ s
+            table_keys[s] = keys[j]
+            table_values[s] = values[j]
+
+        self._capacity = capacity
+        self._buckets = buckets
+        self._pilots = pilots
+        self._keys = table_keys
+        self._values = table_values
+        self._size = taken.count(1) + len(self._overflow)
+
+    def _split_collisions(self, keys: list, values: list, mixes: list) -> tuple:
+        """
+        Receives parallel lists of keys, values and mixes, some mixes
+            repeated
+        Returns the lists without repeats: a repeated key keeps its last
+            value, and a different key sharing a mix goes to the
+            overflow dict, since no pilot can separate the two
+        """
+        first = {}
+        kept = []
+        for j, mix in enumerate(mixes):
+            k = first.get(mix)
+            if k is None:
+                first[mix] = len(kept)
+                kept.append(j)
+            elif keys[kept[k]] == keys[j]:
+                kept[k] = j
+            else:
+                self._overflow[keys[j]] = values[j]
+        return ([keys[j] for j in kept], [values[j] for j in kept],
+                [mixes[j] for j in kept])
+
+    def __reduce__(self) -> tuple:
+        """
+        Pickles the map as its pairs; Python's string hash changes from
+            process to process, so the pilots are rebuilt when loaded
+        """
+        return (FrozenHashMap, (list(self.items()),))
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for key, value in self.items():
+            out += str(key) + ': ' + str(value) + '\n'
+        return out
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._size
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._capacity
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self._size / self._capacity
+
+    # ------------------------------------------------------------------ #
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        mix = (hash(key) * FIBONACCI_MULTIPLIER) & MASK64
+        slot = (mix ^ self._pilots[(mix >> 32) * self._buckets >> 32]) % self._capacity
+        if self._keys[slot] == key:
+            return self._values[slot]
+        if self._overflow:
+            return self._overflow.get(key)
+        return None
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        mix = (hash(key) * FIBONACCI_MULTIPLIER) & MASK64
+        slot = (mix ^ self._pilots[(mix >> 32) * self._buckets >> 32]) % self._capacity
+        return self._keys[slot] == key or key in self._overflow
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns a list of the value of each key, None where not found
+        """
+        pilots, buckets, capacity = self._pilots, self._buckets, self._capacity
+        table_keys, table_values, overflow = self._keys, self._values, self._overflow
+        values = []
+        for key in keys:
+            mix = (hash(key) * FIBONACCI_MULTIPLIER) & MASK64
+            slot = (mix ^ pilots[(mix >> 32) * buckets >> 32]) % capacity
+            if table_keys[slot] == key:
+                values.append(table_values[slot])
+            else:
+                values.append(overflow.get(key))
+        return values
+
+    def keys(self):
+        """
+        Returns a generator over every key, in slot order
+        """
+        return (key for key, value in self.items())
+
+    def values(self):
+        """
+        Returns a generator over every value, in slot order
+        """
+        return (value for key, value in self.items())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in slot order
+            and then any overflow pairs
+        """
+        for key, value in zip(self._keys, self._values):
+            if key is not _EMPTY:
+                yield key, value
+        yield from self._overflow.items()
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        for pair in self.items():
+            arr.append(pair)
+        return arr
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    import pickle
+
+    import hash_map_oa
+    import hash_map_sc
+    from a6_include import hash_function_1
+
+    print("\nfreeze example 1")
+    print("----------------")
+    m = hash_map_sc.HashMap(53, hash_function_1)
+    for i in range(1000):
+        m.put('str' + str(i), i * 10)
+    # anagrams share hash_function_1, not the frozen map's hash
+    m.put('abc', 1)
+    m.put('cba', 2)
+    frozen = m.freeze()
+    print(frozen.get_size(), frozen.get_capacity(), round(frozen.table_load(), 3))
+    print(frozen.get('str7'), frozen.get('abc'), frozen.get('cba'), frozen.get('str1000'))
+    print(all(frozen.get(key) == value for key, value in m.items()))
+    print(frozen.contains_key('str999'), frozen.contains_key('bca'))
+
+    print("\nfreeze example 2")
+    print("----------------")
+    m = hash_map_oa.HashMap(11, hash_function_1)
+    for key in ('a', 'b', 'c', 'd'):
+        m.put(key, key.upper())
+    frozen = m.freeze()
+    print(frozen.get_size(), frozen.get_capacity(), sorted(frozen.items()))
+    print(frozen.get_many(['a', 'e', 'd']))
+    print(sorted(pickle.loads(pickle.dumps(frozen)).items()) == sorted(frozen.items()))
+
+    print("\ncollision example 1")
+    print("-------------------")
+    # -1 and -2 share Python's hash, so one of them overflows
+    frozen = FrozenHashMap([(-1, 'x'), (-2, 'y'), (3, 'z'), (3, 'w')])
+    print(frozen.get_size(), frozen.get(-1), frozen.get(-2), frozen.get(3), frozen.get(4))
+    print(FrozenHashMap().get_size(), FrozenHashMap().get('a'))
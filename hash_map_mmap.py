@@ -0,0 +1,615 @@
+# Name: Kent Tolzmann
+# Description: Memory-mapped open addressing HashMap: the slot table lives
+#              in a file accessed through mmap and the keys and values in
+#              an append-only log beside it, compacted on rebuild, so maps
+#              can outgrow RAM and be reopened later
+
+import mmap
+import os
+import pickle
+import struct
+
+from a6_include import (DynamicArray, FIBONACCI_MULTIPLIER, MASK64,
+                        fnv1a_hash, next_power_of_two)
+
+# slot file header: magic, capacity, size, tombstones, hash fingerprint,
+#   dead log bytes and log generation, padded so the slots that follow
+#   stay 8-byte aligned
+_MAGIC = b'HMMAP001'
+_HEADER = struct.Struct('<8sQQQQQQ')
+_HEADER_SIZE = 64
+
+# each slot holds two native 64-bit words: the cached hash and the log
+#   offset of its record plus one, 0 marking empty and all ones a tombstone
+_SLOT_WORDS = 2
+_EMPTY, _TOMBSTONE = 0, MASK64
+
+# log record header: key length, value length
+_RECORD = struct.Struct('<II')
+
+# bytes read per record lookup, enough for most records in one read
+_READ_AHEAD = 256
+
+# fraction of the slots tombstones may fill before the table is rebuilt
+_TOMBSTONE_RATIO = 0.25
+
+# fraction of the log replaced or removed records may fill before the
+#   table is rebuilt, once there are at least _MIN_GARBAGE dead bytes
+_GARBAGE_RATIO = 0.5
+_MIN_GARBAGE = 1 << 16
+
+# bytes buffered per write while a rebuild copies the live records
+_COPY_BUFFER = 1 << 20
+
+# smallest slot table
+_MIN_CAPACITY = 8
+
+# key hashed into the header so a reopen can check the hash function
+_FINGERPRINT_KEY = 'hash_map_mmap'
+
+
+def _map_slot_file(path: str, capacity: int = None) -> mmap.mmap:
+    """
+    Receives a slot file path and, to create the file, a capacity
+    Returns the file mapped read/write, created sparse and zero filled
+        (every slot empty) if a capacity is given
+    """
+    flags = os.O_RDWR
+    if capacity is not None:
+        flags |= os.O_CREAT | os.O_TRUNC
+    fd = os.open(path, flags, 0o644)
+    try:
+        if capacity is not None:
+            os.ftruncate(fd, _HEADER_SIZE + 8 * _SLOT_WORDS * capacity)
+        return mmap.mmap(fd, 0)
+    finally:
+        # the mapping keeps its own handle on the file
+        os.close(fd)
+
+
+def _log_path(path: str, generation: int) -> str:
+    """
+    Receives a slot file path and a log generation
+    Returns the path of that generation's log: path + '.log' for the
+        first, as files written before rebuilds had generations, and
+        path + '.log.' + generation after each rebuild
+    """
+    if generation == 0:
+        return path + '.log'
+    return path + '.log.' + str(generation)
+
+
+def _sync_directory(path: str) -> None:
+    """
+    Receives a file path
+    Writes the entries of the directory holding it through to disk,
+        so a rename there survives a crash
+    """
+    fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _slot_words(mm: mmap.mmap) -> memoryview:
+    """
+    Receives a mapped slot file
+    Returns its slots as a flat view of 64-bit words
+    """
+    return memoryview(mm)[_HEADER_SIZE:].cast('Q')
+
+
+class HashMap:
+    def __init__(self, path: str,
+                 capacity: int = _MIN_CAPACITY,
+                 function: callable = fnv1a_hash) -> None:
+        """
+        Initialize new HashMap kept in the slot file at path and the
+            key/value log at path + '.log', reopening them if they exist;
+            each rebuild moves the log to a new generation, named in the
+            slot file header (see get_log_path)
+        Capacity is the number of slots of a new map, a power of two,
+            probed with triangular offsets like hash_map_oa's pow2 policy;
+            a reopened map keeps its own capacity
+        function must be a deterministic hash, the same on every open:
+            a seeded or salted hash would lose every key on reopen
+        Values are pickled into the log, so only open files you trust
+        """
+        self._path = path
+        self._hash_function = function
+        self._fingerprint = self._hash(_FINGERPRINT_KEY)
+        self._version = 0
+        self._mm = None
+        self._slots = None
+
+        self._log = None
+
+        if os.path.exists(path):
+            self._mm = _map_slot_file(path)
+            (magic, capacity, size, tombstones, fingerprint, garbage,
+             generation) = _HEADER.unpack_from(self._mm)
+            if magic != _MAGIC:
+                self.close()
+                raise ValueError(path + " is not a hash_map_mmap slot file")
+            if fingerprint != self._fingerprint:
+                self.close()
+                raise ValueError("hash function differs from the one " + path + " was built with")
+            self._slots = _slot_words(self._mm)
+            self._set_capacity(capacity)
+            self._size = size
+            self._tombstones = tombstones
+            self._garbage = garbage
+            self._generation = generation
+            # a crash after a rebuild's rename can leave the previous log
+            if generation > 0 and os.path.exists(_log_path(path, generation - 1)):
+                os.remove(_log_path(path, generation - 1))
+        else:
+            capacity = next_power_of_two(max(capacity, _MIN_CAPACITY))
+            self._mm = _map_slot_file(path, capacity)
+            self._slots = _slot_words(self._mm)
+            self._set_capacity(capacity)
+            self._size = 0
+            self._tombstones = 0
+            self._garbage = 0
+            self._generation = 0
+            self._write_header()
+
+        self._log = os.open(self.get_log_path(), os.O_RDWR | os.O_CREAT, 0o644)
+        self._log_end = os.fstat(self._log).st_size
+
+    def _set_capacity(self, capacity: int) -> None:
+        """
+        Receives the capacity of the mapped slot table
+        Records it with the mask and shift used to index it
+        """
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+
+    def _write_header(self) -> None:
+        """
+        Stores the capacity, size, tombstone count, dead log bytes and
+            log generation in the slot file
+        """
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self._capacity, self._size,
+                          self._tombstones, self._fingerprint, self._garbage,
+                          self._generation)
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for i in range(self._capacity):
+            offset = self._slots[2 * i + 1]
+            if offset == _EMPTY:
+                out += str(i) + ': None\n'
+            elif offset == _TOMBSTONE:
+                out += str(i) + ': tombstone\n'
+            else:
+                key, value = self._decode(*self._read_record(offset - 1))
+                out += str(i) + ': ' + str(key) + ' -> ' + str(value) + '\n'
+        return out
+
+    def __enter__(self) -> "HashMap":
+        """
+        Returns the map for use in a with block
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Closes the map's files at the end of a with block
+        """
+        self.close()
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._size
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._capacity
+
+    def get_log_path(self) -> str:
+        """
+        Return path of the key/value log the slot file currently uses
+        """
+        return _log_path(self._path, self._generation)
+
+    # ------------------------------------------------------------------ #
+
+    def _hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns the key's hash reduced to the unsigned 64 bits stored per slot
+        """
+        return self._hash_function(key) & MASK64
+
+    def _read_record(self, offset: int) -> tuple:
+        """
+        Receives the log offset of a record
+        Returns the (key bytes, value bytes) stored there,
+            in one read unless the record is longer than _READ_AHEAD
+        """
+        data = os.pread(self._log, _READ_AHEAD, offset)
+        key_length, value_length = _RECORD.unpack_from(data)
+        start = _RECORD.size
+        end = start + key_length + value_length
+        if end > len(data):
+            data += os.pread(self._log, end - len(data), offset + len(data))
+        return data[start:start + key_length], data[start + key_length:end]
+
+    @staticmethod
+    def _decode(key_bytes: bytes, value_bytes: bytes) -> tuple:
+        """
+        Receives the key and value bytes of a record
+        Returns the (key, value) they encode
+        """
+        return key_bytes.decode('utf-8', 'surrogatepass'), pickle.loads(value_bytes)
+
+    def _append(self, key_bytes: bytes, value: object) -> int:
+        """
+        Receives an encoded key and a value
+        Appends their record to the log
+        Returns the record's log offset
+        """
+        value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        record = _RECORD.pack(len(key_bytes), len(value_bytes)) + key_bytes + value_bytes
+        offset = self._log_end
+        os.pwrite(self._log, record, offset)
+        self._log_end += len(record)
+        return offset
+
+    def _probe(self, key_bytes: bytes, hash: int) -> tuple:
+        """
+        Receives an encoded key and its hash
+        Returns (slot holding key or -1, first tombstone or empty slot
+            of its probe, value bytes of key or None) from one probe walk
+        Only slots whose cached hash matches read their record from the log
+        """
+        slots = self._slots
+        mask = self._mask
+        i = ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+        free = -1
+
+        for j in range(1, self._capacity + 1):
+            offset = slots[2 * i + 1]
+            if offset == _EMPTY:
+                return -1, (i if free < 0 else free), None
+            if offset == _TOMBSTONE:
+                if free < 0:
+                    free = i
+            elif slots[2 * i] == hash:
+                record_key, value_bytes = self._read_record(offset - 1)
+                if record_key == key_bytes:
+                    return i, free, value_bytes
+            # triangular offsets visit every slot of a power-of-two table
+            i = (i + j) & mask
+        return -1, free, None
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        The record is appended to the log and the slot pointed at it;
+            a replaced record stays in the log until the next rebuild
+        """
+        self.check_resize_table()
+        key_bytes = key.encode('utf-8', 'surrogatepass')
+        hash = self._hash(key)
+        i, free, value_bytes = self._probe(key_bytes, hash)
+        offset = self._append(key_bytes, value)
+
+        slots = self._slots
+        if i >= 0:
+            slots[2 * i + 1] = offset + 1
+            self._garbage += _RECORD.size + len(key_bytes) + len(value_bytes)
+            self._write_header()
+            return
+
+        if slots[2 * free + 1] == _TOMBSTONE:
+            self._tombstones -= 1
+        slots[2 * free] = hash
+        slots[2 * free + 1] = offset + 1
+        self._size += 1
+        self._version += 1
+        self._write_header()
+
+    def check_resize_table(self) -> None:
+        """
+        Checks if the capacity needs to be increased
+        Rebuilds the table once tombstones pass _TOMBSTONE_RATIO or dead
+            records pass _GARBAGE_RATIO of the log, and doubles it once
+            live slots and tombstones reach half of it
+        """
+        if (self._tombstones > self._capacity * _TOMBSTONE_RATIO or
+                self._garbage > max(self._log_end * _GARBAGE_RATIO, _MIN_GARBAGE)):
+            self._rebuild(self._capacity)
+        if (self._size + self._tombstones) / self._capacity >= 0.5:
+            self.resize_table(self._capacity * 2)
+
+    def resize_table(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Changes the capacity of the slot table
+            if new capacity parameters meets requirements
+        Slots move by their cached hash, and the log is compacted to
+            the live records as they move
+        """
+        # validate new capacity parameter
+        if new_capacity > self._size:
+            new_capacity = next_power_of_two(max(new_capacity, _MIN_CAPACITY))
+
+            # grow the target the way repeated puts would have
+            while 2 * (self._size - 1) >= new_capacity:
+                new_capacity *= 2
+
+            self._rebuild(new_capacity)
+
+    def _rebuild(self, new_capacity: int) -> None:
+        """
+        Receives a valid power-of-two capacity
+        Writes the live slots into a new slot file of that capacity and
+            their records into the log of the next generation, dropping
+            every tombstone and dead record
+        Both new files are synced before the slot file, whose header
+            names the new log, is renamed over the old one; that rename
+            is the only step that publishes the rebuild, so a crash
+            leaves either the old pair or the new one, and the old log
+            is removed once the directory is synced
+        """
+        path = self._path + '.resize'
+        generation = self._generation + 1
+        log_path = _log_path(self._path, generation)
+        mm = _map_slot_file(path, new_capacity)
+        new_slots = _slot_words(mm)
+        mask = new_capacity - 1
+        shift = 64 - (new_capacity.bit_length() - 1)
+
+        old_slots = self._slots
+        with open(log_path, 'wb', buffering=_COPY_BUFFER) as log:
+            for i in range(self._capacity):
+                offset = old_slots[2 * i + 1]
+                if offset != _EMPTY and offset != _TOMBSTONE:
+                    hash = old_slots[2 * i]
+                    k = ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> shift
+                    j = 0
+                    while new_slots[2 * k + 1] != _EMPTY:
+                        j += 1
+                        k = (k + j) & mask
+                    key_bytes, value_bytes = self._read_record(offset - 1)
+                    new_slots[2 * k] = hash
+                    new_slots[2 * k + 1] = log.tell() + 1
+                    log.write(_RECORD.pack(len(key_bytes), len(value_bytes)))
+                    log.write(key_bytes)
+                    log.write(value_bytes)
+            log_end = log.tell()
+            log.flush()
+            os.fsync(log.fileno())
+
+        old_log_path = self.get_log_path()
+        self._release()
+        os.close(self._log)
+        self._log = os.open(log_path, os.O_RDWR)
+        self._log_end = log_end
+        self._garbage = 0
+        self._generation = generation
+        self._mm, self._slots = mm, new_slots
+        self._set_capacity(new_capacity)
+        self._tombstones = 0
+        self._version += 1
+        self._write_header()
+        mm.flush()
+        os.replace(path, self._path)
+        _sync_directory(self._path)
+        os.remove(old_log_path)
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self._size / self._capacity
+
+    def empty_buckets(self) -> int:
+        """
+        Returns the number of empty slots in the hash table,
+            not counting tombstones
+        """
+        return self._capacity - self._size - self._tombstones
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        i, free, value_bytes = self._probe(key.encode('utf-8', 'surrogatepass'), self._hash(key))
+        if i < 0:
+            return None
+        return pickle.loads(value_bytes)
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        i, free, value_bytes = self._probe(key.encode('utf-8', 'surrogatepass'), self._hash(key))
+        return i >= 0
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        The slot becomes a tombstone, the record stays in the log until
+            the next rebuild
+        """
+        key_bytes = key.encode('utf-8', 'surrogatepass')
+        i, free, value_bytes = self._probe(key_bytes, self._hash(key))
+        if i >= 0:
+            self._slots[2 * i + 1] = _TOMBSTONE
+            self._garbage += _RECORD.size + len(key_bytes) + len(value_bytes)
+            self._size -= 1
+            self._tombstones += 1
+            self._version += 1
+            self._write_header()
+            if self._tombstones > self._capacity * _TOMBSTONE_RATIO:
+                self._rebuild(self._capacity)
+
+    # ------------------ Iteration ------------------------------------- #
+
+    def _records(self):
+        """
+        Generator over the (key bytes, value bytes) of every live slot,
+            in table order, holding its own position
+        Raises RuntimeError once the map has an entry inserted or
+            removed, or is resized, during the iteration
+        """
+        version = self._version
+        for i in range(self._capacity):
+            offset = self._slots[2 * i + 1]
+            if offset != _EMPTY and offset != _TOMBSTONE:
+                yield self._read_record(offset - 1)
+                if self._version != version:
+                    raise RuntimeError("HashMap changed during iteration")
+
+    def keys(self):
+        """
+        Returns a generator over every key, in table order
+        """
+        return (key_bytes.decode('utf-8', 'surrogatepass') for key_bytes, value_bytes in self._records())
+
+    def values(self):
+        """
+        Returns a generator over every value, in table order
+        """
+        return (pickle.loads(value_bytes) for key_bytes, value_bytes in self._records())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in the same
+            order as get_keys_and_values but without copying them out
+        """
+        return (self._decode(*record) for record in self._records())
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        for pair in self.items():
+            arr.append(pair)
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map, emptying the log
+        Capacity remains unchanged
+        """
+        self._release()
+        self._mm = _map_slot_file(self._path, self._capacity)
+        self._slots = _slot_words(self._mm)
+        self._size = 0
+        self._tombstones = 0
+        self._garbage = 0
+        self._version += 1
+        self._write_header()
+        os.ftruncate(self._log, 0)
+        self._log_end = 0
+
+    # ------------------ Files ----------------------------------------- #
+
+    def flush(self) -> None:
+        """
+        Writes the slot table and the log through to disk
+        """
+        self._mm.flush()
+        os.fsync(self._log)
+
+    def _release(self) -> None:
+        """
+        Unmaps the current slot file
+        """
+        if self._slots is not None:
+            self._slots.release()
+            self._slots = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def close(self) -> None:
+        """
+        Flushes and closes the slot file and the log
+        The map cannot be used afterwards
+        """
+        if self._mm is not None:
+            self._mm.flush()
+        self._release()
+        if self._log is not None:
+            os.fsync(self._log)
+            os.close(self._log)
+            self._log = None
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'map')
+
+        print("\nput example 1")
+        print("-------------")
+        m = HashMap(path, 8)
+        for i in range(150):
+            m.put('str' + str(i), i * 100)
+            if i % 25 == 24:
+                print(m.empty_buckets(), round(m.table_load(), 2), m.get_size(), m.get_capacity())
+
+        print("\nget / remove example 1")
+        print("----------------------")
+        keys = [i for i in range(1, 1000, 20)]
+        for key in keys:
+            m.put(str(key), key * 42)
+        result = True
+        for key in keys:
+            # all inserted keys must be present
+            result &= m.get(str(key)) == key * 42
+            # NOT inserted keys must be absent
+            result &= not m.contains_key(str(key + 1))
+        print(m.get_size(), m.get_capacity(), result)
+        for key in keys[::2]:
+            m.remove(str(key))
+        print(m.get_size(), m.contains_key('1'), m.contains_key('21'))
+
+        print("\nreopen example 1")
+        print("----------------")
+        m.put('list', [1, 2, 3])
+        m.resize_table(1024)
+        m.close()
+        with HashMap(path) as m:
+            print(m.get_size(), m.get_capacity(), m.get('list'), m.get('21'), m.get('1'))
+        try:
+            HashMap(path, function=lambda key: 0)
+        except ValueError as error:
+            print(error.args[0].replace(directory, '<dir>'))
+
+        print("\ncompaction example 1")
+        print("--------------------")
+        with HashMap(path) as m:
+            for i in range(20000):
+                m.put('counter' + str(i % 10), 'x' * (i % 100))
+            # replaced records are dropped from the log on rebuild
+            print(m.get_size(), len(m.get('counter9')), os.path.getsize(m.get_log_path()) < 1 << 17)
+            # the rebuilds leave only the current log behind
+            print(sorted(name for name in os.listdir(directory)
+                         if name.startswith('map.log')) == [os.path.basename(m.get_log_path())])
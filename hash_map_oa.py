@@ -2,30 +2,95 @@
 # Description: Optimized HashMap Open Addressing implementation
 #              with several data manipulation methods
 
-from a6_include import (DynamicArray, DynamicArrayException, HashEntry,
-                        hash_function_1, hash_function_2)
+from array import array
+
+from a6_include import (DynamicArray, DynamicArrayException, HashEntry, hash_array,
+                        hash_fingerprint, read_snapshot, write_snapshot,
+                        FIBONACCI_MULTIPLIER, MASK64, gc_paused, hash_and_index_many,
+                        hash_many, next_power_of_two, hash_function_1, hash_function_2)
+from hash_map_frozen import FrozenHashMap
+
+# old slots migrated per operation during an incremental resize
+_REHASH_SLOTS = 8
+
+# fraction of the table tombstones may fill before it is compacted
+_TOMBSTONE_RATIO = 0.25
+
+# slot states for CompactHashMap
+_EMPTY, _LIVE, _TOMBSTONE = 0, 1, 2
 
 
 class HashMap:
-    def __init__(self, capacity: int, function) -> None:
+    def __init__(self, capacity: int, function,
+                 capacity_policy: str = "prime",
+                 incremental_resize: bool = False,
+                 probing: str = "quadratic",
+                 tombstone_ratio: float = _TOMBSTONE_RATIO) -> None:
         """
         Initialize new HashMap that uses
         quadratic probing for collision resolution
+        capacity_policy "prime" probes i + j^2 mod capacity,
+            "pow2" probes triangular offsets under a bitmask
+        incremental_resize spreads automatic resizes across later
+            operations instead of rehashing everything inside one put
+        probing "robin_hood" switches to linear Robin Hood probing with
+            backward-shift deletion, which leaves no tombstones
+        tombstone_ratio is the fraction of the capacity tombstones may
+            fill before the table is compacted at its current capacity
         """
+        if capacity_policy not in ("prime", "pow2"):
+            raise ValueError("capacity_policy must be 'prime' or 'pow2'")
+        if tombstone_ratio <= 0:
+            raise ValueError("tombstone_ratio must be greater than 0")
+        if probing not in ("quadratic", "robin_hood"):
+            raise ValueError("probing must be 'quadratic' or 'robin_hood'")
+        if probing == "robin_hood" and incremental_resize:
+            raise ValueError("robin_hood probing does not support incremental_resize")
+        self._capacity_policy = capacity_policy
+        self._robin_hood = probing == "robin_hood"
         self._buckets = DynamicArray()
 
-        # capacity must be a prime number
-        self._capacity = self._next_prime(capacity)
+        # capacity must be a prime number (or a power of two)
+        if capacity_policy == "pow2":
+            self._capacity = next_power_of_two(capacity)
+        else:
+            self._capacity = self._next_prime(capacity)
+        self._mask = self._index_mask(self._capacity)
         for _ in range(self._capacity):
             self._buckets.append(None)
 
         self._hash_function = function
         self._size = 0
 
+        # tombstones count toward the load and are cleared by compaction
+        self._tombstones = 0
+        self._tombstone_ratio = tombstone_ratio
+
+        # bumped by every insert, removal and resize so iterators
+        #   can tell the map changed under them
+        self._version = 0
+
+        # incremental resize state: old table still being moved to _buckets
+        self._incremental = incremental_resize
+        self._old_buckets = None
+        self._old_capacity = 0
+        self._rehash_index = 0
+
+    @classmethod
+    def with_expected_size(cls, n: int, function, **kwargs) -> "HashMap":
+        """
+        Receives the number of entries the map will hold, a hash function
+            and any other constructor options
+        Returns a new map sized so n entries fit under the 0.5
+            load threshold without a resize
+        """
+        return cls(max(2 * n - 1, 1), function, **kwargs)
+
     def __str__(self) -> str:
         """
         Override string method to provide more readable output
         """
+        self._finish_rehash()
         out = ''
         for i in range(self._buckets.length()):
             out += str(i) + ': ' + str(self._buckets[i]) + '\n'
@@ -62,6 +127,79 @@ class HashMap:
 
         return True
 
+    def _round_capacity(self, capacity: int) -> int:
+        """
+        Round a requested capacity up to one allowed by the capacity policy
+        """
+        if self._capacity_policy == "pow2":
+            return next_power_of_two(capacity)
+        if self._is_prime(capacity) is False:
+            return self._next_prime(capacity)
+        return capacity
+
+    def _index_mask(self, capacity: int):
+        """
+        Returns the bitmask used for indexing, or None for prime capacities
+        Also sets the shift that selects the top log2(capacity) hash bits
+        """
+        if self._capacity_policy == "pow2":
+            self._shift = 64 - (capacity.bit_length() - 1)
+            return capacity - 1
+        return None
+
+    def _bucket_index(self, hash: int) -> int:
+        """
+        Receives a hash
+        Returns the initial probe index for that hash
+        """
+        if self._mask is None:
+            return hash % self._capacity
+        # Fibonacci hashing: the top bits of the product are well mixed
+        return ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+
+    def _next_index(self, i_init: int, i: int, j: int) -> int:
+        """
+        Receives the initial index, current index and probe number j
+        Returns the j-th probe index: quadratic for prime capacities,
+            triangular (i_init + j(j+1)/2) for power-of-two capacities,
+            both of which visit enough slots to always find an empty one
+        """
+        if self._mask is None:
+            return (i_init + j ** 2) % self._capacity
+        return (i + j) & self._mask
+
+    def _probe_limit(self, capacity: int) -> int:
+        """
+        Receives a table capacity
+        Returns how many probes reach every slot a probe sequence can:
+            quadratic prime probes repeat after capacity // 2 + 1,
+            triangular power-of-two probes cover the whole table
+        A table just over half full can fill one whole prime sequence,
+            so lookups stop here rather than cycling forever
+        """
+        if self._mask is None:
+            return capacity // 2 + 1
+        return capacity
+
+    def _old_bucket_index(self, hash: int) -> int:
+        """
+        Receives a hash
+        Returns the initial probe index for that hash in the old table
+        """
+        if self._mask is None:
+            return hash % self._old_capacity
+        shift = 64 - (self._old_capacity.bit_length() - 1)
+        return ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> shift
+
+    def _old_next_index(self, i_init: int, i: int, j: int) -> int:
+        """
+        Receives the initial index, current index and probe number j
+        Returns the j-th probe index in the old table
+        """
+        if self._mask is None:
+            return (i_init + j ** 2) % self._old_capacity
+        return (i + j) & (self._old_capacity - 1)
+
     def get_size(self) -> int:
         """
         Return size of map
@@ -81,43 +219,150 @@ class HashMap:
         Receives a key/value pair
         Updates the value for key in the hash map
         Adds the key/value pair if not found in hash map
+        One probe walk both finds the key and picks its insert slot
         """
-        self.check_resize_table()
-
         # check if key already exists, update value
-        hash_entry = self.get_hash_entry(key)
+        hash_entry, i, hash = self._locate(key)
         if hash_entry is not None:
             hash_entry.value = value
         else:
-            # compute element's bucket index
-            hash = self._hash_function(key)
-            i = hash % self._capacity
-            i_init = i
-            m = self._capacity
-            j = 0
-
-            # probe quadratically for empty or tombstone
-            new_hash_entry = HashEntry(key, value)
-            while self._buckets.get_at_index(i) is not None:
-                hash_entry = self._buckets.get_at_index(i)
-                if hash_entry.is_tombstone is True:
-                    self._buckets.set_at_index(i, new_hash_entry)
-                    self._size += 1
-                    return
-                # increment index
-                j += 1
-                i = (i_init + j ** 2) % m
+            self._insert_at(i, key, value, hash)
+
+    def _insert_entry(self, hash_entry: HashEntry) -> None:
+        """
+        Receives a hash entry whose key is not in the table
+        Places the entry in the first empty or tombstone slot of its probe
+        """
+        if self._robin_hood:
+            self._robin_hood_insert(hash_entry)
+            return
+
+        i = self._bucket_index(hash_entry.hash)
+        i_init = i
+        j = 0
+
+        # probe quadratically for empty or tombstone
+        while self._buckets.get_at_index(i) is not None:
+            if self._buckets.get_at_index(i).is_tombstone is True:
+                self._tombstones -= 1
+                break
+            # increment index
+            j += 1
+            i = self._next_index(i_init, i, j)
 
-            self._buckets.set_at_index(i, new_hash_entry)
-            self._size += 1
+        self._buckets.set_at_index(i, hash_entry)
 
     def check_resize_table(self):
         """
         Checks if the capacity needs to be increased
         Resizes the capacity if needed
+        Tombstones count toward the load, so a table full of them
+            is compacted or grown rather than probed to exhaustion
+        """
+        self._check_tombstones()
+        if (self._size + self._tombstones) / self._capacity >= 0.5:
+            if self._incremental:
+                self._finish_rehash()
+                self._begin_rehash(self._round_capacity(self._capacity * 2))
+            else:
+                self.resize_table(self._capacity * 2)
+
+    def _check_tombstones(self) -> None:
         """
-        if self.table_load() >= 0.5:
-            self.resize_table(self._capacity * 2)
+        Compacts the table once tombstones pass the tombstone ratio,
+            migrating incrementally if the map resizes incrementally
+        """
+        if self._tombstones <= self._capacity * self._tombstone_ratio:
+            return
+        if self._incremental:
+            if self._old_buckets is None:
+                self._begin_rehash(self._capacity)
+        else:
+            self._rebuild(self._capacity)
+
+    def compact(self) -> None:
+        """
+        Rehashes the live entries at the current capacity,
+            dropping every tombstone from the table
+        """
+        self._finish_rehash()
+        if self._tombstones > 0:
+            self._rebuild(self._capacity)
+
+    def _begin_rehash(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Swaps in an empty new table and keeps the old one for migration
+        """
+        self._old_buckets = self._buckets
+        self._old_capacity = self._capacity
+        self._rehash_index = 0
+        self._version += 1
+
+        self._buckets = DynamicArray([None] * new_capacity)
+        self._capacity = new_capacity
+        self._mask = self._index_mask(new_capacity)
+
+    def _rehash_step(self, slots: int = _REHASH_SLOTS) -> None:
+        """
+        Receives a number of old slots to migrate
+        Moves their live entries into the new table
+            and ends the resize once the old table is exhausted
+        Old slots are left in place so old probe sequences stay intact;
+            anything before _rehash_index counts as already moved
+        Tombstones still ahead of _rehash_index stay counted until passed
+        """
+        old_table = self._old_buckets
+        stop = min(self._rehash_index + slots, self._old_capacity)
+        while self._rehash_index < stop:
+            hash_entry = old_table.get_at_index(self._rehash_index)
+            self._rehash_index += 1
+            if hash_entry is not None:
+                if hash_entry.is_tombstone is False:
+                    self._insert_entry(hash_entry)
+                else:
+                    self._tombstones -= 1
+
+        if self._rehash_index == self._old_capacity:
+            self._old_buckets = None
+
+    def _finish_rehash(self) -> None:
+        """
+        Completes any incremental resize in progress
+        """
+        if self._old_buckets is not None:
+            self._rehash_step(self._old_capacity)
+
+    def _old_hash_entry(self, key: str, hash: int):
+        """
+        Receives a key and its hash
+        Returns the live entry for key if it is still in the old table
+        """
+        i = self._old_bucket_index(hash)
+        i_init = i
+        j = 0
+        limit = self._probe_limit(self._old_capacity)
+
+        while j < limit and self._old_buckets.get_at_index(i) is not None:
+            hash_entry = self._old_buckets.get_at_index(i)
+            if i >= self._rehash_index and hash_entry.is_tombstone is False:
+                if hash_entry.hash == hash and hash_entry.key == key:
+                    return hash_entry
+            # increment index
+            j += 1
+            i = self._old_next_index(i_init, i, j)
+        return None
+
+    def _resize_target(self, new_capacity: int) -> int:
+        """
+        Receives a requested capacity greater than the size
+        Returns the capacity resize_table rebuilds to: rounded up, then
+            grown the way repeated puts would have until the entries fit
+        """
+        new_capacity = self._round_capacity(new_capacity)
+        while 2 * (self._size - 1) >= new_capacity:
+            new_capacity = self._round_capacity(new_capacity * 2)
+        return new_capacity
 
     def resize_table(self, new_capacity: int) -> None:
         """
@@ -127,32 +372,50 @@ class HashMap:
         """
         # validate new capacity parameter
         if new_capacity > self.get_size():
-            if self._is_prime(new_capacity) is False:
-                new_capacity = self._next_prime(new_capacity)
-
-            # initiate a new Dynamic Array with new capacity
-            new_table = DynamicArray()
-            for i in range(new_capacity):
-                new_table.append(None)
-
-            # hold old table for now to move values over
-            # update pointers to new table
-            old_table = self._buckets
-            self._buckets = new_table
-            self._capacity = new_capacity
-            self._size = 0
-
-            # rehash table elements
-            for i in range(old_table.length()):
-                hash_entry = old_table.get_at_index(i)
-                if hash_entry is not None:
-                    self.put(hash_entry.key, hash_entry.value)
+            self._finish_rehash()
+            self._rebuild(self._resize_target(new_capacity))
+
+    def reserve(self, n: int) -> None:
+        """
+        Receives the number of entries the map will hold
+        Grows the table once, if needed, so n entries fit under the
+            0.5 load threshold without a further resize
+        """
+        if 2 * (n - 1) >= self._capacity:
+            self.resize_table(2 * n - 1)
+
+    def shrink_to_fit(self) -> None:
+        """
+        Resizes the table down to the smallest capacity that holds
+            the current entries under the 0.5 load threshold
+        Tombstones are dropped even when the capacity cannot shrink
+        """
+        new_capacity = self._round_capacity(max(2 * self._size - 1, self._size + 1))
+        if new_capacity < self._capacity:
+            self.resize_table(new_capacity)
+        else:
+            self.compact()
 
-                    # check if the hash entry added was a tombstone
-                    # set hash entry added into new table as a tombstone
-                    if hash_entry.is_tombstone is True:
-                        self.get_hash_entry(hash_entry.key).is_tombstone = True
-                        self._size -= 1
+    def _rebuild(self, new_capacity: int) -> None:
+        """
+        Receives a valid capacity
+        Moves every live entry into a fresh table of that capacity
+        """
+        # hold old table for now to move values over
+        # update pointers to new table
+        old_table = self._buckets
+        self._buckets = DynamicArray([None] * new_capacity)
+        self._capacity = new_capacity
+        self._mask = self._index_mask(new_capacity)
+        self._tombstones = 0
+        self._version += 1
+
+        # move live entries straight into the new table by their
+        # cached hash, tombstones are simply left behind
+        for i in range(old_table.length()):
+            hash_entry = old_table.get_at_index(i)
+            if hash_entry is not None and hash_entry.is_tombstone is False:
+                self._insert_entry(hash_entry)
 
     def table_load(self) -> float:
         """
@@ -164,9 +427,11 @@ class HashMap:
 
     def empty_buckets(self) -> int:
         """
-        Returns the number of empty buckets in the hash table
+        Returns the number of empty buckets in the hash table,
+            not counting tombstones
         """
-        return self._capacity - self._size
+        self._finish_rehash()
+        return self._capacity - self._size - self._tombstones
 
     def get_hash_entry(self, key):
         """
@@ -174,22 +439,37 @@ class HashMap:
         Returns the hash entry object for that hash entry if found
         Returns None if not found
         """
+        return self._find_entry(key, self._hash_function(key))
+
+    def _find_entry(self, key: str, hash: int):
+        """
+        Receives a key and its hash
+        Returns the live hash entry for key, or None if not found
+        Entries with a different cached hash are skipped without
+            comparing keys
+        """
+        if self._robin_hood:
+            return self._robin_hood_find(key, hash)
+
         # compute element's bucket index
-        hash = self._hash_function(key)
-        i = hash % self._capacity
+        i = self._bucket_index(hash)
         i_init = i
-        m = self._capacity
         j = 0
+        limit = self._probe_limit(self._capacity)
 
         # search for hash entry
-        while self._buckets.get_at_index(i) is not None:
+        while j < limit and self._buckets.get_at_index(i) is not None:
             hash_entry = self._buckets.get_at_index(i)
             if hash_entry.is_tombstone is False:
-                if hash_entry.key == key:
+                if hash_entry.hash == hash and hash_entry.key == key:
                     return hash_entry
             # increment index
             j += 1
-            i = (i_init + j ** 2) % m
+            i = self._next_index(i_init, i, j)
+
+        # during a resize the key may still be in the old table
+        if self._old_buckets is not None:
+            return self._old_hash_entry(key, hash)
         return None
 
     def get(self, key: str) -> object:
@@ -198,23 +478,12 @@ class HashMap:
         Returns the value for that hash entry if found
         Returns None if not found
         """
-        # compute element's bucket index
-        hash = self._hash_function(key)
-        i = hash % self._capacity
-        i_init = i
-        m = self._capacity
-        j = 0
+        if self._old_buckets is not None:
+            self._rehash_step()
 
-        # search for key
-        while self._buckets.get_at_index(i) is not None:
-            hash_entry = self._buckets.get_at_index(i)
-            if hash_entry.is_tombstone is False:
-                if hash_entry.key == key:
-                    return hash_entry.value
-
-            # increment index
-            j += 1
-            i = (i_init + j ** 2) % m
+        hash_entry = self._find_entry(key, self._hash_function(key))
+        if hash_entry is not None:
+            return hash_entry.value
         return None
 
     def contains_key(self, key: str) -> bool:
@@ -231,30 +500,384 @@ class HashMap:
         """
         Removes the given key and its associated value from the hash map
         """
-        # compute element's bucket index
+        if self._old_buckets is not None:
+            self._rehash_step()
+
+        if self._robin_hood:
+            if self._robin_hood_remove(key, self._hash_function(key)):
+                self._size -= 1
+                self._version += 1
+            return
+
+        hash_entry = self._find_entry(key, self._hash_function(key))
+        if hash_entry is not None:
+            hash_entry.is_tombstone = True
+            self._size -= 1
+            self._tombstones += 1
+            self._version += 1
+            self._check_tombstones()
+
+    # ------------------ Single-probe upserts -------------------------- #
+
+    def _locate(self, key: str) -> tuple:
+        """
+        Receives a key
+        Resizes and migrates as put does, then returns (live entry for
+            key or None, slot to insert it at, hash) from a single probe
+            walk, the slot being the first tombstone or empty slot seen
+        Robin Hood tables return slot -1, their inserts shift entries
+        """
+        self.check_resize_table()
+        if self._old_buckets is not None:
+            self._rehash_step()
+
         hash = self._hash_function(key)
-        i = hash % self._capacity
+        if self._robin_hood:
+            return self._robin_hood_find(key, hash), -1, hash
+
+        hash_entry, i = self._probe(key, hash, self._bucket_index(hash))
+
+        # during a resize the key may still be in the old table
+        if hash_entry is None and self._old_buckets is not None:
+            hash_entry = self._old_hash_entry(key, hash)
+        return hash_entry, i, hash
+
+    def _insert_at(self, i: int, key: str, value: object, hash: int) -> None:
+        """
+        Receives the slot _locate returned and a new key, value and hash
+        Stores a new entry in that slot, or places it by probing
+            again if there is no slot
+        """
+        hash_entry = HashEntry(key, value, hash)
+        if i < 0:
+            self._insert_entry(hash_entry)
+        else:
+            if self._buckets.get_at_index(i) is not None:
+                self._tombstones -= 1
+            self._buckets.set_at_index(i, hash_entry)
+        self._size += 1
+        self._version += 1
+
+    def setdefault(self, key: str, default: object = None) -> object:
+        """
+        Receives a key and a default value
+        Returns the key's value, first inserting default if not found
+        """
+        hash_entry, i, hash = self._locate(key)
+        if hash_entry is not None:
+            return hash_entry.value
+        self._insert_at(i, key, default, hash)
+        return default
+
+    def get_or_insert_with(self, key: str, factory: callable) -> object:
+        """
+        Receives a key and a function of no arguments
+        Returns the key's value, first inserting factory() if not found
+        factory runs between the probe and the insert; if it changes
+            the map, the key is put again afterwards
+        """
+        hash_entry, i, hash = self._locate(key)
+        if hash_entry is not None:
+            return hash_entry.value
+        version, migrating = self._version, self._old_buckets is not None
+        value = factory()
+        if self._version != version or migrating:
+            self.put(key, value)
+        else:
+            self._insert_at(i, key, value, hash)
+        return value
+
+    def update(self, key: str, function: callable, default: object = None) -> object:
+        """
+        Receives a key, a function of one argument and a default value
+        Sets the key's value to function(value), applied to default
+            if the key is not found
+        Returns the new value
+        If function changes the map, the key is put again afterwards,
+            since the slot found before it ran may be stale
+        """
+        hash_entry, i, hash = self._locate(key)
+        version, migrating = self._version, self._old_buckets is not None
+        value = function(default if hash_entry is None else hash_entry.value)
+        if self._version != version or migrating:
+            self.put(key, value)
+        elif hash_entry is not None:
+            hash_entry.value = value
+        else:
+            self._insert_at(i, key, value, hash)
+        return value
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        """
+        Receives a key and an amount
+        Adds amount to the key's value, inserting the key with value
+            amount if not found, in a single probe
+        Returns the key's new value
+        """
+        hash_entry, i, hash = self._locate(key)
+        if hash_entry is not None:
+            hash_entry.value += amount
+            return hash_entry.value
+        self._insert_at(i, key, amount, hash)
+        return amount
+
+    # ------------------ Batch operations ------------------------------ #
+
+    def _hash_indices(self, keys: list) -> tuple:
+        """
+        Receives a list of keys
+        Returns (hashes, initial probe indices) of the keys, computed in one pass
+        """
+        if self._mask is None:
+            return hash_and_index_many(self._hash_function, keys, self._capacity)
+        return hash_and_index_many(self._hash_function, keys, self._capacity, self._shift)
+
+    def _presize(self, count: int) -> None:
+        """
+        Receives a number of keys about to be added
+        Resizes once, if needed, to the capacity repeated puts would
+            have doubled to, so all of them fit without another resize
+        """
+        if 2 * (self._size + self._tombstones + count - 1) >= self._capacity:
+            new_capacity = self._capacity
+            while 2 * (self._size + count - 1) >= new_capacity:
+                new_capacity = self._round_capacity(new_capacity * 2)
+            self.resize_table(new_capacity)
+
+    def _probe(self, key: str, hash: int, i: int) -> tuple:
+        """
+        Receives a key, its hash and initial probe index
+        Returns (live entry for key or None, first empty or tombstone
+            slot of the probe) from a single quadratic probe walk
+        """
         i_init = i
-        m = self._capacity
         j = 0
-
-        # search for key
-        while self._buckets.get_at_index(i) is not None:
+        free = -1
+        limit = self._probe_limit(self._capacity)
+        while j < limit:
             hash_entry = self._buckets.get_at_index(i)
-            if hash_entry.is_tombstone is False:
-                if hash_entry.key == key:
-                    hash_entry.is_tombstone = True
-                    self._size -= 1
-                    return
+            if hash_entry is None:
+                return None, (i if free < 0 else free)
+            if hash_entry.is_tombstone is True:
+                if free < 0:
+                    free = i
+            elif hash_entry.hash == hash and hash_entry.key == key:
+                return hash_entry, i
             # increment index
             j += 1
-            i = (i_init + j ** 2) % m
+            i = self._next_index(i_init, i, j)
+        return None, free
+
+    def put_many(self, pairs) -> None:
+        """
+        Receives an iterable of (key, value) pairs
+        Puts every pair, sizing the table once for the whole batch and
+            probing once per key for both the lookup and the insert
+        """
+        pairs = list(pairs)
+        self._presize(len(pairs))
+        self._version += 1
+
+        # a resize still migrating keeps the single-op path
+        if self._old_buckets is not None:
+            for key, value in pairs:
+                self.put(key, value)
+            return
+
+        hashes, indices = self._hash_indices([pair[0] for pair in pairs])
+        with gc_paused():
+            if self._robin_hood:
+                for (key, value), hash in zip(pairs, hashes):
+                    hash_entry = self._robin_hood_find(key, hash)
+                    if hash_entry is not None:
+                        hash_entry.value = value
+                    else:
+                        self._robin_hood_insert(HashEntry(key, value, hash))
+                        self._size += 1
+                return
+
+            for (key, value), hash, i in zip(pairs, hashes, indices):
+                hash_entry, i = self._probe(key, hash, i)
+                if hash_entry is not None:
+                    hash_entry.value = value
+                else:
+                    if self._buckets.get_at_index(i) is not None:
+                        self._tombstones -= 1
+                    self._buckets.set_at_index(i, HashEntry(key, value, hash))
+                    self._size += 1
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns a list of the value of each key, None where not found
+        """
+        keys = list(keys)
+        if self._old_buckets is not None:
+            return [self.get(key) for key in keys]
+
+        hashes, indices = self._hash_indices(keys)
+        if self._robin_hood:
+            entries = [self._robin_hood_find(key, hash) for key, hash in zip(keys, hashes)]
+        else:
+            entries = [self._probe(key, hash, i)[0]
+                       for key, hash, i in zip(keys, hashes, indices)]
+        return [hash_entry.value if hash_entry is not None else None for hash_entry in entries]
+
+    def remove_many(self, keys) -> None:
+        """
+        Receives an iterable of keys
+        Removes every key found in the hash map
+        """
+        keys = list(keys)
+        if self._old_buckets is not None:
+            for key in keys:
+                self.remove(key)
+            return
+
+        self._version += 1
+        hashes, indices = self._hash_indices(keys)
+        if self._robin_hood:
+            for key, hash in zip(keys, hashes):
+                if self._robin_hood_remove(key, hash):
+                    self._size -= 1
+            return
+
+        for key, hash, i in zip(keys, hashes, indices):
+            hash_entry, i = self._probe(key, hash, i)
+            if hash_entry is not None:
+                hash_entry.is_tombstone = True
+                self._size -= 1
+                self._tombstones += 1
+        self._check_tombstones()
+
+    # ------------------ Robin Hood probing ---------------------------- #
+
+    def _next_slot(self, i: int) -> int:
+        """
+        Receives an index
+        Returns the next index of a linear probe
+        """
+        if self._mask is None:
+            return (i + 1) % self._capacity
+        return (i + 1) & self._mask
+
+    def _distance(self, hash_entry: HashEntry, i: int) -> int:
+        """
+        Receives an entry and the index it sits at
+        Returns how far the entry is from its initial probe index
+        """
+        return (i - self._bucket_index(hash_entry.hash)) % self._capacity
+
+    def _robin_hood_find(self, key: str, hash: int):
+        """
+        Receives a key and its hash
+        Returns the hash entry for key, or None if not found
+        Stops early at any entry closer to home than the probe so far,
+            since key would have displaced it
+        """
+        i = self._bucket_index(hash)
+        distance = 0
+        while True:
+            hash_entry = self._buckets.get_at_index(i)
+            if hash_entry is None or self._distance(hash_entry, i) < distance:
+                return None
+            if hash_entry.hash == hash and hash_entry.key == key:
+                return hash_entry
+            i = self._next_slot(i)
+            distance += 1
+
+    def _robin_hood_insert(self, hash_entry: HashEntry) -> None:
+        """
+        Receives a hash entry whose key is not in the table
+        Walks the linear probe and swaps the carried entry with any
+            resident closer to its home, until an empty slot is reached
+        """
+        i = self._bucket_index(hash_entry.hash)
+        distance = 0
+        while True:
+            resident = self._buckets.get_at_index(i)
+            if resident is None:
+                self._buckets.set_at_index(i, hash_entry)
+                return
+            resident_distance = self._distance(resident, i)
+            if resident_distance < distance:
+                self._buckets.set_at_index(i, hash_entry)
+                hash_entry, distance = resident, resident_distance
+            i = self._next_slot(i)
+            distance += 1
+
+    def _robin_hood_remove(self, key: str, hash: int) -> bool:
+        """
+        Receives a key and its hash
+        Removes the key, shifting the following displaced entries back
+            one slot each so no tombstone is needed
+        Returns True if the key was removed, False if not found
+        """
+        i = self._bucket_index(hash)
+        distance = 0
+        while True:
+            hash_entry = self._buckets.get_at_index(i)
+            if hash_entry is None or self._distance(hash_entry, i) < distance:
+                return False
+            if hash_entry.hash == hash and hash_entry.key == key:
+                break
+            i = self._next_slot(i)
+            distance += 1
+
+        # backward shift until an empty slot or an entry already at home
+        j = self._next_slot(i)
+        following = self._buckets.get_at_index(j)
+        while following is not None and self._distance(following, j) > 0:
+            self._buckets.set_at_index(i, following)
+            i, j = j, self._next_slot(j)
+            following = self._buckets.get_at_index(j)
+        self._buckets.set_at_index(i, None)
+        return True
+
+    def _live_slots(self):
+        """
+        Generator over (index, hash) of every live slot in the table
+        """
+        self._finish_rehash()
+        for i in range(self._capacity):
+            hash_entry = self._buckets.get_at_index(i)
+            if hash_entry is not None and hash_entry.is_tombstone is False:
+                yield i, hash_entry.hash
+
+    def _probe_length(self, i: int, hash: int) -> int:
+        """
+        Receives the index of a live slot and its hash
+        Returns how many probes past the initial index it takes to reach it
+        """
+        if self._robin_hood:
+            return (i - self._bucket_index(hash)) % self._capacity
+
+        i_init = probe = self._bucket_index(hash)
+        j = 0
+        while probe != i:
+            j += 1
+            probe = self._next_index(i_init, probe, j)
+        return j
+
+    def get_probe_stats(self) -> tuple[int, float]:
+        """
+        Returns the (maximum, mean) probe length over all live entries
+        """
+        longest, total = 0, 0
+        for i, hash in self._live_slots():
+            length = self._probe_length(i, hash)
+            longest = max(longest, length)
+            total += length
+        if self._size == 0:
+            return 0, 0.0
+        return longest, total / self._size
 
     def get_keys_and_values(self) -> DynamicArray:
         """
         Returns a new Dynamic Array where each index contains
             tuples of each key/value pair stored in the hash map
         """
+        self._finish_rehash()
         arr = DynamicArray()
         for i in range(self._buckets.length()):
             hash_entry = self._buckets.get_at_index(i)
@@ -262,40 +885,606 @@ class HashMap:
                 arr.append((hash_entry.key, hash_entry.value))
         return arr
 
+    def freeze(self) -> FrozenHashMap:
+        """
+        Returns an immutable FrozenHashMap holding the current key/value
+            pairs, indexed by a minimal perfect hash so each get reads
+            one slot; later changes to this map do not reach it
+        """
+        return FrozenHashMap(self.items())
+
     def clear(self) -> None:
         """
         Clears the contents of the hash map
         Capacity remains unchanged
         """
+        self._buckets = DynamicArray([None] * self._capacity)
+        self._old_buckets = None
+        self._size = 0
+        self._tombstones = 0
+        self._version += 1
+
+    # ------------------ Iteration ------------------------------------- #
+
+    def _entries(self):
+        """
+        Generator over every live hash entry, in table order,
+            holding its own position so iterations can nest
+        Raises RuntimeError once the map has an entry inserted or
+            removed, or is resized, during the iteration
+        """
+        self._finish_rehash()
+        version = self._version
+        buckets = self._buckets
+        for i in range(self._capacity):
+            hash_entry = buckets.get_at_index(i)
+            if hash_entry is not None and hash_entry.is_tombstone is False:
+                yield hash_entry
+                if self._version != version:
+                    raise RuntimeError("HashMap changed during iteration")
+
+    def __iter__(self):
+        """
+        Returns a generator over every live hash entry,
+            so the hash map can iterate across itself
+        """
+        return self._entries()
+
+    def keys(self):
+        """
+        Returns a generator over every key, in table order
+        """
+        return (hash_entry.key for hash_entry in self._entries())
+
+    def values(self):
+        """
+        Returns a generator over every value, in table order
+        """
+        return (hash_entry.value for hash_entry in self._entries())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in the same
+            order as get_keys_and_values but without copying them out
+        """
+        return ((hash_entry.key, hash_entry.value) for hash_entry in self._entries())
+
+    # ------------------ Snapshots ------------------------------------- #
+
+    def _options(self) -> dict:
+        """
+        Returns the constructor options a snapshot restores
+        """
+        return {'capacity': self._capacity,
+                'capacity_policy': self._capacity_policy,
+                'incremental_resize': self._incremental,
+                'probing': "robin_hood" if self._robin_hood else "quadratic",
+                'tombstone_ratio': self._tombstone_ratio}
+
+    def dump(self, path: str) -> None:
+        """
+        Receives a file path
+        Writes a binary snapshot of the table layout: the empty, live or
+            tombstone state and cached hash of every slot, then the keys
+            and values of the live slots, so load puts every entry
+            back in its slot without rehashing
+        """
+        self._finish_rehash()
+        states = array('B', bytes(self._capacity))
+        hashes = [0] * self._capacity
+        keys, values = [], []
+        for i in range(self._capacity):
+            hash_entry = self._buckets.get_at_index(i)
+            if hash_entry is not None:
+                hashes[i] = hash_entry.hash
+                if hash_entry.is_tombstone is True:
+                    states[i] = _TOMBSTONE
+                else:
+                    states[i] = _LIVE
+                    keys.append(hash_entry.key)
+                    values.append(hash_entry.value)
+
+        write_snapshot(path, b'oa', hash_fingerprint(self._hash_function),
+                       [states, hash_array(hashes)], (self._options(), keys, values))
+
+    @classmethod
+    def load(cls, path: str, function) -> "HashMap":
+        """
+        Receives the path of a snapshot written by dump and the hash
+            function the map was built with
+        Returns a new map with the same options and slot layout,
+            tombstones included, without rehashing
+        Raises ValueError if function is not the one the map used
+        """
+        (states, hashes), (options, keys, values) = read_snapshot(
+            path, b'oa', hash_fingerprint(function))
+        capacity = options.pop('capacity')
+        m = cls(1, function, **options)
+
+        buckets = [None] * capacity
+        live = iter(zip(keys, values))
+        with gc_paused():
+            for i in range(capacity):
+                state = states[i]
+                if state == _LIVE:
+                    key, value = next(live)
+                    buckets[i] = HashEntry(key, value, hashes[i])
+                elif state == _TOMBSTONE:
+                    hash_entry = HashEntry(None, None, hashes[i])
+                    hash_entry.is_tombstone = True
+                    buckets[i] = hash_entry
+
+        m._buckets = DynamicArray(buckets)
+        m._capacity = capacity
+        m._mask = m._index_mask(capacity)
+        m._size = len(keys)
+        m._tombstones = capacity - len(keys) - states.count(_EMPTY)
+        return m
+
+
+class CompactHashMap(HashMap):
+    """
+    Open addressing HashMap storing its slots in parallel arrays instead
+        of one HashEntry object per key:
+    hashes in an array('Q'), keys and values in plain lists and the
+        empty/live/tombstone state of each slot in a bytearray
+    Probing, capacity policies and the public API match HashMap
+    """
+
+    def __init__(self, capacity: int, function,
+                 capacity_policy: str = "prime",
+                 tombstone_ratio: float = _TOMBSTONE_RATIO) -> None:
+        """
+        Initialize new compact HashMap that uses
+        quadratic probing for collision resolution
+        """
+        if capacity_policy not in ("prime", "pow2"):
+            raise ValueError("capacity_policy must be 'prime' or 'pow2'")
+        if tombstone_ratio <= 0:
+            raise ValueError("tombstone_ratio must be greater than 0")
+        self._capacity_policy = capacity_policy
+
+        # capacity must be a prime number (or a power of two)
+        if capacity_policy == "pow2":
+            self._capacity = next_power_of_two(capacity)
+        else:
+            self._capacity = self._next_prime(capacity)
+        self._mask = self._index_mask(self._capacity)
+        self._allocate(self._capacity)
+
+        self._hash_function = function
+        self._size = 0
+        self._tombstones = 0
+        self._tombstone_ratio = tombstone_ratio
+
+        # bumped by every insert, removal and resize so iterators
+        #   can tell the map changed under them
+        self._version = 0
+
+        # compact tables always probe quadratically and resize in one pass
+        self._robin_hood = False
+        self._incremental = False
+        self._old_buckets = None
+
+    def _allocate(self, capacity: int) -> None:
+        """
+        Receives a capacity
+        Replaces the slot arrays with empty ones of that capacity
+        """
+        self._hashes = array('Q', bytes(8 * capacity))
+        self._keys = [None] * capacity
+        self._values = [None] * capacity
+        self._states = bytearray(capacity)
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for i in range(self._capacity):
+            if self._states[i] == _EMPTY:
+                out += str(i) + ': None\n'
+            else:
+                out += (str(i) + ': K: ' + str(self._keys[i]) + ' V: ' + str(self._values[i])
+                        + ' TS: ' + str(self._states[i] == _TOMBSTONE) + '\n')
+        return out
+
+    def _hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns the key's hash reduced to the unsigned 64 bits stored per slot
+        """
+        return self._hash_function(key) & MASK64
+
+    def _hash_many(self, keys: list) -> list:
+        """
+        Receives a list of keys
+        Returns their hashes reduced to unsigned 64 bits, in one pass
+        """
+        return [hash & MASK64 for hash in hash_many(self._hash_function, keys)]
+
+    def _find_slot(self, key: str, hash: int) -> int:
+        """
+        Receives a key and its hash
+        Returns the index of the live slot holding key, or -1 if not found
+        """
+        states, hashes, keys = self._states, self._hashes, self._keys
+        i = self._bucket_index(hash)
+        i_init = i
+        j = 0
+        limit = self._probe_limit(self._capacity)
+
+        while j < limit and states[i] != _EMPTY:
+            if states[i] == _LIVE and hashes[i] == hash and keys[i] == key:
+                return i
+            # increment index
+            j += 1
+            i = self._next_index(i_init, i, j)
+        return -1
+
+    def _insert_slot(self, key: str, value: object, hash: int) -> None:
+        """
+        Receives a key not in the table, its value and hash
+        Stores them in the first empty or tombstone slot of the key's probe
+        """
+        states = self._states
+        i = self._bucket_index(hash)
+        i_init = i
+        j = 0
+
+        while states[i] == _LIVE:
+            # increment index
+            j += 1
+            i = self._next_index(i_init, i, j)
+
+        if states[i] == _TOMBSTONE:
+            self._tombstones -= 1
+        self._hashes[i] = hash
+        self._keys[i] = key
+        self._values[i] = value
+        states[i] = _LIVE
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        """
+        i, free, hash = self._locate(key)
+        if i >= 0:
+            self._values[i] = value
+        else:
+            self._insert_at(free, key, value, hash)
+
+    def _locate(self, key: str, hash: int = None) -> tuple:
+        """
+        Receives a key, and its hash if already computed
+        Resizes as put does, then returns (live slot of key or -1, first
+            tombstone or empty slot of its probe, hash) from one probe walk
+        """
+        self.check_resize_table()
+        if hash is None:
+            hash = self._hash(key)
+        return self._probe_locate(key, hash)
+
+    def _probe_locate(self, key: str, hash: int) -> tuple:
+        """
+        Receives a key and its hash
+        Returns what _locate does, without checking for a resize
+        """
+        states, hashes, keys = self._states, self._hashes, self._keys
+        i = self._bucket_index(hash)
+        i_init = i
+        j = 0
+        free = -1
+        limit = self._probe_limit(self._capacity)
+
+        while j < limit:
+            state = states[i]
+            if state == _EMPTY:
+                return -1, (i if free < 0 else free), hash
+            if state == _TOMBSTONE:
+                if free < 0:
+                    free = i
+            elif hashes[i] == hash and keys[i] == key:
+                return i, i, hash
+            # increment index
+            j += 1
+            i = self._next_index(i_init, i, j)
+        return -1, free, hash
+
+    def _insert_at(self, i: int, key: str, value: object, hash: int) -> None:
+        """
+        Receives the free slot _locate returned and a new key, value and hash
+        Stores them in that slot, or places them by probing again
+            if there is no slot
+        """
+        if i < 0:
+            self._insert_slot(key, value, hash)
+        else:
+            if self._states[i] == _TOMBSTONE:
+                self._tombstones -= 1
+            self._hashes[i] = hash
+            self._keys[i] = key
+            self._values[i] = value
+            self._states[i] = _LIVE
+        self._size += 1
+        self._version += 1
+
+    def setdefault(self, key: str, default: object = None) -> object:
+        """
+        Receives a key and a default value
+        Returns the key's value, first inserting default if not found
+        """
+        i, free, hash = self._locate(key)
+        if i >= 0:
+            return self._values[i]
+        self._insert_at(free, key, default, hash)
+        return default
+
+    def get_or_insert_with(self, key: str, factory: callable) -> object:
+        """
+        Receives a key and a function of no arguments
+        Returns the key's value, first inserting factory() if not found
+        factory runs between the probe and the insert; if it changes
+            the map, the key is put again afterwards
+        """
+        i, free, hash = self._locate(key)
+        if i >= 0:
+            return self._values[i]
+        version = self._version
+        value = factory()
+        if self._version != version:
+            self.put(key, value)
+        else:
+            self._insert_at(free, key, value, hash)
+        return value
+
+    def update(self, key: str, function: callable, default: object = None) -> object:
+        """
+        Receives a key, a function of one argument and a default value
+        Sets the key's value to function(value), applied to default
+            if the key is not found
+        Returns the new value
+        If function changes the map, the key is put again afterwards,
+            since the slot found before it ran may be stale
+        """
+        i, free, hash = self._locate(key)
+        version = self._version
+        value = function(default if i < 0 else self._values[i])
+        if self._version != version:
+            self.put(key, value)
+        elif i >= 0:
+            self._values[i] = value
+        else:
+            self._insert_at(free, key, value, hash)
+        return value
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        """
+        Receives a key and an amount
+        Adds amount to the key's value, inserting the key with value
+            amount if not found, in a single probe
+        Returns the key's new value
+        """
+        i, free, hash = self._locate(key)
+        if i >= 0:
+            self._values[i] += amount
+            return self._values[i]
+        self._insert_at(free, key, amount, hash)
+        return amount
+
+    def _rebuild(self, new_capacity: int) -> None:
+        """
+        Receives a valid capacity
+        Moves every live slot into fresh arrays of that capacity
+        """
+        old_hashes, old_keys = self._hashes, self._keys
+        old_values, old_states = self._values, self._states
+        self._allocate(new_capacity)
+        self._capacity = new_capacity
+        self._mask = self._index_mask(new_capacity)
+        self._tombstones = 0
+        self._version += 1
+
+        # move live slots by their stored hash, drop tombstones
+        for i in range(len(old_states)):
+            if old_states[i] == _LIVE:
+                self._insert_slot(old_keys[i], old_values[i], old_hashes[i])
+
+    def get_hash_entry(self, key):
+        """
+        Receives a key for a hash entry
+        Returns a HashEntry snapshot of the key's slot if found
+        Returns None if not found
+        """
+        hash = self._hash(key)
+        i = self._find_slot(key, hash)
+        if i < 0:
+            return None
+        return HashEntry(key, self._values[i], hash)
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key for a hash entry
+        Returns the value for that hash entry if found
+        Returns None if not found
+        """
+        i = self._find_slot(key, self._hash(key))
+        if i >= 0:
+            return self._values[i]
+        return None
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        """
+        i = self._find_slot(key, self._hash(key))
+        if i >= 0:
+            # the hash stays so the slot still reads as a tombstone
+            self._states[i] = _TOMBSTONE
+            self._keys[i] = None
+            self._values[i] = None
+            self._size -= 1
+            self._tombstones += 1
+            self._version += 1
+            self._check_tombstones()
+
+    def put_many(self, pairs) -> None:
+        """
+        Receives an iterable of (key, value) pairs
+        Puts every pair, sizing the table once for the whole batch and
+            probing once per key for both the lookup and the insert
+        """
+        pairs = list(pairs)
+        self._presize(len(pairs))
+        self._version += 1
+
+        hashes = self._hash_many([pair[0] for pair in pairs])
+        with gc_paused():
+            for (key, value), hash in zip(pairs, hashes):
+                i, free, hash = self._probe_locate(key, hash)
+                if i >= 0:
+                    self._values[i] = value
+                else:
+                    self._insert_at(free, key, value, hash)
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns a list of the value of each key, None where not found
+        """
+        keys = list(keys)
+        values = self._values
+        slots = [self._find_slot(key, hash) for key, hash in zip(keys, self._hash_many(keys))]
+        return [values[i] if i >= 0 else None for i in slots]
+
+    def remove_many(self, keys) -> None:
+        """
+        Receives an iterable of keys
+        Removes every key found in the hash map
+        """
+        keys = list(keys)
+        self._version += 1
+        for key, hash in zip(keys, self._hash_many(keys)):
+            i = self._find_slot(key, hash)
+            if i >= 0:
+                self._states[i] = _TOMBSTONE
+                self._keys[i] = None
+                self._values[i] = None
+                self._size -= 1
+                self._tombstones += 1
+        self._check_tombstones()
+
+    def _live_slots(self):
+        """
+        Generator over (index, hash) of every live slot in the table
+        """
+        for i in range(self._capacity):
+            if self._states[i] == _LIVE:
+                yield i, self._hashes[i]
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
         arr = DynamicArray()
         for i in range(self._capacity):
-            arr.append(None)
-        self._buckets = arr
+            if self._states[i] == _LIVE:
+                arr.append((self._keys[i], self._values[i]))
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map
+        Capacity remains unchanged
+        """
+        self._allocate(self._capacity)
         self._size = 0
+        self._tombstones = 0
+        self._version += 1
+
+    def _live_indices(self):
+        """
+        Generator over the index of every live slot, in table order,
+            holding its own position so iterations can nest
+        Raises RuntimeError once the map has an entry inserted or
+            removed, or is resized, during the iteration
+        """
+        version = self._version
+        states = self._states
+        for i in range(self._capacity):
+            if states[i] == _LIVE:
+                yield i
+                if self._version != version:
+                    raise RuntimeError("HashMap changed during iteration")
 
     def __iter__(self):
         """
-        Iterator to enable the hash map to iterate across itself
+        Returns a generator over a HashEntry snapshot of every live slot
         """
-        # initialize variable to track iterator progress through hashmap
-        self._index = 0
-        return self
+        return (HashEntry(self._keys[i], self._values[i], self._hashes[i])
+                for i in self._live_indices())
 
-    def __next__(self):
+    def keys(self):
         """
-        Returns the next item in the hash map,
-            based on current location of the iterator
+        Returns a generator over every key, in table order
         """
-        # stops at end of array
-        while self._index < self.get_capacity():
+        return (self._keys[i] for i in self._live_indices())
 
-            # retrieve entry, increment, and return only if active item
-            hash_entry = self._buckets.get_at_index(self._index)
-            self._index += 1
-            if hash_entry is not None and hash_entry.is_tombstone is False:
-                return hash_entry
+    def values(self):
+        """
+        Returns a generator over every value, in table order
+        """
+        return (self._values[i] for i in self._live_indices())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in the same
+            order as get_keys_and_values but without copying them out
+        """
+        return ((self._keys[i], self._values[i]) for i in self._live_indices())
+
+    def _options(self) -> dict:
+        """
+        Returns the constructor options a snapshot restores
+        """
+        return {'capacity': self._capacity,
+                'capacity_policy': self._capacity_policy,
+                'tombstone_ratio': self._tombstone_ratio}
+
+    def dump(self, path: str) -> None:
+        """
+        Receives a file path
+        Writes the slot arrays themselves as a binary snapshot:
+            states, hashes, keys and values
+        """
+        write_snapshot(path, b'compact', hash_fingerprint(self._hash_function),
+                       [array('B', self._states), self._hashes],
+                       (self._options(), self._keys, self._values))
 
-        raise StopIteration
+    @classmethod
+    def load(cls, path: str, function) -> "CompactHashMap":
+        """
+        Receives the path of a snapshot written by dump and the hash
+            function the map was built with
+        Returns a new map whose slot arrays are read straight from the file
+        Raises ValueError if function is not the one the map used
+        """
+        (states, hashes), (options, keys, values) = read_snapshot(
+            path, b'compact', hash_fingerprint(function))
+        capacity = options.pop('capacity')
+        m = cls(1, function, **options)
+        m._states = bytearray(states)
+        m._hashes = hashes
+        m._keys = keys
+        m._values = values
+        m._capacity = capacity
+        m._mask = m._index_mask(capacity)
+        m._size = m._states.count(_LIVE)
+        m._tombstones = m._states.count(_TOMBSTONE)
+        return m
 
 
 # ------------------- BASIC TESTING ---------------------------------------- #
@@ -507,4 +1696,39 @@ if __name__ == "__main__":
     for item in m:
         print('K:', item.key, 'V:', item.value)
 
+    print("\nCompactHashMap example 1")
+    print("---------------------")
+    m = CompactHashMap(10, hash_function_2)
+    for i in range(5):
+        m.put(str(i), str(i * 24))
+    m.remove('0')
+    m.remove('4')
+    print(m.get_size(), m.get_capacity(), m.get('1'), m.get('4'))
+    for item in m:
+        print('K:', item.key, 'V:', item.value)
 
+    print("\nupsert example 1")
+    print("----------------")
+    for m in (HashMap(10, hash_function_1), CompactHashMap(10, hash_function_1)):
+        for word in "the cat and the dog and the bird".split():
+            m.increment(word)
+        m.setdefault('cat', 10)
+        m.setdefault('fish', 0)
+        m.update('dog', lambda count: count * 10)
+        m.get_or_insert_with('owl', lambda: 7)
+        print(m.get('the'), m.get('cat'), m.get('fish'), m.get('dog'), m.get('owl'), m.get_size())
+
+    print("\ndump / load example 1")
+    print("---------------------")
+    import os
+    import tempfile
+    for m in (HashMap(10, hash_function_1), CompactHashMap(10, hash_function_1)):
+        for word in ("melon", "apple", "peach", "grape"):
+            m.put(word, len(word))
+        m.remove("apple")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot')
+            m.dump(path)
+            loaded = type(m).load(path, hash_function_1)
+        print(loaded.get_size(), loaded.get_capacity(), loaded._tombstones, loaded.get('grape'),
+              list(loaded.items()) == list(m.items()))
@@ -0,0 +1,298 @@
+# Name: Kent Tolzmann
+# Description: Compact ordered (OD) HashMap implementation: a sparse
+#              index table over dense insertion-ordered entries
+
+from array import array
+
+from a6_include import (DynamicArray, MASK64, next_power_of_two,
+                        hash_function_1, hash_function_2)
+
+# index table markers: never used / entry removed
+_EMPTY, _DUMMY = -1, -2
+
+# dense entries are kept for at most this fraction of the index table
+_USABLE_FRACTION = 2 / 3
+
+# smallest index table
+_MIN_CAPACITY = 8
+
+
+class _Deleted:
+    """
+    Placeholder key for removed dense entries
+    """
+
+    def __repr__(self) -> str:
+        """Override repr to provide more readable output."""
+        return '<deleted>'
+
+
+_DELETED = _Deleted()
+
+
+def _index_typecode(capacity: int) -> str:
+    """
+    Receives an index table capacity
+    Returns the smallest signed array typecode able to hold entry indices
+    """
+    if capacity <= 0x7F:
+        return 'b'
+    if capacity <= 0x7FFF:
+        return 'h'
+    if capacity <= 0x7FFFFFFF:
+        return 'l'
+    return 'q'
+
+
+class HashMap:
+    def __init__(self,
+                 capacity: int = _MIN_CAPACITY,
+                 function: callable = hash_function_1) -> None:
+        """
+        Initialize new HashMap that keeps entries in insertion order
+        in dense arrays and finds them through a sparse index table
+        Capacity is the size of the index table, a power of two
+        """
+        self._hash_function = function
+        self._capacity = next_power_of_two(max(capacity, _MIN_CAPACITY))
+        self._size = 0
+        self._build(self._capacity, [], [], [])
+
+    def _build(self, capacity: int, hashes: list, keys: list, values: list) -> None:
+        """
+        Receives an index capacity and live entries in order
+        Replaces the dense arrays with those entries and rebuilds
+            the index table over them
+        """
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._usable = int(capacity * _USABLE_FRACTION)
+        self._indices = array(_index_typecode(capacity), [_EMPTY]) * capacity
+        self._hashes = array('Q', hashes)
+        self._keys = keys
+        self._values = values
+        for ix in range(len(keys)):
+            self._indices[self._find_empty_slot(self._hashes[ix])] = ix
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for i in range(self._capacity):
+            ix = self._indices[i]
+            if ix < 0:
+                out += str(i) + ': None\n'
+            else:
+                out += str(i) + ': ' + str(self._keys[ix]) + ' -> ' + str(self._values[ix]) + '\n'
+        return out
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._size
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._capacity
+
+    # ------------------------------------------------------------------ #
+
+    def _hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns the key's hash reduced to the unsigned 64 bits stored per entry
+        """
+        return self._hash_function(key) & MASK64
+
+    def _lookup(self, key: str, hash: int) -> tuple:
+        """
+        Receives a key and its hash
+        Returns (index slot, dense entry index) of key,
+            with an entry index of -1 if the key is not found
+        Probes like CPython: i = 5i + 1 + perturb, perturb >>= 5
+        """
+        indices, hashes, keys = self._indices, self._hashes, self._keys
+        mask = self._mask
+        perturb = hash
+        i = hash & mask
+        while True:
+            ix = indices[i]
+            if ix == _EMPTY:
+                return i, -1
+            if ix >= 0 and hashes[ix] == hash and keys[ix] == key:
+                return i, ix
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+
+    def _find_empty_slot(self, hash: int) -> int:
+        """
+        Receives a hash
+        Returns the first empty or dummy index slot of the hash's probe
+        """
+        indices, mask = self._indices, self._mask
+        perturb = hash
+        i = hash & mask
+        while indices[i] >= 0:
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+        return i
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in place, keeping its position in order
+        Appends the key/value pair if not found in hash map
+        """
+        hash = self._hash(key)
+        i, ix = self._lookup(key, hash)
+        if ix >= 0:
+            self._values[ix] = value
+            return
+
+        # dense arrays full: rebuild, which also drops removed entries
+        if len(self._keys) >= self._usable:
+            self.check_resize_table()
+
+        self._indices[self._find_empty_slot(hash)] = len(self._keys)
+        self._hashes.append(hash)
+        self._keys.append(key)
+        self._values.append(value)
+        self._size += 1
+
+    def check_resize_table(self) -> None:
+        """
+        Rebuilds the table sized for three times the live entries,
+            like CPython's dict growth rate
+        """
+        self.resize_table(max(self._size * 3, _MIN_CAPACITY))
+
+    def resize_table(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the index table
+        Compacts the dense arrays and rebuilds the index table,
+            doubling new capacity until every entry fits
+        """
+        new_capacity = next_power_of_two(max(new_capacity, _MIN_CAPACITY))
+        while int(new_capacity * _USABLE_FRACTION) <= self._size:
+            new_capacity *= 2
+
+        hashes, keys, values = [], [], []
+        for ix in range(len(self._keys)):
+            if self._keys[ix] is not _DELETED:
+                hashes.append(self._hashes[ix])
+                keys.append(self._keys[ix])
+                values.append(self._values[ix])
+        self._build(new_capacity, hashes, keys, values)
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self._size / self._capacity
+
+    def empty_buckets(self) -> int:
+        """
+        Returns the number of index slots not holding a live entry
+        """
+        return self._capacity - self._size
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        i, ix = self._lookup(key, self._hash(key))
+        if ix >= 0:
+            return self._values[ix]
+        return None
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        i, ix = self._lookup(key, self._hash(key))
+        return ix >= 0
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        The dense entry is blanked, the index slot becomes a dummy
+        """
+        i, ix = self._lookup(key, self._hash(key))
+        if ix >= 0:
+            self._indices[i] = _DUMMY
+            self._keys[ix] = _DELETED
+            self._values[ix] = None
+            self._size -= 1
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair in insertion order
+        Walks only the dense entries, never the index table
+        """
+        arr = DynamicArray()
+        keys, values = self._keys, self._values
+        for ix in range(len(keys)):
+            if keys[ix] is not _DELETED:
+                arr.append((keys[ix], values[ix]))
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map
+        Capacity remains unchanged
+        """
+        self._build(self._capacity, [], [], [])
+        self._size = 0
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    print("\nput example 1")
+    print("-------------")
+    m = HashMap(53, hash_function_1)
+    for i in range(150):
+        m.put('str' + str(i), i * 100)
+        if i % 25 == 24:
+            print(m.empty_buckets(), round(m.table_load(), 2), m.get_size(), m.get_capacity())
+
+    print("\nget / remove example 1")
+    print("----------------------")
+    m = HashMap(8, hash_function_2)
+    keys = [i for i in range(1, 1000, 20)]
+    for key in keys:
+        m.put(str(key), key * 42)
+    result = True
+    for key in keys:
+        # all inserted keys must be present
+        result &= m.get(str(key)) == key * 42
+        # NOT inserted keys must be absent
+        result &= not m.contains_key(str(key + 1))
+    print(m.get_size(), m.get_capacity(), result)
+    for key in keys[::2]:
+        m.remove(str(key))
+    print(m.get_size(), m.contains_key('1'), m.contains_key('21'))
+
+    print("\ninsertion order example 1")
+    print("-------------------------")
+    m = HashMap(8, hash_function_1)
+    for word in ("melon", "apple", "peach", "grape", "lemon"):
+        m.put(word, len(word))
+    m.remove("peach")
+    m.put("apple", 50)
+    m.put("peach", 5)
+    print(m.get_keys_and_values())
+    m.resize_table(64)
+    print(m.get_keys_and_values(), m.get_capacity())
+    m.clear()
+    print(m.get_keys_and_values(), m.get_size(), m.get_capacity())
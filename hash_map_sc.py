@@ -2,33 +2,87 @@
 # Description: Optimized HashMap Chaining for collision resolution
 #              implementation with several data manipulation methods
 
-
-from a6_include import (DynamicArray, LinkedList,
+import heapq
+from array import array
+from itertools import islice
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from a6_include import (DynamicArray, LinkedList, hash_array, hash_fingerprint,
+                        read_snapshot, write_snapshot, FIBONACCI_MULTIPLIER, MASK64,
+                        gc_paused, hash_and_index_many, next_power_of_two,
                         hash_function_1, hash_function_2)
+from hash_map_frozen import FrozenHashMap
+
+# old buckets migrated per operation during an incremental resize
+_REHASH_BUCKETS = 4
+
+# values counted per increment_many batch by find_mode and find_top_k
+_COUNT_CHUNK = 4096
 
 
 class HashMap:
     def __init__(self,
                  capacity: int = 11,
-                 function: callable = hash_function_1) -> None:
+                 function: callable = hash_function_1,
+                 capacity_policy: str = "prime",
+                 incremental_resize: bool = False) -> None:
         """
         Initialize new HashMap that uses
         separate chaining for collision resolution
+        capacity_policy "prime" indexes with hash % capacity,
+            "pow2" indexes with a bitmask over the mixed hash
+        incremental_resize spreads automatic resizes across later
+            operations instead of rehashing everything inside one put
         """
+        if capacity_policy not in ("prime", "pow2"):
+            raise ValueError("capacity_policy must be 'prime' or 'pow2'")
+        self._capacity_policy = capacity_policy
         self._buckets = DynamicArray()
 
-        # capacity must be a prime number
-        self._capacity = self._next_prime(capacity)
+        # capacity must be a prime number (or a power of two)
+        if capacity_policy == "pow2":
+            self._capacity = next_power_of_two(capacity)
+        else:
+            self._capacity = self._next_prime(capacity)
+        self._mask = self._index_mask(self._capacity)
         for _ in range(self._capacity):
             self._buckets.append(LinkedList())
 
         self._hash_function = function
         self._size = 0
 
+        # bumped by every insert, removal and resize so iterators
+        #   can tell the map changed under them
+        self._version = 0
+
+        # incremental resize state: old table still being moved to _buckets
+        self._incremental = incremental_resize
+        self._old_buckets = None
+        self._old_capacity = 0
+        self._rehash_index = 0
+        self._fill_index = 0
+
+    @classmethod
+    def with_expected_size(cls, n: int, function: callable = hash_function_1,
+                           **kwargs) -> "HashMap":
+        """
+        Receives the number of entries the map will hold, a hash function
+            and any other constructor options
+        Returns a new HashMap sized so n entries fit under the 1.0
+            load threshold without a resize
+        """
+        return cls(max(n, 1), function, **kwargs)
+
     def __str__(self) -> str:
         """
         Override string method to provide more readable output
         """
+        self._finish_rehash()
         out = ''
         for i in range(self._buckets.length()):
             out += str(i) + ': ' + str(self._buckets[i]) + '\n'
@@ -65,6 +119,46 @@ class HashMap:
 
         return True
 
+    def _round_capacity(self, capacity: int) -> int:
+        """
+        Round a requested capacity up to one allowed by the capacity policy
+        """
+        if self._capacity_policy == "pow2":
+            return next_power_of_two(capacity)
+        if self._is_prime(capacity) is False:
+            return self._next_prime(capacity)
+        return capacity
+
+    def _index_mask(self, capacity: int):
+        """
+        Returns the bitmask used for indexing, or None for prime capacities
+        Also sets the shift that selects the top log2(capacity) hash bits
+        """
+        if self._capacity_policy == "pow2":
+            self._shift = 64 - (capacity.bit_length() - 1)
+            return capacity - 1
+        return None
+
+    def _bucket_index(self, hash: int) -> int:
+        """
+        Receives a hash
+        Returns the index of the bucket for that hash
+        """
+        if self._mask is None:
+            return hash % self._capacity
+        # Fibonacci hashing: the top bits of the product are well mixed
+        return ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+
+    def _old_bucket_index(self, hash: int) -> int:
+        """
+        Receives a hash
+        Returns the index of the bucket for that hash in the old table
+        """
+        if self._mask is None:
+            return hash % self._old_capacity
+        shift = 64 - (self._old_capacity.bit_length() - 1)
+        return ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> shift
+
     def get_size(self) -> int:
         """
         Return size of map
@@ -84,20 +178,110 @@ class HashMap:
         Updates key/value pair in hash map
         Adds key/value pair in hash map if key doesn't exist in hash map
         """
+        # update or insert new element into hashmap
+        node, ll, hash = self._locate(key)
+        if node is not None:
+            node.value = value
+        else:
+            self._insert_at(ll, key, value, hash)
+
+    # ------------------ Single-lookup upserts ------------------------- #
+
+    def _locate(self, key: str) -> tuple:
+        """
+        Receives a key
+        Resizes and migrates as put does, then returns (node for key or
+            None, bucket to insert it in, hash) from a single lookup
+        """
         self.check_resize_needed()
 
         # compute element's bucket index
         hash = self._hash_function(key)
-        index = hash % self._buckets.length()
 
-        # update or insert new element into hashmap
+        # a key not yet migrated is found where it is
+        if self._old_buckets is not None:
+            self._rehash_step()
+            node = self._old_node(key, hash)
+            if node is not None:
+                return node, None, hash
+
+        index = self._bucket_index(hash)
         ll = self._buckets.get_at_index(index)
-        node = ll.contains(key)
+        if ll is None:
+            ll = self._fill_bucket(index)
+        return ll.contains(key, hash), ll, hash
+
+    def _insert_at(self, ll: LinkedList, key: str, value: object, hash: int) -> None:
+        """
+        Receives the bucket _locate returned and a new key, value and hash
+        Adds the new node to that bucket
+        """
+        ll.insert(key, value, hash)
+        self._size += 1
+        self._version += 1
+
+    def setdefault(self, key: str, default: object = None) -> object:
+        """
+        Receives a key and a default value
+        Returns the key's value, first inserting default if not found
+        """
+        node, ll, hash = self._locate(key)
+        if node is not None:
+            return node.value
+        self._insert_at(ll, key, default, hash)
+        return default
+
+    def get_or_insert_with(self, key: str, factory: callable) -> object:
+        """
+        Receives a key and a function of no arguments
+        Returns the key's value, first inserting factory() if not found
+        factory runs between the lookup and the insert; if it changes
+            the map, the key is put again afterwards
+        """
+        node, ll, hash = self._locate(key)
         if node is not None:
+            return node.value
+        version, migrating = self._version, self._old_buckets is not None
+        value = factory()
+        if self._version != version or migrating:
+            self.put(key, value)
+        else:
+            self._insert_at(ll, key, value, hash)
+        return value
+
+    def update(self, key: str, function: callable, default: object = None) -> object:
+        """
+        Receives a key, a function of one argument and a default value
+        Sets the key's value to function(value), applied to default
+            if the key is not found
+        Returns the new value
+        If function changes the map, the key is put again afterwards,
+            since the slot found before it ran may be stale
+        """
+        node, ll, hash = self._locate(key)
+        version, migrating = self._version, self._old_buckets is not None
+        value = function(default if node is None else node.value)
+        if self._version != version or migrating:
+            self.put(key, value)
+        elif node is not None:
             node.value = value
         else:
-            ll.insert(key, value)
-            self._size += 1
+            self._insert_at(ll, key, value, hash)
+        return value
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        """
+        Receives a key and an amount
+        Adds amount to the key's value, inserting the key with value
+            amount if not found, in a single lookup
+        Returns the key's new value
+        """
+        node, ll, hash = self._locate(key)
+        if node is not None:
+            node.value += amount
+            return node.value
+        self._insert_at(ll, key, amount, hash)
+        return amount
 
     def check_resize_needed(self):
         """
@@ -105,7 +289,97 @@ class HashMap:
         Resizes the capacity if needed
         """
         if self.table_load() >= 1:
-            self.resize_table(self._capacity * 2)
+            if self._incremental:
+                self._finish_rehash()
+                self._begin_rehash(self._round_capacity(self._capacity * 2))
+            else:
+                self.resize_table(self._capacity * 2)
+
+    def _begin_rehash(self, new_capacity: int) -> None:
+        """
+        Receives a new capacity for the table
+        Swaps in an unfilled new table and keeps the old one for migration
+        """
+        self._old_buckets = self._buckets
+        self._old_capacity = self._capacity
+        self._rehash_index = 0
+        self._fill_index = 0
+        self._version += 1
+
+        # buckets are created lazily so starting a resize stays cheap
+        self._buckets = DynamicArray([None] * new_capacity)
+        self._capacity = new_capacity
+        self._mask = self._index_mask(new_capacity)
+
+    def _rehash_step(self, buckets: int = _REHASH_BUCKETS) -> None:
+        """
+        Receives a number of old buckets to migrate
+        Moves their nodes into the new table, creates a matching share
+            of the new table's empty buckets, and ends the resize when
+            both are complete
+        """
+        old_table = self._old_buckets
+        stop = min(self._rehash_index + buckets, self._old_capacity)
+        while self._rehash_index < stop:
+            # release each old bucket as it goes so the old table
+            # is never freed in one large burst
+            ll = old_table.get_at_index(self._rehash_index)
+            old_table.set_at_index(self._rehash_index, None)
+            self._rehash_index += 1
+            for node in ll:
+                index = self._bucket_index(node.hash)
+                target = self._buckets.get_at_index(index)
+                if target is None:
+                    target = self._fill_bucket(index)
+                target.insert_node(node)
+
+        # fill enough new buckets per old bucket to finish together
+        per_bucket = -(-self._capacity // self._old_capacity)
+        fill_stop = min(self._fill_index + buckets * per_bucket, self._capacity)
+        for i in range(self._fill_index, fill_stop):
+            if self._buckets.get_at_index(i) is None:
+                self._buckets.set_at_index(i, LinkedList())
+        self._fill_index = fill_stop
+
+        if self._rehash_index == self._old_capacity and fill_stop == self._capacity:
+            self._old_buckets = None
+
+    def _finish_rehash(self) -> None:
+        """
+        Completes any incremental resize in progress
+        """
+        if self._old_buckets is not None:
+            self._rehash_step(self._old_capacity)
+
+    def _fill_bucket(self, index: int) -> LinkedList:
+        """
+        Receives an index of a not yet created bucket in the new table
+        Creates the empty bucket and returns it
+        """
+        ll = LinkedList()
+        self._buckets.set_at_index(index, ll)
+        return ll
+
+    def _old_node(self, key: str, hash: int):
+        """
+        Receives a key and its hash
+        Returns the node for key if it is still in the old table, else None
+        """
+        index = self._old_bucket_index(hash)
+        if index < self._rehash_index:
+            return None
+        return self._old_buckets.get_at_index(index).contains(key, hash)
+
+    def _resize_target(self, new_capacity: int) -> int:
+        """
+        Receives a requested capacity of at least 1
+        Returns the capacity resize_table rebuilds to: rounded up, then
+            grown the way repeated puts would have until the entries fit
+        """
+        new_capacity = self._round_capacity(new_capacity)
+        while new_capacity <= self._size - 1:
+            new_capacity = self._round_capacity(new_capacity * 2)
+        return new_capacity
 
     def resize_table(self, new_capacity: int) -> None:
         """
@@ -115,27 +389,47 @@ class HashMap:
         """
         # validate new capacity parameter
         if new_capacity >= 1:
-            if self._is_prime(new_capacity) is False:
-                new_capacity = self._next_prime(new_capacity)
+            self._finish_rehash()
+            new_capacity = self._resize_target(new_capacity)
 
             # initiate a new DA with empty Linked Lists
-            new_table = DynamicArray()
-            for i in range(new_capacity):
-                new_table.append(LinkedList())
+            with gc_paused():
+                new_table = DynamicArray([LinkedList() for _ in range(new_capacity)])
 
             # hold old table for now to move values over
             # update pointers
             old_table = self._buckets
             self._buckets = new_table
             self._capacity = new_capacity
-            self._size = 0
+            self._mask = self._index_mask(new_capacity)
+            self._version += 1
 
-            # rehash table links
+            # relink every node straight into its new bucket by its cached
+            # hash (the list iterator steps past a node before it is relinked)
             for i in range(old_table.length()):
                 ll = old_table.get_at_index(i)
                 if ll.length() != 0:
                     for node in ll:
-                        self.put(node.key, node.value)
+                        index = self._bucket_index(node.hash)
+                        new_table.get_at_index(index).insert_node(node)
+
+    def reserve(self, n: int) -> None:
+        """
+        Receives the number of entries the map will hold
+        Grows the table once, if needed, so n entries fit under the
+            1.0 load threshold without a further resize
+        """
+        if self._capacity < n:
+            self.resize_table(n)
+
+    def shrink_to_fit(self) -> None:
+        """
+        Resizes the table down to the smallest capacity that holds
+            the current entries under the 1.0 load threshold
+        """
+        new_capacity = self._round_capacity(max(self._size, 1))
+        if new_capacity < self._capacity:
+            self.resize_table(new_capacity)
 
     def table_load(self) -> float:
         """
@@ -149,6 +443,7 @@ class HashMap:
         """
         Returns the number of empty buckets in the hash table
         """
+        self._finish_rehash()
         count = 0
         for i in range(self._capacity):
             ll = self._buckets.get_at_index(i)
@@ -164,11 +459,21 @@ class HashMap:
         """
         # compute element's bucket index
         hash = self._hash_function(key)
-        index = hash % self._buckets.length()
+
+        # during a resize the key may still be in the old table
+        if self._old_buckets is not None:
+            self._rehash_step()
+            node = self._old_node(key, hash)
+            if node is not None:
+                return node.value
+
+        index = self._bucket_index(hash)
 
         # retrieve node from bucket
         ll = self._buckets.get_at_index(index)
-        node = ll.contains(key)
+        if ll is None:
+            return None
+        node = ll.contains(key, hash)
         if node is not None:
             return node.value
         else:
@@ -190,15 +495,183 @@ class HashMap:
         """
         # compute element's bucket index
         hash = self._hash_function(key)
-        index = hash % self._buckets.length()
+
+        # during a resize the key may still be in the old table
+        if self._old_buckets is not None:
+            self._rehash_step()
+            index = self._old_bucket_index(hash)
+            if index >= self._rehash_index:
+                if self._old_buckets.get_at_index(index).remove(key, hash):
+                    self._size -= 1
+                    self._version += 1
+                    return
+
+        index = self._bucket_index(hash)
 
         # retrieve node from bucket
         ll = self._buckets.get_at_index(index)
-        node = ll.contains(key)
+        if ll is None:
+            return
 
-        if node is not None:
-            ll.remove(key)
+        if ll.remove(key, hash):
             self._size -= 1
+            self._version += 1
+
+    # ------------------ Batch operations ------------------------------ #
+
+    def _hash_indices(self, keys: list) -> tuple:
+        """
+        Receives a list of keys
+        Returns (hashes, bucket indices) of the keys, computed in one pass
+        """
+        if self._mask is None:
+            return hash_and_index_many(self._hash_function, keys, self._capacity)
+        return hash_and_index_many(self._hash_function, keys, self._capacity, self._shift)
+
+    def _presize(self, count: int) -> None:
+        """
+        Receives a number of keys about to be added
+        Resizes once, if needed, to the capacity repeated puts would
+            have doubled to, so all of them fit without another resize
+        """
+        new_capacity = self._capacity
+        while new_capacity < self._size + count:
+            new_capacity = self._round_capacity(new_capacity * 2)
+        if new_capacity != self._capacity:
+            self.resize_table(new_capacity)
+
+    def put_many(self, pairs) -> None:
+        """
+        Receives an iterable of (key, value) pairs
+        Puts every pair, sizing the table once for the whole batch
+            instead of checking the load factor on every put
+        """
+        pairs = list(pairs)
+        self._presize(len(pairs))
+
+        # a resize still migrating keeps the single-op path
+        if self._old_buckets is not None:
+            for key, value in pairs:
+                self.put(key, value)
+            return
+
+        hashes, indices = self._hash_indices([pair[0] for pair in pairs])
+        bucket_at = self._buckets.get_at_index
+        with gc_paused():
+            for (key, value), hash, index in zip(pairs, hashes, indices):
+                ll = bucket_at(index)
+                node = ll.contains(key, hash)
+                if node is not None:
+                    node.value = value
+                else:
+                    ll.insert(key, value, hash)
+                    self._size += 1
+        self._version += 1
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns a list of the value of each key, None where not found
+        """
+        keys = list(keys)
+        if self._old_buckets is not None:
+            return [self.get(key) for key in keys]
+
+        hashes, indices = self._hash_indices(keys)
+        bucket_at = self._buckets.get_at_index
+        values = []
+        for key, hash, index in zip(keys, hashes, indices):
+            node = bucket_at(index).contains(key, hash)
+            values.append(node.value if node is not None else None)
+        return values
+
+    def remove_many(self, keys) -> None:
+        """
+        Receives an iterable of keys
+        Removes every key found in the hash map
+        """
+        keys = list(keys)
+        if self._old_buckets is not None:
+            for key in keys:
+                self.remove(key)
+            return
+
+        hashes, indices = self._hash_indices(keys)
+        bucket_at = self._buckets.get_at_index
+        for key, hash, index in zip(keys, hashes, indices):
+            if bucket_at(index).remove(key, hash):
+                self._size -= 1
+        self._version += 1
+
+    def increment_many(self, keys, amount: int = 1) -> None:
+        """
+        Receives an iterable of keys and an amount
+        Increments every key by amount as increment does, sizing the
+            table once for the batch
+        """
+        keys = list(keys)
+        self._presize(len(keys))
+        if self._old_buckets is not None:
+            for key in keys:
+                self.increment(key, amount)
+            return
+
+        hashes, indices = self._hash_indices(keys)
+        bucket_at = self._buckets.get_at_index
+        with gc_paused():
+            for key, hash, index in zip(keys, hashes, indices):
+                ll = bucket_at(index)
+                node = ll.contains(key, hash)
+                if node is not None:
+                    node.value += amount
+                else:
+                    ll.insert(key, amount, hash)
+                    self._size += 1
+        self._version += 1
+
+    # ------------------ Iteration ------------------------------------- #
+
+    def _nodes(self):
+        """
+        Generator over the node of every entry, in bucket order,
+            holding its own position so iterations can nest
+        Raises RuntimeError once the map has an entry inserted or
+            removed, or is resized, during the iteration
+        """
+        self._finish_rehash()
+        version = self._version
+        buckets = self._buckets
+        for i in range(self._capacity):
+            for node in buckets.get_at_index(i):
+                yield node
+                if self._version != version:
+                    raise RuntimeError("HashMap changed during iteration")
+
+    def __iter__(self):
+        """
+        Returns a generator over the node of every entry,
+            with the key and value of each
+        """
+        return self._nodes()
+
+    def keys(self):
+        """
+        Returns a generator over every key, in bucket order
+        """
+        return (node.key for node in self._nodes())
+
+    def values(self):
+        """
+        Returns a generator over every value, in bucket order
+        """
+        return (node.value for node in self._nodes())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in the same
+            order as get_keys_and_values but without copying them out
+        """
+        return ((node.key, node.value) for node in self._nodes())
 
     def get_keys_and_values(self) -> DynamicArray:
         """
@@ -207,6 +680,7 @@ class HashMap:
         """
         # create new da, iterate through old da to get all key/values
         # append each key/value tuple to new da
+        self._finish_rehash()
         arr = DynamicArray()
         for i in range(self._buckets.length()):
             ll = self._buckets.get_at_index(i)
@@ -214,41 +688,139 @@ class HashMap:
                 arr.append((node.key, node.value))
         return arr
 
+    def freeze(self) -> FrozenHashMap:
+        """
+        Returns an immutable FrozenHashMap holding the current key/value
+            pairs, indexed by a minimal perfect hash so each get reads
+            one slot; later changes to this map do not reach it
+        """
+        return FrozenHashMap(self.items())
+
     def clear(self) -> None:
         """
         Clears the contents of the hash map
         Capacity remains unchanged
         """
-        arr = DynamicArray()
-        for i in range(self._capacity):
-            arr.append(LinkedList())
-        self._buckets = arr
+        with gc_paused():
+            self._buckets = DynamicArray([LinkedList() for _ in range(self._capacity)])
+        self._old_buckets = None
         self._size = 0
+        self._version += 1
 
+    # ------------------ Snapshots ------------------------------------- #
 
-def find_mode(da: DynamicArray) -> tuple[DynamicArray, int]:
+    def dump(self, path: str) -> None:
+        """
+        Receives a file path
+        Writes a binary snapshot of the table layout: the length of every
+            bucket, then the cached hash, key and value of every node in
+            bucket order, so load can relink the chains without rehashing
+        """
+        self._finish_rehash()
+        lengths = array('I')
+        hashes, keys, values = [], [], []
+        for i in range(self._capacity):
+            ll = self._buckets.get_at_index(i)
+            lengths.append(ll.length())
+            for node in ll:
+                hashes.append(node.hash)
+                keys.append(node.key)
+                values.append(node.value)
+
+        options = {'capacity': self._capacity,
+                   'capacity_policy': self._capacity_policy,
+                   'incremental_resize': self._incremental}
+        write_snapshot(path, b'sc', hash_fingerprint(self._hash_function),
+                       [lengths, hash_array(hashes)], (options, keys, values))
+
+    @classmethod
+    def load(cls, path: str, function: callable = hash_function_1) -> "HashMap":
+        """
+        Receives the path of a snapshot written by dump and the hash
+            function the map was built with
+        Returns a new map with the same capacity and bucket layout,
+            its nodes relinked from the cached hashes without rehashing
+        Raises ValueError if function is not the one the map used
+        """
+        (lengths, hashes), (options, keys, values) = read_snapshot(
+            path, b'sc', hash_fingerprint(function))
+        m = cls(1, function, options['capacity_policy'], options['incremental_resize'])
+
+        # nodes go in at the head, so each chain is filled back to front
+        buckets = []
+        end = 0
+        with gc_paused():
+            for length in lengths:
+                ll = LinkedList()
+                start, end = end, end + length
+                for j in range(end - 1, start - 1, -1):
+                    ll.insert(keys[j], values[j], hashes[j])
+                buckets.append(ll)
+
+        m._buckets = DynamicArray(buckets)
+        m._capacity = options['capacity']
+        m._mask = m._index_mask(m._capacity)
+        m._size = len(keys)
+        return m
+
+
+def _iter_values(values):
+    """
+    Receives a Dynamic Array or any other iterable
+    Returns an iterator over its values
     """
-    Receives a Dynamic Array
+    if isinstance(values, DynamicArray):
+        return (values.get_at_index(i) for i in range(values.length()))
+    return iter(values)
+
+
+def _is_numeric_array(values) -> bool:
+    """
+    Receives any iterable
+    Returns True if it is a NumPy array of booleans or numbers
+    """
+    return np is not None and isinstance(values, np.ndarray) and values.dtype.kind in 'biuf'
+
+
+def _count(values, function: callable) -> HashMap:
+    """
+    Receives an iterable of values and a hash function
+    Returns a HashMap of value -> frequency, filled one chunk at a time
+        so generators are consumed without being materialized
+    """
+    map = HashMap(function=function)
+    iterator = _iter_values(values)
+    chunk = list(islice(iterator, _COUNT_CHUNK))
+    while chunk:
+        map.increment_many(chunk)
+        chunk = list(islice(iterator, _COUNT_CHUNK))
+    return map
+
+
+def find_mode(da: DynamicArray, function: callable = hash_function_1) -> tuple[DynamicArray, int]:
+    """
+    Receives a Dynamic Array, or any iterable or generator of values,
+        and optionally the hash function used to count them
     Calculates the mode of the values in the Dynamic Array
     Returns a tuple of a new Dynamic Array
         with the modes, and the mode frequency
+    Numeric NumPy arrays are counted with np.unique instead,
+        returning their modes in ascending order
     """
     freq_high = 0  # initiate current running highest frequency
     mode_arr = DynamicArray()  # initiate current running array of mode values
 
-    # create a hash map of the dynamic array
-    map = HashMap()
-    for i in range(da.length()):
-        key = da.get_at_index(i)
-        if map.contains_key(key):
-            map.put(key, map.get(key) + 1)
-        else:
-            map.put(key, 1)
-
-    # iterate through hash map to find highest frequency of values
-    keys_values = map.get_keys_and_values()
-    for i in range(keys_values.length()):
-        key, freq = keys_values.get_at_index(i)
+    if _is_numeric_array(da):
+        uniques, counts = np.unique(da, return_counts=True)
+        if counts.size > 0:
+            freq_high = int(counts.max())
+            for value in uniques[counts == freq_high].tolist():
+                mode_arr.append(value)
+        return mode_arr, freq_high
+
+    # count every value with one lookup each, then walk the map in place
+    map = _count(da, function)
+    for key, freq in map.items():
         if freq > freq_high:
             freq_high = freq
             mode_arr = DynamicArray()
@@ -259,6 +831,29 @@ def find_mode(da: DynamicArray) -> tuple[DynamicArray, int]:
     return mode_arr, freq_high
 
 
+def find_top_k(da: DynamicArray, k: int,
+               function: callable = hash_function_1) -> tuple[DynamicArray, int]:
+    """
+    Receives a Dynamic Array, or any iterable or generator of values,
+        a number k and optionally the hash function used to count them
+    Returns a tuple of a new Dynamic Array with the (value, frequency)
+        pairs of the k most frequent values, most frequent first,
+        and the lowest frequency among them
+    Picks the k pairs with a bounded heap; numeric NumPy arrays are
+        counted with np.unique
+    """
+    if _is_numeric_array(da):
+        uniques, counts = np.unique(da, return_counts=True)
+        pairs = zip(uniques.tolist(), counts.tolist())
+    else:
+        pairs = _count(da, function).items()
+
+    top = heapq.nlargest(k, pairs, key=itemgetter(1))
+    top_arr = DynamicArray()
+    for pair in top:
+        top_arr.append(pair)
+    return top_arr, (top[-1][1] if top else 0)
+
 
 # ------------------- BASIC TESTING ---------------------------------------- #
 
@@ -461,5 +1056,39 @@ if __name__ == "__main__":
         mode, frequency = find_mode(da)
         print(f"Input: {da}\nMode : {mode}, Frequency: {frequency}\n")
 
+    print("\nfind_top_k example 1")
+    print("--------------------")
+    words = (word for word in "the cat and the dog and the bird".split())
+    top, frequency = find_top_k(words, 2)
+    print(f"Top 2: {top}, Frequency: {frequency}")
 
-
+    print("\nincrement example 1")
+    print("-------------------")
+    m = HashMap(7, hash_function_1)
+    print(m.increment('count'), m.increment('count', 5), m.get('count'))
+
+    print("\nkeys / values / items example 1")
+    print("-------------------------------")
+    m = HashMap(7, hash_function_1)
+    for word in ("melon", "apple", "peach"):
+        m.put(word, len(word))
+    print(list(m.keys()), list(m.values()), list(m.items()))
+    try:
+        for key in m.keys():
+            m.put(key + "s", 0)
+    except RuntimeError as error:
+        print(error)
+
+    print("\ndump / load example 1")
+    print("---------------------")
+    import os
+    import tempfile
+    m = HashMap(7, hash_function_1)
+    for word in ("melon", "apple", "peach", "grape"):
+        m.put(word, len(word))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'snapshot')
+        m.dump(path)
+        loaded = HashMap.load(path, hash_function_1)
+    print(loaded.get_size(), loaded.get_capacity(), loaded.get('grape'))
+    print(list(loaded.items()) == list(m.items()))
@@ -0,0 +1,513 @@
+# Name: Kent Tolzmann
+# Description: HashMap split into shards by hash, each a packed open
+#              addressing table in shared memory, with batches built,
+#              updated and queried by a pool of worker processes
+
+import os
+import pickle
+from multiprocessing import get_context, shared_memory
+
+from a6_include import (DynamicArray, MASK64, fnv1a_hash, hash_fingerprint,
+                        next_power_of_two)
+from packed_table import (PackedTable, attach_shared_memory, encode_key, encode_record,
+                          packed_table_size)
+
+# smallest slot table and record arena of a shard
+_MIN_CAPACITY = 8
+_MIN_DATA = 4096
+
+# batches smaller than this are run in the calling process
+_PARALLEL_MIN = 4096
+
+
+class _Shard(PackedTable):
+    """
+    One shard: a PackedTable in its own shared memory segment, which any
+        process can attach by name
+    """
+
+    def __init__(self, name: str = None,
+                 capacity: int = _MIN_CAPACITY,
+                 data_capacity: int = _MIN_DATA,
+                 fingerprint: int = 0) -> None:
+        """
+        Initialize a new empty shard of the given slot capacity (a power
+            of two) and arena bytes, or attach the shard named name
+        """
+        if name is None:
+            capacity = next_power_of_two(max(capacity, _MIN_CAPACITY))
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=packed_table_size(capacity, data_capacity))
+            PackedTable.create(self._shm.buf, capacity, data_capacity, fingerprint).release()
+        else:
+            self._shm = attach_shared_memory(name)
+        self.name = self._shm.name
+        try:
+            super().__init__(self._shm.buf)
+        except ValueError:
+            self._shm.close()
+            raise ValueError(self.name + " is not a hash_map_sharded shard") from None
+
+    def grown(self, entries: int, record_bytes: int) -> "_Shard":
+        """
+        Receives a number of new entries and their encoded bytes
+        Returns a new shard holding this one's live records, compacted,
+            with room for them: the capacity doubled the way repeated
+            puts would have and the arena twice the bytes needed
+        """
+        capacity = self.capacity
+        while 2 * (self.size + entries) >= capacity:
+            capacity *= 2
+        shard = _Shard(capacity=capacity,
+                       data_capacity=max(_MIN_DATA, 2 * (self.live_bytes() + record_bytes)),
+                       fingerprint=self.fingerprint)
+        self.copy_into(shard)
+        return shard
+
+    def close(self) -> None:
+        """
+        Detaches this process from the shard, which stays in place
+        """
+        if self._shm is not None:
+            self.release()
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self) -> None:
+        """
+        Detaches and frees the shard's segment
+        """
+        self._shm.unlink()
+        self.close()
+
+
+# ------------------ Work done in workers or inline ------------------------ #
+
+def _put_into(shard: _Shard, keys: list, hashes: list, values: list) -> _Shard:
+    """
+    Receives a shard, and keys of that shard with their hashes and values
+    Puts every pair, growing the shard into a new segment first if they
+        do not fit in place
+    Returns the shard now holding them, the given one or its successor
+    """
+    records = []
+    record_bytes = 0
+    for key, value in zip(keys, values):
+        key_bytes = encode_key(key)
+        record = encode_record(key_bytes, value)
+        records.append((key_bytes, record))
+        record_bytes += len(record)
+
+    if not shard.fits(len(records), record_bytes):
+        shard = shard.grown(len(records), record_bytes)
+    for (key_bytes, record), hash in zip(records, hashes):
+        shard.insert(key_bytes, hash, record)
+    shard.write_header()
+    return shard
+
+
+def _remove_from(shard: _Shard, keys: list, hashes: list) -> None:
+    """
+    Receives a shard, and keys of that shard with their hashes
+    Removes every key found
+    """
+    for key, hash in zip(keys, hashes):
+        shard.remove(encode_key(key), hash)
+    shard.write_header()
+
+
+def _lookup(shards: list, function: callable, keys: list) -> list:
+    """
+    Receives every shard, the hash function and a list of keys
+    Returns the list of values of the keys, None for keys not found
+    """
+    values = []
+    count = len(shards)
+    for key in keys:
+        hash = function(key) & MASK64
+        value_bytes = shards[hash % count].find(encode_key(key), hash)
+        values.append(None if value_bytes is None else pickle.loads(value_bytes))
+    return values
+
+
+# per worker process: the hash function, and the shards attached by name
+_worker_function = None
+_worker_shards = {}
+
+
+def _init_worker(function: callable) -> None:
+    """
+    Receives the map's hash function
+    Sets up a new worker process
+    """
+    global _worker_function
+    _worker_function = function
+
+
+def _attach(name: str) -> _Shard:
+    """
+    Receives a shard name
+    Returns the shard attached in this worker and refreshed
+    """
+    shard = _worker_shards.get(name)
+    if shard is None:
+        shard = _worker_shards[name] = _Shard(name)
+    else:
+        shard.refresh()
+    return shard
+
+
+def _attach_all(names: list) -> list:
+    """
+    Receives the names of the current shards
+    Returns them attached and refreshed, detaching from shards since
+        replaced
+    """
+    for name in list(_worker_shards):
+        if name not in names:
+            _worker_shards.pop(name).close()
+    return [_attach(name) for name in names]
+
+
+def _hash_task(keys: list) -> list:
+    """
+    Receives a chunk of keys
+    Returns their hashes, reduced to 64 bits
+    """
+    return [_worker_function(key) & MASK64 for key in keys]
+
+
+def _put_task(name: str, keys: list, hashes: list, values: list) -> str:
+    """
+    Receives a shard name, and keys of that shard with their hashes and
+        values
+    Puts every pair into the shard
+    Returns the name of the shard now holding them
+    """
+    shard = _put_into(_attach(name), keys, hashes, values)
+    if shard.name != name:
+        _worker_shards.pop(name).close()
+        _worker_shards[shard.name] = shard
+    return shard.name
+
+
+def _remove_task(name: str, keys: list, hashes: list) -> None:
+    """
+    Receives a shard name, and keys of that shard with their hashes
+    Removes every key found from the shard
+    """
+    _remove_from(_attach(name), keys, hashes)
+
+
+def _get_task(names: list, keys: list) -> list:
+    """
+    Receives the names of every shard and a chunk of keys
+    Returns the list of values of the keys, None for keys not found
+    """
+    return _lookup(_attach_all(names), _worker_function, keys)
+
+
+class ShardedHashMap:
+    def __init__(self, shards: int = 8,
+                 processes: int = None,
+                 function: callable = fnv1a_hash) -> None:
+        """
+        Initialize an empty HashMap of string keys split into shards by
+            hash, each a packed open addressing table (slots as in
+            hash_map_mmap) in its own shared memory segment
+        Batches go to a pool of processes (os.cpu_count() if None):
+            put_many and remove_many send each shard's keys to one worker,
+            which updates that shard in place, and get_many sends each
+            worker a chunk of keys to look up in whichever shards they
+            fall, reading the segments directly with no copy
+        function must be a picklable, deterministic hash, the same in
+            every process; values are pickled into the shards
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self._hash_function = function
+        self._fingerprint = hash_fingerprint(function)
+        self._shards = [_Shard(fingerprint=self._fingerprint) for _ in range(shards)]
+        self._processes = processes or os.cpu_count() or 1
+        self._pool = get_context().Pool(self._processes, _init_worker, (function,))
+
+    def __enter__(self) -> "ShardedHashMap":
+        """
+        Returns the map for use in a with block
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Closes the map at the end of a with block
+        """
+        self.close()
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for i, shard in enumerate(self._shards):
+            out += str(i) + ': ' + str(shard.size) + ' / ' + str(shard.capacity) + '\n'
+        return out
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return sum(shard.size for shard in self._shards)
+
+    def get_capacity(self) -> int:
+        """
+        Return the slots of every shard together
+        """
+        return sum(shard.capacity for shard in self._shards)
+
+    def get_shard_count(self) -> int:
+        """
+        Return number of shards
+        """
+        return len(self._shards)
+
+    def table_load(self) -> float:
+        """
+        Returns the load factor across every shard
+        """
+        return self.get_size() / self.get_capacity()
+
+    # ------------------------------------------------------------------ #
+
+    def _hash(self, key: str) -> int:
+        """
+        Receives a key
+        Returns the key's hash reduced to the unsigned 64 bits stored per slot
+        """
+        return self._hash_function(key) & MASK64
+
+    def _chunks(self, items: list) -> list:
+        """
+        Receives a list
+        Returns it split into one contiguous chunk per process
+        """
+        size = -(-len(items) // self._processes)
+        return [items[start:start + size] for start in range(0, len(items), size)]
+
+    def _hash_many(self, keys: list) -> list:
+        """
+        Receives a list of keys
+        Returns their hashes, computed across the pool for large batches
+        """
+        if len(keys) < _PARALLEL_MIN:
+            return [self._hash(key) for key in keys]
+        hashes = []
+        for chunk in self._pool.map(_hash_task, self._chunks(keys)):
+            hashes += chunk
+        return hashes
+
+    def _group(self, keys: list, hashes: list, values: list = None) -> list:
+        """
+        Receives keys with their hashes and, optionally, values
+        Returns, per shard, the (keys, hashes, values) that fall in it
+        """
+        count = len(self._shards)
+        groups = [([], [], []) for _ in range(count)]
+        if values is None:
+            for key, hash in zip(keys, hashes):
+                group = groups[hash % count]
+                group[0].append(key)
+                group[1].append(hash)
+        else:
+            for key, hash, value in zip(keys, hashes, values):
+                group = groups[hash % count]
+                group[0].append(key)
+                group[1].append(hash)
+                group[2].append(value)
+        return groups
+
+    def _replace(self, index: int, shard: _Shard) -> None:
+        """
+        Receives a shard index and the shard now holding its entries
+        Frees the old segment if the shard was grown into a new one
+        """
+        old = self._shards[index]
+        if shard is not old:
+            old.unlink()
+            self._shards[index] = shard
+
+    def put_many(self, pairs) -> None:
+        """
+        Receives an iterable of (key, value) pairs
+        Puts every pair, with each shard's share built by one worker
+        """
+        pairs = list(pairs)
+        keys = [key for key, value in pairs]
+        values = [value for key, value in pairs]
+        groups = self._group(keys, self._hash_many(keys), values)
+
+        if len(pairs) < _PARALLEL_MIN:
+            for i, group in enumerate(groups):
+                if group[0]:
+                    self._replace(i, _put_into(self._shards[i], *group))
+            return
+
+        tasks = [(i, (self._shards[i].name,) + group)
+                 for i, group in enumerate(groups) if group[0]]
+        names = self._pool.starmap(_put_task, [task for i, task in tasks])
+        for (i, task), name in zip(tasks, names):
+            if name == self._shards[i].name:
+                self._shards[i].refresh()
+            else:
+                self._replace(i, _Shard(name))
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns the list of their values, None for keys not found,
+            looked up in parallel chunks
+        """
+        keys = list(keys)
+        if len(keys) < _PARALLEL_MIN:
+            return _lookup(self._shards, self._hash_function, keys)
+        names = [shard.name for shard in self._shards]
+        values = []
+        for chunk in self._pool.starmap(_get_task, [(names, chunk) for chunk in self._chunks(keys)]):
+            values += chunk
+        return values
+
+    def remove_many(self, keys) -> None:
+        """
+        Receives an iterable of keys
+        Removes every key found, with each shard's share removed by one
+            worker; slots become tombstones until the shard is grown
+        """
+        keys = list(keys)
+        groups = self._group(keys, self._hash_many(keys))
+        if len(keys) < _PARALLEL_MIN:
+            for i, group in enumerate(groups):
+                if group[0]:
+                    _remove_from(self._shards[i], group[0], group[1])
+            return
+
+        tasks = [(self._shards[i].name, group[0], group[1])
+                 for i, group in enumerate(groups) if group[0]]
+        self._pool.starmap(_remove_task, tasks)
+        for shard in self._shards:
+            shard.refresh()
+
+    # ------------------------------------------------------------------ #
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        """
+        self.put_many([(key, value)])
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        hash = self._hash(key)
+        value_bytes = self._shards[hash % len(self._shards)].find(encode_key(key), hash)
+        return None if value_bytes is None else pickle.loads(value_bytes)
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        hash = self._hash(key)
+        return self._shards[hash % len(self._shards)].find(encode_key(key), hash) is not None
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        """
+        self.remove_many([key])
+
+    def keys(self):
+        """
+        Returns a generator over every key, shard by shard
+        """
+        for shard in self._shards:
+            for key_bytes, value_bytes in shard.records():
+                yield str(key_bytes, 'utf-8', 'surrogatepass')
+
+    def values(self):
+        """
+        Returns a generator over every value, shard by shard
+        """
+        for shard in self._shards:
+            for key_bytes, value_bytes in shard.records():
+                yield pickle.loads(value_bytes)
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, shard by shard
+        """
+        for shard in self._shards:
+            for key_bytes, value_bytes in shard.records():
+                yield str(key_bytes, 'utf-8', 'surrogatepass'), pickle.loads(value_bytes)
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        for pair in self.items():
+            arr.append(pair)
+        return arr
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map, replacing every shard with
+            a new empty one
+        """
+        for i in range(len(self._shards)):
+            self._replace(i, _Shard(fingerprint=self._fingerprint))
+
+    def close(self) -> None:
+        """
+        Stops the worker processes and frees every shard
+        The map cannot be used afterwards
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            for shard in self._shards:
+                shard.unlink()
+            self._shards = []
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    print("\nput_many / get_many example 1")
+    print("-----------------------------")
+    with ShardedHashMap(shards=4, processes=2) as m:
+        m.put_many(('key' + str(i), i) for i in range(20000))
+        values = m.get_many('key' + str(i) for i in range(0, 40000, 2))
+        print(m.get_size(), values[:3], values[-3:], values.count(None))
+        print(m.get('key123'), m.contains_key('key20000'), round(m.table_load(), 2))
+
+        print("\nupdate / remove example 1")
+        print("-------------------------")
+        m.put_many(('key' + str(i), [i]) for i in range(0, 20000, 4))
+        m.remove_many('key' + str(i) for i in range(1, 20000, 2))
+        m.put('extra', {'a': 1})
+        print(m.get_size(), m.get('key4'), m.get('key6'), m.get('key7'), m.get('extra'))
+        print(sum(1 for _ in m.items()) == m.get_size(), sorted(m.keys())[:3])
+
+        print("\nclear example 1")
+        print("---------------")
+        m.clear()
+        m.put('only', 1)
+        print(m.get_size(), list(m.items()), m.get_shard_count())
@@ -0,0 +1,309 @@
+# Name: Kent Tolzmann
+# Description: Read-only HashMap packed once into shared memory or a file,
+#              which any number of processes attach and read in place,
+#              without building or copying their own table
+
+import mmap
+import os
+import pickle
+from multiprocessing import shared_memory
+
+from a6_include import (DynamicArray, MASK64, fnv1a_hash, hash_fingerprint,
+                        next_power_of_two)
+from packed_table import (PackedTable, attach_shared_memory, encode_key, encode_record,
+                          packed_table_size)
+
+# smallest slot table
+_MIN_CAPACITY = 8
+
+
+def _pack(table: PackedTable, records: list) -> None:
+    """
+    Receives an empty table with room for them and a list of
+        (key bytes, hash, record)
+    Inserts every record, a later one replacing an earlier equal key
+    """
+    for key_bytes, hash, record in records:
+        table.insert(key_bytes, hash, record)
+    table.write_header()
+    table.release()
+
+
+class SharedHashMap:
+    def __init__(self, name: str = None, path: str = None,
+                 function: callable = fnv1a_hash) -> None:
+        """
+        Initialize a read-only view of the map that build packed into
+            the shared memory segment name, or into the file at path
+        Nothing is copied or rebuilt: lookups read the segment, or the
+            file's pages shared through the page cache, in place, and
+            only the values looked up are unpickled
+        function must be the hash the map was built with; values are
+            pickled, so only attach maps you trust
+        """
+        if (name is None) == (path is None):
+            raise ValueError("give exactly one of name and path")
+        self._shm = None
+        self._mm = None
+        self._owned = None
+        if name is not None:
+            self._shm = attach_shared_memory(name)
+            buffer = self._shm.buf
+        else:
+            with open(path, 'rb') as file:
+                self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self._mm
+
+        try:
+            self._table = PackedTable(buffer)
+        except ValueError:
+            self.close()
+            raise ValueError((name or path) + " is not a hash_map_shared map") from None
+        self._hash_function = function
+        if self._table.fingerprint != hash_fingerprint(function):
+            self.close()
+            raise ValueError("hash function differs from the one " + (name or path) +
+                             " was built with")
+
+    @classmethod
+    def build(cls, source, name: str = None, path: str = None,
+              function: callable = fnv1a_hash) -> "SharedHashMap":
+        """
+        Receives a map or dict (anything with items()) or an iterable of
+            (key, value) pairs with string keys, and where to put it: a
+            shared memory segment named name (a new unique name if
+            neither is given) or a file at path
+        Returns the map packed there, sized exactly: a power-of-two slot
+            table under the 0.5 load threshold and an arena of records
+        A segment belongs to the returned map until its unlink; other
+            processes attach it by get_name() and only close it
+        """
+        if name is not None and path is not None:
+            raise ValueError("give at most one of name and path")
+        pairs = source.items() if hasattr(source, 'items') else source
+        records = []
+        record_bytes = 0
+        for key, value in pairs:
+            key_bytes = encode_key(key)
+            record = encode_record(key_bytes, value)
+            records.append((key_bytes, function(key) & MASK64, record))
+            record_bytes += len(record)
+
+        capacity = next_power_of_two(max(2 * len(records) + 1, _MIN_CAPACITY))
+        size = packed_table_size(capacity, record_bytes)
+        fingerprint = hash_fingerprint(function)
+
+        if path is not None:
+            # built beside the target and renamed over it once complete
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w+b') as file:
+                file.truncate(size)
+                with mmap.mmap(file.fileno(), size) as mm:
+                    _pack(PackedTable.create(mm, capacity, record_bytes, fingerprint), records)
+                    mm.flush()
+            os.replace(temp_path, path)
+            return cls(path=path, function=function)
+
+        shm = shared_memory.SharedMemory(name, create=True, size=size)
+        try:
+            _pack(PackedTable.create(shm.buf, capacity, record_bytes, fingerprint), records)
+            m = cls(name=shm.name, function=function)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        m._owned = shm
+        return m
+
+    def __del__(self) -> None:
+        """
+        Closes the map if it is dropped open, releasing the table's
+            views before the segment they point into
+        """
+        self.close()
+
+    def __enter__(self) -> "SharedHashMap":
+        """
+        Returns the map for use in a with block
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Closes the map at the end of a with block; a segment it owns
+            is freed too
+        """
+        if self._owned is not None:
+            self.unlink()
+        else:
+            self.close()
+
+    def __str__(self) -> str:
+        """
+        Override string method to provide more readable output
+        """
+        out = ''
+        for key, value in self.items():
+            out += str(key) + ': ' + str(value) + '\n'
+        return out
+
+    def get_name(self) -> str:
+        """
+        Return the name of the shared memory segment, or None for a file
+        """
+        return None if self._shm is None else self._shm.name
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._table.size
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._table.capacity
+
+    def table_load(self) -> float:
+        """
+        Returns the current hash table load factor
+        """
+        return self._table.size / self._table.capacity
+
+    # ------------------------------------------------------------------ #
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        value_bytes = self._table.find(encode_key(key), self._hash_function(key) & MASK64)
+        return None if value_bytes is None else pickle.loads(value_bytes)
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        return self._table.find(encode_key(key), self._hash_function(key) & MASK64) is not None
+
+    def get_many(self, keys) -> list:
+        """
+        Receives an iterable of keys
+        Returns the list of their values, None for keys not found
+        """
+        find, function = self._table.find, self._hash_function
+        values = []
+        for key in keys:
+            value_bytes = find(encode_key(key), function(key) & MASK64)
+            values.append(None if value_bytes is None else pickle.loads(value_bytes))
+        return values
+
+    def keys(self):
+        """
+        Returns a generator over every key, in table order
+        """
+        return (str(key_bytes, 'utf-8', 'surrogatepass')
+                for key_bytes, value_bytes in self._table.records())
+
+    def values(self):
+        """
+        Returns a generator over every value, in table order
+        """
+        return (pickle.loads(value_bytes) for key_bytes, value_bytes in self._table.records())
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair, in table order
+        """
+        return ((str(key_bytes, 'utf-8', 'surrogatepass'), pickle.loads(value_bytes))
+                for key_bytes, value_bytes in self._table.records())
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        arr = DynamicArray()
+        for pair in self.items():
+            arr.append(pair)
+        return arr
+
+    # ------------------------------------------------------------------ #
+
+    def close(self) -> None:
+        """
+        Detaches this process from the map, which stays in place
+        The map cannot be used afterwards
+        """
+        table = getattr(self, '_table', None)
+        if table is not None:
+            table.release()
+            self._table = None
+        if getattr(self, '_shm', None) is not None:
+            self._shm.close()
+            self._shm = None
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+
+    def unlink(self) -> None:
+        """
+        Closes the map and frees the shared memory segment it built;
+            processes still attached keep reading it until they close
+        """
+        self.close()
+        if self._owned is not None:
+            self._owned.close()
+            self._owned.unlink()
+            self._owned = None
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    import multiprocessing
+    import tempfile
+
+    import hash_map_oa
+
+    def reader(name: str, keys: list, results) -> None:
+        """Attach the map by name in another process and look up keys."""
+        with SharedHashMap(name) as m:
+            results.put((m.get_size(), m.get_many(keys)))
+
+    print("\nbuild / attach example 1")
+    print("------------------------")
+    source = hash_map_oa.HashMap(11, fnv1a_hash)
+    for i in range(1000):
+        source.put('str' + str(i), [i, i * i])
+    with SharedHashMap.build(source) as m:
+        print(m.get_size(), m.get_capacity(), round(m.table_load(), 2))
+        print(m.get('str7'), m.get('str1000'), m.contains_key('str999'))
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=reader,
+                                           args=(m.get_name(), ['str' + str(i), 'none'], results))
+                   for i in range(4)]
+        for worker in workers:
+            worker.start()
+        found = sorted(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+        print(found)
+        print(sorted(m.keys())[:3], sum(value[0] for value in m.values()))
+
+    print("\nfile example 1")
+    print("--------------")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'table')
+        SharedHashMap.build({'a': 1, 'b': {'x': None}, 'é': 'unicode'}, path=path).close()
+        with SharedHashMap(path=path) as m:
+            print(m.get_size(), m.get('b'), m.get('é'), m.get('c'), sorted(m.items()))
+        try:
+            SharedHashMap(path=path, function=hash)
+        except ValueError as error:
+            print(error.args[0].replace(directory, '<dir>'))
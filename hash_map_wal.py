@@ -0,0 +1,410 @@
+# Name: Kent Tolzmann
+# Description: Crash-safe persistence for the SC HashMap: operations are
+#              appended to a write-ahead log with group-commit fsync,
+#              checkpointed as dump snapshots and replayed on open
+
+import os
+import pickle
+import struct
+import sys
+import time
+import zlib
+
+from a6_include import DynamicArray, hash_function_1
+from hash_map_sc import HashMap
+
+# log frame header: payload length, CRC-32 of the payload; the payload
+#   is one pickled list of the operations of a commit
+_FRAME = struct.Struct('<II')
+
+# logged operations
+_PUT, _REMOVE, _CLEAR = 0, 1, 2
+
+_LOG_NAME = 'wal.log'
+_SNAPSHOT_NAME = 'snapshot'
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    """
+    Receives a file descriptor and bytes
+    Writes all of the bytes, however many write calls it takes
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _sync(fd: int) -> None:
+    """
+    Receives a file descriptor
+    Forces its data to disk, skipping metadata where the OS allows
+    """
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+def _sync_directory(directory: str) -> None:
+    """
+    Receives a directory
+    Forces its entries, e.g. a rename into it, to disk
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DurableHashMap:
+    def __init__(self, directory: str,
+                 function: callable = hash_function_1,
+                 commit_every: int = 4096,
+                 commit_interval: float = 0.05,
+                 checkpoint_every: int = 1000000,
+                 **kwargs) -> None:
+        """
+        Initialize a hash_map_sc.HashMap kept durable in directory:
+            loads the last checkpoint snapshot, if any, and replays the
+            write-ahead log over it, dropping a torn final frame
+        Operations are buffered and written as one log frame with one
+            fsync (group commit) once commit_every are pending, on the
+            first operation after commit_interval seconds have passed
+            since the last commit (None to disable) or when commit is
+            called; only committed operations survive a crash
+        commit_interval is checked on the next operation, not by a
+            timer, so operations buffered before the map goes idle stay
+            pending until then: call commit (or close) to make them
+            durable without waiting for another operation
+        The log is checkpointed into a new snapshot once it holds
+            checkpoint_every operations
+        function must be deterministic, as dump requires; kwargs are
+            passed to the HashMap of a new directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._log_path = os.path.join(directory, _LOG_NAME)
+        self._snapshot_path = os.path.join(directory, _SNAPSHOT_NAME)
+        self._commit_every = commit_every
+        self._commit_interval = commit_interval
+        self._checkpoint_every = checkpoint_every
+
+        # operations not yet committed, and operations in the log
+        self._pending = []
+        self._logged = 0
+
+        if os.path.exists(self._snapshot_path):
+            self._map = HashMap.load(self._snapshot_path, function)
+        else:
+            self._map = HashMap(function=function, **kwargs)
+
+        self._log = os.open(self._log_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._replay()
+        self._last_commit = time.monotonic()
+
+    def __enter__(self) -> "DurableHashMap":
+        """
+        Returns the map for use in a with block
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Commits and closes the map at the end of a with block
+        """
+        self.close()
+
+    # ------------------------------------------------------------------ #
+
+    def _apply(self, operation: tuple) -> None:
+        """
+        Receives a logged operation
+        Applies it to the in-memory map
+        """
+        code, key, value = operation
+        if code == _PUT:
+            self._map.put(key, value)
+        elif code == _REMOVE:
+            self._map.remove(key)
+        else:
+            self._map.clear()
+
+    def _replay(self) -> None:
+        """
+        Applies every whole frame of the log to the map, in order
+        A frame cut short or failing its CRC can only be the last one,
+            left by a crash before its commit returned, so the log is
+            truncated there and appended to from that point
+        """
+        with open(self._log_path, 'rb') as file:
+            data = memoryview(file.read())
+
+        offset = 0
+        while offset + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, offset)
+            start = offset + _FRAME.size
+            end = start + length
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            operations = pickle.loads(data[start:end])
+            for operation in operations:
+                self._apply(operation)
+            self._logged += len(operations)
+            offset = end
+
+        if offset != len(data):
+            os.ftruncate(self._log, offset)
+            _sync(self._log)
+        os.lseek(self._log, offset, os.SEEK_SET)
+
+    def _record(self, operation: tuple) -> None:
+        """
+        Receives an operation already applied to the map
+        Queues it for the log, committing if the batch is full or the
+            last commit is more than commit_interval seconds old; this
+            is the only place the interval is checked
+        """
+        self._pending.append(operation)
+        if len(self._pending) >= self._commit_every:
+            self.commit()
+        elif (self._commit_interval is not None
+              and time.monotonic() - self._last_commit >= self._commit_interval):
+            self.commit()
+
+    def commit(self) -> None:
+        """
+        Writes the pending operations to the log as one frame and
+            fsyncs it; they survive a crash once this returns
+        Values are pickled here, so a value changed in place before
+            the commit is logged as it is now
+        Checkpoints once the log holds checkpoint_every operations
+        """
+        if self._pending:
+            payload = pickle.dumps(self._pending, pickle.HIGHEST_PROTOCOL)
+            _write_all(self._log, _FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            _sync(self._log)
+            self._logged += len(self._pending)
+            self._pending = []
+            if self._logged >= self._checkpoint_every:
+                self.checkpoint()
+        self._last_commit = time.monotonic()
+
+    def checkpoint(self) -> None:
+        """
+        Commits, then replaces the snapshot with a dump of the map and
+            empties the log
+        The new snapshot is on disk before the log is truncated; a crash
+            in between replays the log over a map that already holds it,
+            which is harmless since puts, removes and clears repeat
+            to the same result
+        """
+        self.commit()
+        temp_path = self._snapshot_path + '.new'
+        self._map.dump(temp_path)
+        fd = os.open(temp_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, self._snapshot_path)
+        _sync_directory(self._directory)
+
+        os.ftruncate(self._log, 0)
+        os.lseek(self._log, 0, os.SEEK_SET)
+        _sync(self._log)
+        self._logged = 0
+
+    def close(self) -> None:
+        """
+        Commits any pending operations and closes the log
+        The map cannot be changed afterwards
+        """
+        if self._log is not None:
+            self.commit()
+            os.close(self._log)
+            self._log = None
+
+    # ------------------------------------------------------------------ #
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Receives a key/value pair
+        Updates the value for key in the hash map
+        Adds the key/value pair if not found in hash map
+        """
+        self._map.put(key, value)
+        self._record((_PUT, key, value))
+
+    def remove(self, key: str) -> None:
+        """
+        Removes the given key and its associated value from the hash map
+        """
+        self._map.remove(key)
+        self._record((_REMOVE, key, None))
+
+    def clear(self) -> None:
+        """
+        Clears the contents of the hash map
+        """
+        self._map.clear()
+        self._record((_CLEAR, None, None))
+
+    def get(self, key: str) -> object:
+        """
+        Receives a key
+        Returns the value associated with the given key
+        Returns None if key not found
+        """
+        return self._map.get(key)
+
+    def contains_key(self, key: str) -> bool:
+        """
+        Receives a key
+        Returns True if given key is in hash map
+        Returns False if key not found
+        """
+        return self._map.contains_key(key)
+
+    def get_size(self) -> int:
+        """
+        Return size of map
+        """
+        return self._map.get_size()
+
+    def get_capacity(self) -> int:
+        """
+        Return capacity of map
+        """
+        return self._map.get_capacity()
+
+    def keys(self):
+        """
+        Returns a generator over every key
+        """
+        return self._map.keys()
+
+    def values(self):
+        """
+        Returns a generator over every value
+        """
+        return self._map.values()
+
+    def items(self):
+        """
+        Returns a generator over every (key, value) pair
+        """
+        return self._map.items()
+
+    def get_keys_and_values(self) -> DynamicArray:
+        """
+        Returns a new Dynamic Array where each index contains
+            tuples of each key/value pair stored in the hash map
+        """
+        return self._map.get_keys_and_values()
+
+
+# ------------------- BASIC TESTING ---------------------------------------- #
+
+if __name__ == "__main__":
+
+    # operations the crash test writer commits at a time
+    TEST_BATCH = 100
+
+    def test_operation(i: int) -> tuple:
+        """
+        Receives an operation number
+        Returns the test writer's i-th operation: mostly puts, with every
+            seventh one removing a key put shortly before
+        """
+        if i % 7 == 6:
+            return _REMOVE, 'key' + str(i - 3), None
+        return _PUT, 'key' + str(i), i
+
+    def test_state(count: int) -> dict:
+        """
+        Receives a number of operations
+        Returns the dict the first count test operations leave behind
+        """
+        state = {}
+        for i in range(count):
+            code, key, value = test_operation(i)
+            if code == _PUT:
+                state[key] = value
+            else:
+                state.pop(key, None)
+        return state
+
+    def test_writer(directory: str) -> None:
+        """
+        Receives a directory
+        Runs the test operations forever, committing every TEST_BATCH and
+            printing how many operations are committed after each commit
+        """
+        m = DurableHashMap(directory, commit_every=sys.maxsize,
+                           commit_interval=None, checkpoint_every=2000)
+        i = 0
+        while True:
+            code, key, value = test_operation(i)
+            if code == _PUT:
+                m.put(key, value)
+            else:
+                m.remove(key)
+            i += 1
+            if i % TEST_BATCH == 0:
+                m.commit()
+                print(i, flush=True)
+
+    if sys.argv[1:2] == ['--test-writer']:
+        test_writer(sys.argv[2])
+
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        print("\nput / reopen example 1")
+        print("----------------------")
+        path = os.path.join(directory, 'basic')
+        with DurableHashMap(path) as m:
+            for i in range(150):
+                m.put('str' + str(i), i * 100)
+            for i in range(0, 150, 3):
+                m.remove('str' + str(i))
+            m.checkpoint()
+            m.put('after', 'checkpoint')
+        with DurableHashMap(path) as m:
+            print(m.get_size(), m.get('str1'), m.get('str3'), m.get('after'))
+
+        print("\ncrash recovery example 1")
+        print("------------------------")
+        # kill a writer with SIGKILL while it is in the middle of a
+        #   batch, then reopen: every committed operation must be back,
+        #   and nothing but whole batches
+        path = os.path.join(directory, 'crash')
+        writer = subprocess.Popen([sys.executable, __file__, '--test-writer', path],
+                                  stdout=subprocess.PIPE, text=True)
+        acknowledged = 0
+        while acknowledged < 5000:
+            acknowledged = int(writer.stdout.readline())
+        writer.kill()
+        writer.wait()
+
+        with DurableHashMap(path) as m:
+            recovered = dict(m.items())
+        count = acknowledged
+        while test_state(count) != recovered and count < acknowledged + 10 * TEST_BATCH:
+            count += TEST_BATCH
+        print(test_state(count) == recovered, count >= acknowledged, count % TEST_BATCH == 0)
+
+        print("\ntorn frame example 1")
+        print("--------------------")
+        # a frame cut short by a crash mid-write is dropped on replay
+        with open(os.path.join(path, _LOG_NAME), 'ab') as file:
+            file.write(_FRAME.pack(1000, 0) + b'partial')
+        with DurableHashMap(path) as m:
+            print(dict(m.items()) == recovered)
+        with DurableHashMap(path) as m:
+            m.put('new', 1)
+        with DurableHashMap(path) as m:
+            print(m.get_size() == len(recovered) + 1, m.get('new'))
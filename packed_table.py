@@ -0,0 +1,296 @@
+# Name: Kent Tolzmann
+# Description: Open addressing table packed into one flat buffer, shared
+#              by the sharded and shared-memory HashMaps
+
+import pickle
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+from a6_include import FIBONACCI_MULTIPLIER, MASK64
+
+# packed table header: magic, capacity, size, tombstones, end of the
+#   records, bytes reserved for records and hash fingerprint, padded so
+#   the slots that follow stay 8-byte aligned
+_MAGIC = b'HMPACK01'
+_HEADER = struct.Struct('<8sQQQQQQ')
+_HEADER_SIZE = 64
+
+# each slot holds two native 64-bit words: the cached hash and the arena
+#   offset of its record plus one, 0 marking empty and all ones a tombstone
+_SLOT_WORDS = 2
+_EMPTY, _TOMBSTONE = 0, MASK64
+
+# record header: key length, value length; the utf-8 key and the
+#   pickled value follow
+_RECORD = struct.Struct('<II')
+
+
+def packed_table_size(capacity: int, data_capacity: int) -> int:
+    """
+    Receives a slot capacity and a number of arena bytes
+    Returns the bytes a packed table of that shape takes
+    """
+    return _HEADER_SIZE + 8 * _SLOT_WORDS * capacity + data_capacity
+
+
+def encode_key(key: str) -> bytes:
+    """
+    Receives a key
+    Returns its utf-8 bytes, as stored in a packed record
+    """
+    return key.encode('utf-8', 'surrogatepass')
+
+
+def encode_record(key_bytes: bytes, value: object) -> bytes:
+    """
+    Receives an encoded key and a value
+    Returns the packed record holding both
+    """
+    value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return _RECORD.pack(len(key_bytes), len(value_bytes)) + key_bytes + value_bytes
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Receives the name of an existing shared memory segment
+    Returns it attached without registering it with this process's
+        resource tracker, which before Python 3.13 unlinks every segment
+        a process attached when it exits; the creator alone owns it
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class PackedTable:
+    """
+    Open addressing table packed into one buffer (shared memory, an mmap
+        or a bytearray): a header, the slots, then an arena of records
+    Slots are probed with triangular offsets over a power-of-two
+        capacity, indexed by the Fibonacci-mixed hash as in hash_map_mmap
+    Any number of processes may read one buffer; one may write it at a
+        time, and the others refresh before reading again
+    """
+
+    def __init__(self, buffer) -> None:
+        """
+        Initialize a view of the packed table in buffer, whose header
+            was written by create
+        """
+        header = _HEADER.unpack_from(buffer)
+        if header[0] != _MAGIC:
+            raise ValueError("buffer is not a packed HashMap table")
+        self.capacity, self.data_capacity, self.fingerprint = header[1], header[5], header[6]
+        self._buffer = buffer
+        self._mask = self.capacity - 1
+        self._shift = 64 - (self.capacity.bit_length() - 1)
+        data_start = packed_table_size(self.capacity, 0)
+        view = memoryview(buffer)
+        self._slots = view[_HEADER_SIZE:data_start].cast('Q')
+        self._data = view[data_start:data_start + self.data_capacity]
+        view.release()
+        self.refresh()
+
+    @classmethod
+    def create(cls, buffer, capacity: int, data_capacity: int,
+               fingerprint: int) -> "PackedTable":
+        """
+        Receives a zero-filled buffer of packed_table_size bytes, its
+            power-of-two slot capacity, arena bytes and hash fingerprint
+        Returns an empty table in the buffer
+        """
+        _HEADER.pack_into(buffer, 0, _MAGIC, capacity, 0, 0, 0,
+                                 data_capacity, fingerprint)
+        return cls(buffer)
+
+    def refresh(self) -> None:
+        """
+        Rereads the size, tombstone count and end of the records, which
+            another process may have changed
+        """
+        header = _HEADER.unpack_from(self._buffer)
+        self.size, self.tombstones, self.data_end = header[2], header[3], header[4]
+
+    def write_header(self) -> None:
+        """
+        Stores the size, tombstone count and end of the records
+        """
+        _HEADER.pack_into(self._buffer, 0, _MAGIC, self.capacity,
+                                 self.size, self.tombstones, self.data_end,
+                                 self.data_capacity, self.fingerprint)
+
+    def _read_record(self, offset: int) -> tuple:
+        """
+        Receives the arena offset of a record
+        Returns views of its (key bytes, value bytes), without copying
+        """
+        key_length, value_length = _RECORD.unpack_from(self._data, offset)
+        start = offset + _RECORD.size
+        middle = start + key_length
+        return self._data[start:middle], self._data[middle:middle + value_length]
+
+    def _append(self, record) -> int:
+        """
+        Receives an encoded record
+        Copies it to the end of the arena
+        Returns its offset
+        """
+        offset = self.data_end
+        self._data[offset:offset + len(record)] = record
+        self.data_end += len(record)
+        return offset
+
+    def _probe(self, key_bytes: bytes, hash: int) -> tuple:
+        """
+        Receives an encoded key and its hash
+        Returns (slot holding key or -1, first tombstone or empty slot
+            of its probe, value bytes of key or None) from one probe walk
+        Only slots whose cached hash matches read their record
+        """
+        slots = self._slots
+        mask = self._mask
+        i = ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+        free = -1
+
+        for j in range(1, self.capacity + 1):
+            offset = slots[2 * i + 1]
+            if offset == _EMPTY:
+                return -1, (i if free < 0 else free), None
+            if offset == _TOMBSTONE:
+                if free < 0:
+                    free = i
+            elif slots[2 * i] == hash:
+                record_key, value_bytes = self._read_record(offset - 1)
+                if record_key == key_bytes:
+                    return i, free, value_bytes
+            # triangular offsets visit every slot of a power-of-two table
+            i = (i + j) & mask
+        return -1, free, None
+
+    def find(self, key_bytes: bytes, hash: int):
+        """
+        Receives an encoded key and its hash
+        Returns a view of the pickled value of key, or None if not found
+        A lookup skips tombstones without tracking a free slot; the load
+            threshold keeps an empty slot to end every probe
+        """
+        slots = self._slots
+        mask = self._mask
+        i = ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> self._shift
+        j = 0
+        while True:
+            offset = slots[2 * i + 1]
+            if offset == _EMPTY:
+                return None
+            if offset != _TOMBSTONE and slots[2 * i] == hash:
+                record_key, value_bytes = self._read_record(offset - 1)
+                if record_key == key_bytes:
+                    return value_bytes
+            j += 1
+            i = (i + j) & mask
+
+    def fits(self, entries: int, record_bytes: int) -> bool:
+        """
+        Receives a number of new entries and their encoded bytes
+        Returns True if they can be inserted in place, staying under the
+            0.5 load threshold with room left in the arena
+        """
+        return (2 * (self.size + self.tombstones + entries) < self.capacity
+                and self.data_end + record_bytes <= self.data_capacity)
+
+    def insert(self, key_bytes: bytes, hash: int, record: bytes) -> None:
+        """
+        Receives an encoded key, its hash and its whole encoded record,
+            which the table fits
+        Points the key's slot at the record appended to the arena; a
+            replaced record stays in the arena until the table is copied
+        The header is written by the caller once the batch is done
+        """
+        i, free, value_bytes = self._probe(key_bytes, hash)
+        offset = self._append(record)
+        slots = self._slots
+        if i >= 0:
+            slots[2 * i + 1] = offset + 1
+            return
+        if slots[2 * free + 1] == _TOMBSTONE:
+            self.tombstones -= 1
+        slots[2 * free] = hash
+        slots[2 * free + 1] = offset + 1
+        self.size += 1
+
+    def remove(self, key_bytes: bytes, hash: int) -> bool:
+        """
+        Receives an encoded key and its hash
+        Turns the key's slot into a tombstone
+        Returns True if the key was found
+        """
+        i, free, value_bytes = self._probe(key_bytes, hash)
+        if i < 0:
+            return False
+        self._slots[2 * i + 1] = _TOMBSTONE
+        self.size -= 1
+        self.tombstones += 1
+        return True
+
+    def _live(self):
+        """
+        Generator over (hash, record offset) of every live slot
+        """
+        slots = self._slots
+        for i in range(self.capacity):
+            offset = slots[2 * i + 1]
+            if offset != _EMPTY and offset != _TOMBSTONE:
+                yield slots[2 * i], offset - 1
+
+    def records(self):
+        """
+        Generator over (key bytes, value bytes) of every live slot,
+            in table order
+        """
+        for hash, offset in self._live():
+            yield self._read_record(offset)
+
+    def live_bytes(self) -> int:
+        """
+        Returns the arena bytes of the live records, leaving out the
+            replaced ones
+        """
+        total = 0
+        for hash, offset in self._live():
+            key_length, value_length = _RECORD.unpack_from(self._data, offset)
+            total += _RECORD.size + key_length + value_length
+        return total
+
+    def copy_into(self, table: "PackedTable") -> None:
+        """
+        Receives an empty table with room for every live record
+        Copies the live records into it, compacted and rehashed by their
+            cached hash, and writes its header
+        """
+        slots = table._slots
+        for hash, offset in self._live():
+            key_length, value_length = _RECORD.unpack_from(self._data, offset)
+            end = offset + _RECORD.size + key_length + value_length
+            k = ((hash * FIBONACCI_MULTIPLIER) & MASK64) >> table._shift
+            j = 0
+            while slots[2 * k + 1] != _EMPTY:
+                j += 1
+                k = (k + j) & table._mask
+            slots[2 * k] = hash
+            slots[2 * k + 1] = table._append(self._data[offset:end]) + 1
+        table.size = self.size
+        table.write_header()
+
+    def release(self) -> None:
+        """
+        Releases the views of the buffer, so it can be closed
+        """
+        self._slots.release()
+        self._data.release()